@@ -6,6 +6,13 @@ Created on Wed Aug 28, 2013
 
 """
 import socket
+import select
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
 
 from . import Tool
 #from fridgemonitor import data_server
@@ -16,12 +23,24 @@ param = OrderedDict([('LS1', 'ohms'), ('LS2', 'ohms'), ('LS3', 'ohms'), ('LS4',
 
 INTERFACE = Tool.INTF_NONE
 
+# address of the Fridgemonitor data server
+FRIDGE_HOST = 'localhost'
+FRIDGE_PORT = 4589
+
+# time after which a request to the Fridgemonitor is abandoned, in s
+FRIDGE_TIMEOUT = 3
+
 class Instrument(Tool.MeasInstr):
 
     def __init__(self, resource_name, debug=False):
-        # This instrument doesn't take any ResourceName other than FridgeServer! 
+        # This instrument doesn't take any ResourceName other than FridgeServer!
         # this could later be modified to use the port number, which is currently hardcoded as 4589
         resource_name = 'FridgeServer'
+        # the connection to the Fridgemonitor, it is opened with the first
+        # request and kept for the next ones
+        self.socket = None
+        self.received = b''
+        self.socket_lock = threading.Lock()
         super(Instrument, self).__init__(resource_name, 'FridgeClient', debug=debug, interface = INTERFACE)
         print("made a fridge client")
 
@@ -29,63 +48,253 @@ class Instrument(Tool.MeasInstr):
         super(Instrument, self).__del__()
 
     # overload the connect() method so that no real connection is made
-    # a client socket is generated and destroyed for each request in measure()
+    # the socket is only opened by the first request
     def connect(self, resource_name=None):
         pass
 
+    def close(self):
+        with self.socket_lock:
+            self.disconnect()
+
+    def bus_id(self):
+        # the requests go through a socket to the Fridgemonitor program
+        return "socket:%s:%s" % (FRIDGE_HOST, FRIDGE_PORT)
+
     def measure(self, channel='LS1'):
-        if channel in self.last_measure:
-            answer = self.get_fridge_data(str(channel))
-        else:
-            print("you are trying to measure a non existent channel : " + channel)
-            print("existing channels :", self.channels)
-            answer = None
-        self.last_measure[channel] = answer
-        return answer
-        
+        return self.measure_many([channel])[0]
+
+    def measure_many(self, channels):
+        """
+            the values of all the channels are asked in a single round-trip
+            to the Fridgemonitor
+        """
+        known = [channel for channel in channels if channel in self.last_measure]
+
+        for channel in channels:
+            if channel not in self.last_measure:
+                print("you are trying to measure a non existent channel : " + channel)
+                print("existing channels :", self.channels)
+
+        values = dict(zip(known, self.get_fridge_data_many(
+            [str(channel) for channel in known])))
+
+        answers = []
+        for channel in channels:
+            answer = values.get(channel)
+            if channel in values:
+                self.last_measure[channel] = answer
+            answers.append(answer)
+        return answers
+
     def get_fridge_data(self, data_name):
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        
-            s.connect(('localhost', 4589))
-         
-            s.send(data_name + '?\n')
-            
-            stri = s.recv(1024)
-            dat = float(stri.split('=')[-1].strip())
-            s.close()
-            
-            return dat
-            
-        except IOError:
-            print("connection to fridge monitor failed")
-            return 0
+        return self.get_fridge_data_many([data_name])[0]
+
+    def get_fridge_data_many(self, data_names):
+        """
+            send the requests for all data_names at once on the persistent
+            connection and read the answers, 0 is returned for the values
+            which couldn't be obtained
+        """
+        if not data_names:
+            return []
+
+        with self.socket_lock:
+            try:
+                replies = self.transaction(
+                    ''.join([name + '?\n' for name in data_names]),
+                    len(data_names))
+            except IOError:
+                print("connection to fridge monitor failed")
+                return [0] * len(data_names)
+
+            # a server answering only one request per connection closes it,
+            # the remaining requests are then sent one by one
+            while len(replies) < len(data_names):
+                try:
+                    reply = self.transaction(
+                        data_names[len(replies)] + '?\n', 1)
+                except IOError:
+                    print("connection to fridge monitor failed")
+                    reply = []
+                replies = replies + (reply or [None])
+
+        answers = []
+        for reply in replies:
+            try:
+                answers.append(float(reply.split('=')[-1].strip()))
+            except (AttributeError, ValueError):
+                answers.append(0)
+        return answers
+
+    def send_command(self, command):
+        """send a command which has no answer"""
+        with self.socket_lock:
+            try:
+                self.transaction(command + '\n', 0)
+            except IOError:
+                print("connection to fridge monitor failed")
+                return 0
+
     def change_setpoint(self, val):
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        
-            s.connect(('localhost', 4589))
-         
-            s.send('SETP ' + str(val) + '\n')
-    
-            s.close()
-    
-            
-        except IOError:
-            print("connection to fridge monitor failed")
-            return 0  
+        return self.send_command('SETP ' + str(val))
 
     def change_damping(self, val):
+        return self.send_command('DAMP ' + str(val))
+
+    def transaction(self, message, num_replies):
+        """
+            send message and read up to num_replies lines, the connection is
+            opened again once if it was lost. Fewer lines are returned if the
+            server closed the connection. The caller holds socket_lock.
+        """
+        for attempt in range(2):
+            self.check_connection()
+            reused = self.socket is not None
+            if not reused:
+                self.socket = socket.create_connection(
+                    (FRIDGE_HOST, FRIDGE_PORT), FRIDGE_TIMEOUT)
+                # the requests are small and sent at once, don't let them
+                # wait for the acknowledgement of the previous ones
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.received = b''
+
+            try:
+                self.socket.sendall(message.encode('latin1'))
+                replies = self.read_replies(num_replies)
+            except IOError:
+                self.disconnect()
+                if not reused or attempt > 0:
+                    raise
+                # the server closed the connection since the last request
+                continue
+
+            if reused and num_replies > 0 and not replies and \
+                    self.socket is None:
+                # the connection was closed before the request arrived
+                continue
+            return replies
+
+        return []
+
+    def read_replies(self, num_replies):
+        """read up to num_replies lines, fewer if the server disconnects"""
+        replies = []
+        while len(replies) < num_replies:
+            end = self.received.find(b'\n')
+            if end >= 0:
+                replies.append(self.received[:end].decode('latin1'))
+                self.received = self.received[end + 1:]
+                continue
+
+            block = self.socket.recv(4096)
+            if not block:
+                # the server closed the connection, an answer without end of
+                # line is complete
+                if self.received.strip():
+                    replies.append(self.received.decode('latin1'))
+                self.disconnect()
+                break
+            self.received = self.received + block
+
+        return replies
+
+    def check_connection(self):
+        """forget the connection if the server closed it in the meantime"""
+        if self.socket is None:
+            return
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        
-            s.connect(('localhost', 4589))
-         
-            s.send('DAMP ' + str(val) + '\n')
-    
-            s.close()
-    
-            
-        except IOError:
-            print("connection to fridge monitor failed")
-            return 0  
+            readable = select.select([self.socket], [], [], 0)[0]
+            if readable:
+                block = self.socket.recv(4096)
+                if not block:
+                    self.disconnect()
+                else:
+                    self.received = self.received + block
+        except (IOError, select.error):
+            self.disconnect()
+
+    def disconnect(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except IOError:
+                pass
+            self.socket = None
+            self.received = b''
+
+
+class FakeFridgeRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            request = line.decode('latin1').strip()
+            server.requests.append(request)
+
+            if request.endswith('?'):
+                name = request[:-1]
+                value = server.values.get(name, 0)
+                self.wfile.write(("%s=%s\n" % (name, value)).encode('latin1'))
+                self.wfile.flush()
+                if server.one_request_per_connection:
+                    break
+
+            elif ' ' in request:
+                command, value = request.split(' ', 1)
+                server.commands[command] = value
+
+
+class FakeFridgeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+        imitation of the Fridgemonitor data server, to test the
+        FridgeClient without a fridge. 'NAME?' lines are answered with
+        'NAME=value' from the dict values, the commands ('SETP 10') are
+        stored in the dict commands and all the requests in the list
+        requests. With one_request_per_connection the connection is closed
+        after each answer, like an older server.
+        Use start() and shutdown().
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, values=None, host=FRIDGE_HOST, port=FRIDGE_PORT,
+                 one_request_per_connection=False):
+        socketserver.TCPServer.__init__(self, (host, port),
+                                        FakeFridgeRequestHandler)
+        if values is None:
+            values = dict([(name, i + 1.0) for i, name in enumerate(param)])
+        self.values = values
+        self.commands = {}
+        self.requests = []
+        self.one_request_per_connection = one_request_per_connection
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+if (__name__ == '__main__'):
+
+    import time
+
+    server = FakeFridgeServer()
+    server.start()
+
+    client = Instrument('FridgeServer')
+    channels = list(param.keys())
+    start = time.time()
+    for i in range(100):
+        client.measure_many(channels)
+    print("%.2f ms per read of %i channels" % (
+        (time.time() - start) * 10, len(channels)))
+    print(client.measure_many(channels))
+
+    client.close()
+    server.shutdown()
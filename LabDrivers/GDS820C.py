@@ -39,6 +39,15 @@ param = {'CH1': 'V', 'CH2': 'V', 'phase': 'deg', 'Z': 'Ohm', 'Z2': 'Ohm'}
 
 INTERFACE = Tool.INTF_SERIAL
 
+# the waveform block is '#', the number n of digits of the length, the n
+# digits, the sample rate (4 bytes float), 4 other bytes and the points as
+# big endian 2 bytes integers
+BLOCK_HEADER_BYTES = 10
+BLOCK_INFO_BYTES = 8
+
+# largest number of bytes asked to the serial port at once
+TRANSFER_CHUNK = 100000
+
 class Instrument(Tool.MeasInstr):
 
     def __init__(self, resource_name, debug=False, **kwargs):
@@ -48,6 +57,13 @@ class Instrument(Tool.MeasInstr):
                                          parity='N', stopbits=1, xonxoff=False, 
                                          dsrdtr=False, **kwargs)
 
+        self.waveform = {1: [], 2: []}
+        self.param_id = {'CH1': 1, 'CH2': 2}
+        # the blocks are read in these buffers, which are kept for the next
+        # transfers of the same channel
+        self.block_buffers = {1: bytearray(), 2: bytearray()}
+        self.latest_data = bytearray()
+
         if not self.DEBUG:
             print("init done")
             print(self.ask("*IDN?"))        
@@ -56,9 +72,6 @@ class Instrument(Tool.MeasInstr):
             self.get_channel_scale(1)
             self.get_channel_scale(2)
             self.time_per_div = self.get_time_scale()
-            self.waveform = {1: [], 2: []}
-            self.param_id = {'CH1': 1, 'CH2': 2}
-            self.latest_data = ""
             self.get_channel_scale()
             self.phase = 0
             self.impedance = 0
@@ -91,16 +104,29 @@ class Instrument(Tool.MeasInstr):
         return answer
 
     def acquire_spectrum(self, channel='CH1'):
-        print(channel)
+        """
+        Return the displayed waveform of channel ('CH1' or 'CH2') in volts.
+        """
+        return self.acquire_spectra([channel])[0]
 
-        chan_num = self.param_id[channel]
+    def acquire_spectra(self, channels=('CH1', 'CH2')):
+        """
+        Return the list of the displayed waveforms of the channels in volts,
+        they are transferred one after the other without letting another
+        thread use the serial port in between.
+        """
+        spectra = []
+        with self.transaction():
+            for channel in channels:
+                chan_num = self.param_id[channel]
 
-        if not self.debug:
-            self.get_raw_data(chan_num)
-            return self.waveform[chan_num] * self.volt_per_div[chan_num]
-        else:
-            print("pas prout")
-            return [random.random() for i in range(1000)]
+                if not self.DEBUG:
+                    self.get_raw_data(chan_num)
+                    spectra.append(
+                        self.waveform[chan_num] * self.volt_per_div[chan_num])
+                else:
+                    spectra.append(np.random.random(1000))
+        return spectra
 
     def get_settings(self):
         print(self.ask("*LRN?"))
@@ -234,82 +260,84 @@ class Instrument(Tool.MeasInstr):
 #            for s in self.scales:
 #                print s,answer/s
 
-    def get_block_data(self):
+    def read_into(self, view):
         """
-        Transfer the displayed waveform data from the oscilloscope memory into the variable self.latest_data
+        Read up to len(view) bytes from the serial port directly into view (a
+        memoryview), return the number of bytes read.
         """
-#        print "yolo1"
+        readinto = getattr(self.connection, "readinto", None)
+        if readinto is not None:
+            return readinto(view) or 0
+        else:
+            # pyserial 2 has no readinto
+            data = self.connection.read(len(view))
+            view[:len(data)] = data
+            return len(data)
 
-        self.latest_data = self.read(10)
-#        print "yolo324211"
-        length = len(self.latest_data)
-#        print "The length is %i"%(length)
-        if not length == 10:
+    def get_block_data(self, chan_num=1):
+        """
+        Transfer the waveform block from the oscilloscope memory into the
+        buffer of the channel chan_num, self.latest_data is the block. The
+        buffer is only allocated again if the block got bigger.
+        """
+        header = self.read_raw(BLOCK_HEADER_BYTES)
+        length = len(header)
+        if not length == BLOCK_HEADER_BYTES:
             print("The data wasn't triggered")
             return 0
 
-        self.headerlen = 2 + int(self.latest_data[1])
-        print("The headerlength is %i" % (self.headerlen))
-        pkg_length = int(self.latest_data[2:self.headerlen]) + self.headerlen
-        print("Data transferring...  ")
-        print(pkg_length)
-        pkg_length = pkg_length - length
-        while True:
-            print('%8d\r' % pkg_length)
-            if(pkg_length > 100000):
-                try:
-                    buf = self.read(100000)
-                except:
-                    print('KeyboardInterrupt!')
-                    exit()
-                num = len(buf)
-                self.latest_data += buf
-                pkg_length = pkg_length - num
-            else:
-                try:
-                    buf = self.read(pkg_length)
-                except:
-                    print('KeyboardInterrupt!')
-                    exit()
-                num = len(buf)
-                self.latest_data += buf
-                pkg_length = pkg_length - num
-                if(pkg_length == 0):
-                    break
-#                    print('%8d\r' %pkg_length),
+        self.headerlen = 2 + int(header[1:2])
+        pkg_length = int(header[2:self.headerlen]) + self.headerlen
+
+        if len(self.block_buffers[chan_num]) < pkg_length:
+            self.block_buffers[chan_num] = bytearray(pkg_length)
+        view = memoryview(self.block_buffers[chan_num])[:pkg_length]
+        view[:length] = header
+
+        received = length
+        while received < pkg_length:
+            num = self.read_into(
+                view[received:min(pkg_length, received + TRANSFER_CHUNK)])
+            if num == 0:
+                print("The transfer of the data timed out after %i of %i bytes"
+                      % (received, pkg_length))
+                return 0
+            received = received + num
+
+        self.latest_data = view
         return 1
 
     def get_raw_data(self, chan_num):
         """
-        Transfer the displayed waveform data from the oscilloscope.
+        Transfer the displayed waveform data from the oscilloscope, the
+        points are decoded without copy, self.waveform[chan_num] is valid
+        until the next transfer of the channel.
         """
-#        data_points=None
         if not chan_num in [1, 2]:
             print("%s : get_displayed_data : input argument needs to be an integer between 1 and 2\n" % (self.ID_name))
         else:
 
-            have_data = 0
-            while have_data == 0:
-                self.write(":ACQ%i:MEM?" % (chan_num))
-                print("sent command")
-                have_data = self.get_block_data()
+            with self.transaction():
+                have_data = 0
+                while have_data == 0:
+                    self.write(":ACQ%i:MEM?" % (chan_num))
+                    have_data = self.get_block_data(chan_num)
+
+            block = self.block_buffers[chan_num]
+            start = self.headerlen + BLOCK_INFO_BYTES
 
             # Number of sample points.
-            self.points_num = len(self.latest_data[self.headerlen + 8:]) / 2
+            self.points_num = (len(self.latest_data) - start) // 2
 
             # Get sample rate from header.
-            sample_rate = unpack(">f", self.latest_data[
-                                 self.headerlen:self.headerlen + 4])
-#            print('Sample rate: %f SPS' %sample_rate[0])
+            sample_rate = np.frombuffer(block, dtype='>f4', count=1,
+                                        offset=self.headerlen)[0]
 
-            self.time_per_div = 1 / sample_rate[0]
+            self.time_per_div = 1 / sample_rate
 
-            # Convert hex to int.
-            self.waveform[chan_num] = np.array(unpack('>%sh' % (len(self.latest_data[
-                                               self.headerlen + 8:]) / 2), self.latest_data[self.headerlen + 8:]))
-#            print ('Number of samples: %d' %len(self.waveform[chan_num]))
-
-#        return ch #Return the buffer index.
+            # the points are big endian 2 bytes integers
+            self.waveform[chan_num] = np.frombuffer(
+                block, dtype='>i2', count=self.points_num, offset=start)
 
     def set_channel_coupling(self, chan_num, i):
         """
@@ -586,8 +614,88 @@ def read_data(file_name):
 #    print freq
     plt.show()
 
+class FakeScopeConnection(object):
+    """
+    imitation of the serial port of the oscilloscope, to time the transfer
+    of the waveforms without the instrument. :ACQn:MEM? is answered with a
+    block of num_points points, a read returns at most chunk bytes like a
+    serial port which received only part of the block so far.
+    """
+
+    def __init__(self, num_points=125000, sample_rate=25e6, chunk=4096):
+        points = (1000 * np.sin(np.linspace(0, 20 * np.pi, num_points)))
+        data = pack('>f', sample_rate) + b'\0' * 4 + \
+            points.astype('>i2').tobytes()
+        length = str(len(data)).encode('latin1')
+        self.block = b'#' + str(len(length)).encode('latin1') + length + data
+        self.chunk = chunk
+        self.reply = b''
+        self.position = 0
+
+    def write(self, cmd):
+        if 'MEM?' in str(cmd):
+            self.reply = self.block
+            self.position = 0
+
+    def read(self, num_bytes=1):
+        data = self.reply[self.position:
+                          self.position + min(num_bytes, self.chunk)]
+        self.position = self.position + len(data)
+        return data
+
+    def readinto(self, view):
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
+def benchmark(num_points=125000, repeat=20):
+    """
+    time the transfer of a waveform from a FakeScopeConnection with the
+    former method (concatenation of the pieces and struct.unpack) and with
+    get_raw_data
+    """
+    connection = FakeScopeConnection(num_points)
+
+    def legacy_transfer():
+        connection.write(":ACQ1:MEM?")
+        data = connection.read(10)
+        headerlen = 2 + int(data[1:2])
+        pkg_length = int(data[2:headerlen]) + headerlen - len(data)
+        while pkg_length > 0:
+            buf = connection.read(min(pkg_length, TRANSFER_CHUNK))
+            data += buf
+            pkg_length = pkg_length - len(buf)
+        return np.array(unpack('>%ih' % ((len(data) - headerlen - 8) // 2),
+                               data[headerlen + 8:]))
+
+    scope = Instrument("FAKE", debug=True)
+    scope.DEBUG = False
+    scope.connection = connection
+
+    start = time.time()
+    for i in range(repeat):
+        legacy_waveform = legacy_transfer()
+    legacy_time = (time.time() - start) / repeat
+
+    start = time.time()
+    for i in range(repeat):
+        scope.get_raw_data(1)
+    new_time = (time.time() - start) / repeat
+
+    print("%i points : %.2f ms before, %.2f ms now, same waveform : %s" % (
+        num_points, 1000 * legacy_time, 1000 * new_time,
+        np.array_equal(legacy_waveform, scope.waveform[1])))
+
+
 if __name__ == "__main__":
 
+    import sys
+    if "benchmark" in sys.argv:
+        # python GDS820C.py benchmark
+        benchmark()
+        sys.exit()
+
     #    read_data("C:/Users/pfduc/Documents/g2gui/g2python/20150409_Freq_sweep_pressure6.00e-04_rawdata.dat")
 
     #    omega=2*np.pi*500000
@@ -24,6 +24,9 @@ param = {'FLOW': 'mbarl/s', 'P2': 'mbar'}
 
 INTERFACE = Tool.INTF_SERIAL
 
+# the answers of the leak detector end with a carriage return
+TERMINATOR = b'\r'
+
 class Instrument(Tool.MeasInstr):
 
     # 1 will enable a watchdog function that will check every telegramm from
@@ -47,6 +50,10 @@ class Instrument(Tool.MeasInstr):
     # called
     display_infos = 0
 
+    # parameter numbers of the channels, read_message and parse_value let the
+    # asyncio transport (see transport.py) measure them
+    MEASURE_PARAMETERS = {'FLOW': '670', 'P2': '680'}
+
     def __init__(self, resource_name, debug=False, serial_address='001', **kwargs):
         super(Instrument, self).__init__(resource_name, 'HLT560', debug=debug, interface = INTERFACE, **kwargs)
 
@@ -85,11 +92,7 @@ class Instrument(Tool.MeasInstr):
             #            print 'Execute : ' +msg
 #            answer = self.ask(msg)
             self.connection.write(msg)
-            answer = ""
-            c = self.connection.read(1)
-            while c != '\r' :
-                answer = answer + c
-                c = self.connection.read(1)
+            answer = self.read_answer()
             
             if self.watchdog:
                 self.__communication_watchdog(msg, answer)
@@ -99,6 +102,29 @@ class Instrument(Tool.MeasInstr):
             # print "DEBUG MODE : " + msg
             return self.message_parser(msg, self.display_infos)
 
+    def read_answer(self):
+        """read an answer up to its carriage return"""
+        try:
+            answer = self.connection.read_until(TERMINATOR)
+        except AttributeError:
+            # pyserial 2 has no read_until, the bytes come one by one
+            answer = b''
+            c = self.connection.read(1)
+            while c and c != TERMINATOR:
+                answer = answer + c
+                c = self.connection.read(1)
+        if not isinstance(answer, str):
+            answer = answer.decode('latin1')
+        return answer.rstrip('\r')
+
+    def read_message(self, param_num):
+        """the telegram asking the value of the parameter param_num"""
+        return self.__msg_read(param_num)
+
+    def parse_value(self, answer):
+        """the value of a measure from the answer to read_message"""
+        return self.__convert_str_to_Q(self.message_parser(answer)[4])
+
     def __write(self, msg):
         if not self.DEBUG:
             #            print 'Execute : ' +msg
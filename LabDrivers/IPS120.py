@@ -1,8 +1,10 @@
 #!/usr/bin/env python  
 try:
     from . import Tool
+    from . import ramp
 except:
     import Tool
+    import ramp
     
 import time
 import random
@@ -11,6 +13,9 @@ import numpy as np
 param={'Field':'T'}
 
 INTERFACE = Tool.INTF_GPIB
+
+# the field is considered reached within this distance, in T
+FIELD_TOLERANCE = 0.00001
       
 class Instrument(Tool.MeasInstr): 
     def __init__(self, resource_name, debug = False, read_only = False, **kwargs): 
@@ -91,18 +96,31 @@ class Instrument(Tool.MeasInstr):
         if not self.DEBUG:      
             return self.write ('@0Q4')
     
-    # waits until a setpoint is reached. Can't be interrupted.        
-    def ramp_to_setpoint(self,field):
+    def start_ramp(self, field, rate=None,
+                   poll_interval=ramp.RAMP_POLL_INTERVAL, timeout=None):
+        """
+            start sweeping the field to field (in T), at rate (in T/min) if
+            given, and return the ramp.RampTask which follows the sweep, the
+            script can go on measuring in the meantime
+        """
+        if rate is not None:
+            self.set_field_sweep_rate(rate)
+
+        start_value = self.read_field()
         self.set_point_field(field)
         self.goto_set()
-    
-        still_ramping = True
+
+        def is_done(task):
+            # floating point numbers may be close enough but not equal
+            return self.DEBUG or abs(task.value - field) <= FIELD_TOLERANCE
+
+        return ramp.RampTask(is_done, self.hold, self.read_field, start_value,
+                             field, poll_interval, timeout, name=self.ID_name)
+
+    # waits until a setpoint is reached, or until is_stopped() is True
+    def ramp_to_setpoint(self, field, is_stopped=None):
         print ("Ramping field...")
-        while still_ramping:   
-            actual_field = self.read_field()
-            # floating point numbers may be close enough but not "pre
-            still_ramping = abs (actual_field - field) > 0.00001
-            time.sleep(1)  
+        return self.start_ramp(field).wait(is_stopped=is_stopped)
 
 #if run as own program  
 if (__name__ == '__main__'):  
@@ -7,12 +7,16 @@ Keithley 2400
 
 #!/usr/bin/env python
 import time
+import logging
 
 import random
+import numpy as np
 try:
     from . import Tool
+    from . import ramp
 except:
     import Tool
+    import ramp
     
 
 
@@ -20,6 +24,28 @@ param = {'V': 'V', 'I': 'A'}
 
 INTERFACE = Tool.INTF_GPIB
 
+# elements of the readings stored in the buffer for each channel
+BURST_ELEMENTS = {'V': 'VOLT', 'I': 'CURR'}
+
+BURST_MAX_POINTS = 2500
+
+# extra time given to the instrument to fill its buffer, in s
+BURST_TIMEOUT = 5
+
+# longest sweep of the source, in number of points
+SWEEP_MAX_POINTS = 2500
+
+# time between two points of a sweep of the source, in s
+SWEEP_POINT_TIME = 0.01
+
+# bit of the operation condition register set when the trigger model is idle
+IDLE_BIT = 1024
+
+# trigger model of measure, one reading per :READ?, put back after the bursts
+# and the sweeps
+SINGLE_TRIGGER = ':ARM:SOUR IMM;:ARM:COUN 1;:TRIG:SOUR IMM;:TRIG:COUN 1;\
+:TRIG:DEL 0'
+
 
 class Instrument(Tool.MeasInstr):
 
@@ -218,45 +244,182 @@ class Instrument(Tool.MeasInstr):
 #        elif p_code == 3:
 #            return self.leaking(p_tolerance)
             
-    def move_voltage(self, p_reader, p_target_voltage, step=0.0005, wait=0.005):
-#    def move_voltage(self, p_reader, p_target_voltage, step=0.001, wait=0.005):
-#        print 'Moving voltage'        
-        current_voltage = self.measure('V')
-        # Parse move direction cases
-        if current_voltage < p_target_voltage:  # If keithley needs to move up
-            # While the current_voltage is not within one increment of the
-            # target voltage
-            while current_voltage < p_target_voltage:
-                # Stop if it needs to
-#                if p_leak_check_code != 0:
-#                    if p_reader.isStopped():
-#                        print("Stopping")
-#                        return 0
-                # Increment the current voltage by a safe amount
-                current_voltage += step
-                self.set_voltage(current_voltage)
-                # Wait
-                time.sleep(wait)
-        elif current_voltage > p_target_voltage:  # If keithley needs to move up
-            # While the current_voltage is not within one increment of the
-            # target voltage
-            while current_voltage > p_target_voltage:
-                # Stop if it needs to
-#                if p_leak_check_code != 0:
-#                    if p_reader.isStopped():
-#                        print("Stopping")
-#                        return 0
-                # Increment the current voltage by a safe amount
-                current_voltage -= step
-                self.set_voltage(current_voltage)
-                # Wait
-                time.sleep(wait)
-        # Correct for offset
-        self.set_voltage(p_target_voltage)
-#        time.sleep(1)
-        # return success
-        print("Done moving")
-        return 1
+    def start_burst(self, channels, num_points, rate):
+        """
+            store num_points readings of V and/or I in the buffer, they are
+            triggered one after the other with a delay of 1/rate, so the
+            actual rate is lower by the integration time (the times of the
+            readings come from the instrument)
+        """
+        for channel in channels:
+            if channel not in BURST_ELEMENTS:
+                raise ValueError("%s can't store %s in its buffer" % (
+                    self.ID_name, channel))
+
+        num_points = min(int(num_points), BURST_MAX_POINTS)
+        self.burst_config = {"channels": list(channels),
+                             "num_points": num_points, "rate": float(rate)}
+
+        if not self.DEBUG:
+            with self.transaction():
+                # put back at the end of fetch_burst, measure reads one
+                # reading in ASCII
+                self.burst_config["settings"] = {
+                    "elements": str(self.ask(':FORM:ELEM?')).strip(),
+                    "concurrent": str(self.ask(':SENS:FUNC:CONC?')).strip(),
+                    "functions": str(self.ask(':SENS:FUNC?')).strip()}
+                self.write(':SENS:FUNC:CONC ON;:SENS:FUNC "VOLT","CURR"')
+                # 4 bytes floats, least significant byte first
+                self.write(':FORM:ELEM VOLT,CURR,TIME;:FORM:DATA SREAL;\
+:FORM:BORD SWAP')
+                self.write(':TRAC:CLE;:TRAC:POIN %i;:TRAC:FEED SENS;\
+:TRAC:FEED:CONT NEXT' % (num_points))
+                self.write(':ARM:SOUR IMM;:ARM:COUN 1;:TRIG:SOUR IMM;\
+:TRIG:COUN %i;:TRIG:DEL %g' % (num_points, 1.0 / rate))
+                self.write(':SYST:TIME:RES;:INIT')
+
+        return num_points / float(rate)
+
+    def wait_burst(self, count_query):
+        """
+            wait until the number of readings returned by count_query reaches
+            the number of points of the burst, returns the number of
+            readings available
+        """
+        config = self.burst_config
+        num_points = config["num_points"]
+        deadline = time.time() + num_points / config["rate"] + BURST_TIMEOUT
+
+        stored = int(float(self.ask(count_query)))
+        while stored < num_points and time.time() < deadline:
+            time.sleep(0.05)
+            stored = int(float(self.ask(count_query)))
+
+        if stored < num_points:
+            logging.error("%s only stored %i of the %i points of the burst" % (
+                self.ID_name, stored, num_points))
+        return min(stored, num_points)
+
+    def fetch_burst(self):
+        """
+            read the buffer filled by start_burst in one binary transfer,
+            returns the times of the readings relative to the first one and
+            an array with one column per channel
+        """
+        config = self.burst_config
+
+        if not self.DEBUG:
+            try:
+                num_points = self.wait_burst(':TRAC:POIN:ACT?')
+                # '#0' header, then VOLT, CURR and TIME of each reading
+                data = Tool.binary_block_data(
+                    self.ask_raw(':TRAC:DATA?', 2 + 12 * num_points + 1))
+            finally:
+                self.restore_burst_settings()
+            readings = np.frombuffer(data, dtype='<f4', count=3 * num_points)
+            readings = readings.reshape((num_points, 3)).astype(float)
+
+            elements = ['V', 'I']
+            block = readings[:, [elements.index(channel)
+                                 for channel in config["channels"]]]
+            times = readings[:, 2] - readings[:1, 2]
+        else:
+            num_points = config["num_points"]
+            block = np.random.random((num_points, len(config["channels"])))
+            times = np.arange(num_points) / config["rate"]
+
+        return times, block
+
+    def restore_burst_settings(self):
+        """
+            put back the settings changed by start_burst, the next readings
+            are single ASCII readings again
+        """
+        settings = self.burst_config.get("settings", {})
+        with self.transaction():
+            self.write(':TRAC:FEED:CONT NEV;:FORM:DATA ASC;:FORM:BORD NORM')
+            self.write(SINGLE_TRIGGER)
+            if "elements" in settings:
+                self.write(':FORM:ELEM %s' % (settings["elements"]))
+            if "concurrent" in settings:
+                self.write(':SENS:FUNC:CONC %s;:SENS:FUNC:OFF:ALL;\
+:SENS:FUNC %s' % (settings["concurrent"], settings["functions"]))
+
+    def move_voltage(self, p_reader, p_target_voltage, step=0.0005, wait=0.005,
+                     rate=None, max_step=None):
+        """
+            ramp the voltage to p_target_voltage at rate (in V/s, step/wait
+            by default), with a sweep of the source if possible (see
+            ramp.ramp). The ramp stops if p_reader.isStopped() becomes True.
+            Returns 1 once the target is reached, 0 if it was stopped.
+        """
+        if rate is None:
+            rate = step / float(wait)
+
+        if ramp.ramp(p_target_voltage, rate, lambda: self.measure('V'),
+                     self.set_voltage, max_step,
+                     getattr(p_reader, "isStopped", None), native=self):
+            print("Done moving")
+            return 1
+        else:
+            print("Stopping")
+            return 0
+
+    def start_sweep(self, start, target, duration):
+        """
+            sweep the voltage source linearly from start to target in
+            duration s with the SWE source mode, one point every
+            SWEEP_POINT_TIME at most. Returns False if the sweep isn't
+            possible, the ramp is then done by steps.
+        """
+        if self.DEBUG:
+            return False
+
+        num_points = int(min(SWEEP_MAX_POINTS,
+                             max(2, duration / SWEEP_POINT_TIME)))
+        # the integration time only makes the sweep slower
+        delay = duration / (num_points - 1)
+
+        self.sweep_config = {"start": start, "target": target,
+                             "duration": duration, "time": time.time()}
+
+        with self.transaction():
+            self.write(':SOUR:FUNC VOLT;:SOUR:CLE:AUTO OFF;\
+:SOUR:VOLT:MODE SWE;:SOUR:SWE:SPAC LIN;:SOUR:SWE:RANG BEST')
+            self.write(':SOUR:VOLT:STAR %f;:SOUR:VOLT:STOP %f;\
+:SOUR:SWE:POIN %i' % (start, target, num_points))
+            self.write(':ARM:SOUR IMM;:ARM:COUN 1;:TRIG:SOUR IMM;\
+:TRIG:COUN %i;:TRIG:DEL %g' % (num_points, delay))
+            self.write(':INIT')
+        return True
+
+    def sweep_done(self):
+        """
+            tell if the sweep started by start_sweep is over, the source then
+            goes back to a fixed output at the target and to single readings
+        """
+        if int(float(self.ask(':STAT:OPER:COND?'))) & IDLE_BIT:
+            with self.transaction():
+                self.write(':SOUR:VOLT:MODE FIX;:SOUR:VOLT %f' % (
+                    self.sweep_config["target"]))
+                self.write(SINGLE_TRIGGER)
+            return True
+        return False
+
+    def abort_sweep(self):
+        """
+            stop the sweep started by start_sweep, the output is fixed close
+            to where the sweep was
+        """
+        config = self.sweep_config
+        fraction = min(1, (time.time() - config["time"]) /
+                       max(config["duration"], SWEEP_POINT_TIME))
+        with self.transaction():
+            self.write(':ABOR;:SOUR:VOLT:MODE FIX')
+            self.write(':SOUR:VOLT %f' % (
+                config["start"] + fraction * (config["target"] -
+                                              config["start"])))
+            self.write(SINGLE_TRIGGER)
 
 #    def move_voltage(self, p_reader, p_target_voltage, step=0.001, wait=0.005, p_leak_check_code=0, p_leak_check_list=0, p_tolerance=1E-6):
 #        # Safely moves the voltage from its current value to a target voltage
@@ -1,3 +1,5 @@
+import numpy as np
+
 try:
     from . import Tool
 except:
@@ -13,6 +15,9 @@ param = {'V': 'V', 'I': 'A'}
 
 INTERFACE = Tool.INTF_GPIB
 
+# the buffer used for the bursts
+BURST_BUFFER = '"defbuffer1"'
+
 class Instrument(KT2400.Instrument):
 #class Instrument(Tool.MeasInstr):
     """"This class is the driver of the instrument Keithley 2450"""
@@ -75,6 +80,97 @@ class Instrument(KT2400.Instrument):
             print("voltage set to " + str(voltage) + " on " + self.ID_name)        
        
 
+    def start_burst(self, channels, num_points, rate):
+        """
+            store num_points readings in the buffer with the SimpleLoop
+            trigger model and a delay of 1/rate between them. The 2450
+            measures one function, the channel of the source is its source
+            value.
+        """
+        if self.DEBUG:
+            return super(Instrument, self).start_burst(channels, num_points,
+                                                       rate)
+
+        for channel in channels:
+            if channel not in KT2400.BURST_ELEMENTS:
+                raise ValueError("%s can't store %s in its buffer" % (
+                    self.ID_name, channel))
+
+        num_points = int(num_points)
+        self.burst_config = {"channels": list(channels),
+                             "num_points": num_points, "rate": float(rate)}
+
+        with self.transaction():
+            # put back at the end of fetch_burst
+            self.burst_config["settings"] = {
+                "functions": str(self.ask(':SENS:FUNC?')).strip()}
+            source = str(self.ask(':SOUR:FUNC?')).strip()
+            if source.startswith('VOLT'):
+                self.burst_config["elements"] = {'V': 'SOUR', 'I': 'READ'}
+                self.write(':SENS:FUNC "CURR"')
+            else:
+                self.burst_config["elements"] = {'V': 'READ', 'I': 'SOUR'}
+                self.write(':SENS:FUNC "VOLT"')
+
+            self.write(':FORM:DATA SREAL;:FORM:BORD SWAP')
+            self.write(':TRAC:CLE %s' % (BURST_BUFFER))
+            self.write(':TRIG:LOAD "SimpleLoop", %i, %g, %s' % (
+                num_points, 1.0 / rate, BURST_BUFFER))
+            self.write(':INIT')
+
+        return num_points / float(rate)
+
+    def fetch_burst(self):
+        """
+            read the buffer filled by start_burst in one binary transfer,
+            returns the times of the readings relative to the first one and
+            an array with one column per channel
+        """
+        if self.DEBUG:
+            return super(Instrument, self).fetch_burst()
+
+        config = self.burst_config
+        try:
+            num_points = self.wait_burst(':TRAC:ACT? %s' % (BURST_BUFFER))
+            if num_points == 0:
+                return np.zeros(0), np.zeros((0, len(config["channels"])))
+
+            # '#n' header, then READ, SOUR and REL of each reading
+            num_bytes = 12 * num_points
+            data = Tool.binary_block_data(self.ask_raw(
+                ':TRAC:DATA? 1, %i, %s, READ, SOUR, REL' % (num_points,
+                                                            BURST_BUFFER),
+                2 + len(str(num_bytes)) + num_bytes + 1))
+        finally:
+            self.restore_burst_settings()
+        readings = np.frombuffer(data, dtype='<f4', count=3 * num_points)
+        readings = readings.reshape((num_points, 3)).astype(float)
+
+        elements = ['READ', 'SOUR']
+        block = readings[:, [elements.index(config["elements"][channel])
+                             for channel in config["channels"]]]
+        return readings[:, 2] - readings[0, 2], block
+
+
+    def restore_burst_settings(self):
+        """
+            put back the ASCII format and the measure function changed by
+            start_burst
+        """
+        settings = self.burst_config.get("settings", {})
+        with self.transaction():
+            self.write(':FORM:DATA ASC')
+            if "functions" in settings:
+                self.write(':SENS:FUNC %s' % (settings["functions"]))
+
+    def start_sweep(self, start, target, duration):
+        """
+            the sweeps of the 2450 use other commands than the ones of the
+            2400, its ramps are done by steps
+        """
+        return False
+
+
 if __name__ == "__main__":
     i = Instrument("GPIB0::11",debug=False)
     print((i.identify("Hello, this is ")))
@@ -8,6 +8,7 @@ Modified by: Kevin Mortimer (Oct 7 2014)
 
 import random
 from . import Tool
+from . import ramp
 
 param = {'A': 'K', 'B': 'K'}
 
@@ -84,6 +85,11 @@ class Instrument(Tool.MeasInstr):
             print(('RAMP ' + format(value_loop, '.1g') +
                   sep + format(value_ramp_status, '.1g')))
 
+    def start_ramp(self, temp, loop, rate, timeout=None):
+        """ ramp the setpoint of loop to temp at rate in K/min, returns the
+        ramp.RampTask which follows it """
+        return ramp.lakeshore_ramp(self, loop, temp, rate, timeout=timeout)
+
 if __name__ == "__main__":
     i = Instrument("GPIB0::15", False)
     print(i.identify())
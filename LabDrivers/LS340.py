@@ -11,9 +11,11 @@ import random
 #import alarm_toolbox as alarm
 try:
     from . import Tool
+    from . import ramp
 except:
     import Tool
-import converter_RuOx_U02627 as convT
+    import ramp
+from LabTools.Fitting.Calibration import RUOX_U02627, OUT_OF_RANGE_T
 #import numpy as np
 
 param = {'A': 'K', 'B': 'K', 'C': 'kOhm', 'D': 'kOhm',
@@ -33,24 +35,7 @@ class Instrument(Tool.MeasInstr):
     def measure(self, channel):
         if channel in self.last_measure:
             if not self.DEBUG:
-                answer = 0
-                if param[channel] == 'K':
-                    # read in Kelvin thrithy
-                    try:
-                        answer = float(self.ask('KRDG?' + channel))
-                    except ValueError:
-                        answer = self.last_measure[channel]
-                elif param[channel] == 'kOhm':
-                    try:
-                        answer = float(self.ask('SRDG?' + channel))  # read in kOhm
-                    except ValueError:
-                        answer = self.last_measure[channel]
-                elif param[channel] == 'kOhm_to_K':
-                    try:
-                        answer = round(convT.R_to_T(
-                        float(self.ask('SRDG?' + channel))), 4)
-                    except ValueError:
-                        answer = self.last_measure[channel]
+                answer = self.convert(channel, self.ask(self.query(channel)))
             else:
                 answer = random.random()
             self.last_measure[channel] = answer
@@ -61,6 +46,49 @@ class Instrument(Tool.MeasInstr):
 
         return answer
 
+    def measure_many(self, channels):
+        """
+            measure a list of channels with a single message, the queries
+            are separated by semicolons and so are the readings
+        """
+        if self.DEBUG or len(channels) < 2 or \
+                not all([channel in param for channel in channels]):
+            return super(Instrument, self).measure_many(channels)
+
+        readings = str(self.ask(';'.join(
+            [self.query(channel) for channel in channels]))).split(';')
+
+        if len(readings) != len(channels):
+            # the answer was cut or garbled, read the channels one by one
+            return super(Instrument, self).measure_many(channels)
+
+        answers = []
+        for channel, reading in zip(channels, readings):
+            answer = self.convert(channel, reading)
+            self.last_measure[channel] = answer
+            answers.append(answer)
+        return answers
+
+    def query(self, channel):
+        """the query which reads channel"""
+        if param[channel] == 'K':
+            # read in Kelvin thrithy
+            return 'KRDG?' + channel[0]
+        else:
+            # read in kOhm
+            return 'SRDG?' + channel[0]
+
+    def convert(self, channel, reading):
+        """the value of channel from the reading returned by its query"""
+        try:
+            if param[channel] == 'kOhm_to_K':
+                return round(RUOX_U02627.R_to_T(float(reading),
+                                                 OUT_OF_RANGE_T), 4)
+            else:
+                return float(reading)
+        except ValueError:
+            return self.last_measure[channel]
+
     def setPoint(self, resistance, loop):  # float value of resistance in Ohm, loop 1 or 2
         if not self.DEBUG:
             if resistance > 1050:
@@ -77,6 +105,12 @@ class Instrument(Tool.MeasInstr):
             else:
                 print('invalid setpoint for the Lakeshore')
 
+    def start_ramp(self, setpoint, loop, rate, timeout=None):
+        """ramp the setpoint of loop to setpoint at rate in K/min (or in the
+        unit of the setpoint per minute), returns the ramp.RampTask which
+        follows it"""
+        return ramp.lakeshore_ramp(self, loop, setpoint, rate, timeout=timeout)
+
     # set an alarm that will actually ring from the instrument, this is to be
     # desactivated when the experimentalist is not him self in the lab for the
     # sake of others
@@ -16,6 +16,7 @@ import numpy as np
 import time
 import random
 import Tool # changed from "from . import Tool" (Simon, 2016-09-11)
+import ramp
 from struct import pack, unpack
 import pylab as plt
 
@@ -60,42 +61,26 @@ class Instrument(Tool.MeasInstr):
             i.write("OPOF")
             i.write("xyz")
             
-    def move_voltage(self, p_reader, chan_num, p_target_voltage, step=0.002, wait=0.001):
-#    def move_voltage(self, p_reader, p_target_voltage, step=0.001, wait=0.005):
-#        print 'Moving voltage'        
-        current_voltage = float(self.get_voltage(chan_num))
-        # Parse move direction cases
-        if current_voltage < p_target_voltage:  # If keithley needs to move up
-            # While the current_voltage is not within one increment of the target voltage
-            while current_voltage < p_target_voltage:
-                # Stop if it needs to
-                if p_reader.isStopped():
-                    print("Stopping")
-                    return 0
-                # Increment the current voltage by a safe amount
-                current_voltage += step
-                self.set_voltage(chan_num, current_voltage)
-                # Wait
-                time.sleep(wait)
-        elif current_voltage > p_target_voltage:  # If keithley needs to move up
-            # While the current_voltage is not within one increment of the
-            # target voltage
-            while current_voltage > p_target_voltage:
-                # Stop if it needs to
-                if p_reader.isStopped():
-                    print("Stopping")
-                    return 0
-                # Increment the current voltage by a safe amount
-                current_voltage -= step
-                self.set_voltage(chan_num, current_voltage)
-                # Wait
-                time.sleep(wait)
-        # Correct for offset
-        self.set_voltage(chan_num, p_target_voltage)
-#        time.sleep(1)
-        # return success
-        print("Done moving")
-        return 1
+    def move_voltage(self, p_reader, chan_num, p_target_voltage, step=0.002, wait=0.001,
+                     rate=None, max_step=None):
+        """
+        ramp the voltage of the channel chan_num to p_target_voltage at rate
+        (in V/s, step/wait by default), see ramp.step. The ramp stops if
+        p_reader.isStopped() becomes True. Returns 1 once the target is
+        reached, 0 if it was stopped.
+        """
+        if rate is None:
+            rate = step / float(wait)
+
+        if ramp.ramp(p_target_voltage, rate,
+                     lambda: self.get_voltage(chan_num),
+                     lambda voltage: self.set_voltage(chan_num, voltage),
+                     max_step, getattr(p_reader, "isStopped", None)):
+            print("Done moving")
+            return 1
+        else:
+            print("Stopping")
+            return 0
         
 if __name__ == "__main__":
     
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 #import visa
 
+import time
 from collections import OrderedDict
 from numpy import nan
+import numpy as np
 
 try:
     from . import Tool
@@ -16,6 +18,28 @@ param = OrderedDict([('X', 'V'), ('Y', 'V'), ('R', 'V'), ('PHASE', 'degrees'),
 
 INTERFACE = Tool.INTF_GPIB
 
+# parameters of the SNAP? command, which reads between 2 and 6 of these
+# values at the same instant
+SNAP_PARAMETERS = OrderedDict([('X', 1), ('Y', 2), ('R', 3), ('PHASE', 4),
+                               ('AIN_1', 5), ('AIN_2', 6), ('AIN_3', 7),
+                               ('AIN_4', 8), ('FREQ', 9)])
+
+SNAP_MAX_PARAMETERS = 6
+
+# sample rates of the data buffers, SRAT i stores 62.5 mHz * 2**i points/s
+BURST_RATES = [0.0625 * 2 ** i for i in range(14)]
+
+# the two buffers store what the displays CH1 and CH2 show, which are set
+# with DDEF i,j,0
+BURST_DISPLAYS = [OrderedDict([('X', 0), ('R', 1), ('AIN_1', 3), ('AIN_2', 4)]),
+                  OrderedDict([('Y', 0), ('PHASE', 1), ('AIN_3', 3),
+                               ('AIN_4', 4)])]
+
+BURST_MAX_POINTS = 16383
+
+# extra time given to the lock-in to fill its buffers, in s
+BURST_TIMEOUT = 5
+
 
 import logging
 
@@ -68,6 +92,128 @@ class Instrument(Tool.MeasInstr):
             answer = None
         return answer
 
+    def measure_many(self, channels):
+        """ Measure a list of channels and return the list of their values.
+        The channels which the SNAP? command can read are read together, by
+        groups of up to six, the others are measured one by one.
+
+        Args:
+            channels (list): the channels to measure.
+        """
+        snap_channels = []
+        for channel in channels:
+            if channel in SNAP_PARAMETERS and channel not in snap_channels:
+                snap_channels.append(channel)
+
+        answers = {}
+        if not self.DEBUG:
+            for start in range(0, len(snap_channels), SNAP_MAX_PARAMETERS):
+                group = snap_channels[start:start + SNAP_MAX_PARAMETERS]
+                # SNAP? needs at least two parameters
+                if len(group) > 1:
+                    answers.update(zip(group, self.snap(group)))
+
+        values = []
+        for channel in channels:
+            if channel in answers:
+                self.last_measure[channel] = answers[channel]
+                values.append(answers[channel])
+            else:
+                values.append(self.measure(channel))
+        return values
+
+    def snap(self, channels):
+        """ Read between 2 and 6 values at the same instant, the channels
+        must be keys of SNAP_PARAMETERS.
+
+        Args:
+            channels (list): the channels to read.
+        """
+        codes = [str(SNAP_PARAMETERS[channel]) for channel in channels]
+        try:
+            answer = [float(value) for value in
+                      self.ask('SNAP? ' + ','.join(codes)).split(',')]
+        except ValueError:
+            answer = []
+
+        if len(answer) != len(channels):
+            logging.error("The values returned by the lockin GPIB::%s to \
+SNAP? were not understood" % (self.resource_name))
+            answer = [nan] * len(channels)
+        return answer
+
+    def start_burst(self, channels, num_points, rate):
+        """ Start filling the data buffers with num_points values of the
+        channels, one per display (X or R or AIN_1 or AIN_2 on CH1, Y or
+        PHASE or AIN_3 or AIN_4 on CH2). The rate is rounded to the closest
+        available one (62.5 mHz to 512 Hz by powers of two). Returns the
+        time the acquisition takes, in s.
+
+        Args:
+            channels (list): the one or two channels to acquire.
+            num_points (int): the number of points, up to 16383.
+            rate (float): the number of points per second.
+        """
+        buffers = []
+        for channel in channels:
+            displays = [i for i, display in enumerate(BURST_DISPLAYS)
+                        if channel in display]
+            if not displays or displays[0] + 1 in buffers:
+                raise ValueError("The lockin can't store %s in its buffers \
+together with %s" % (channel, channels))
+            buffers.append(displays[0] + 1)
+
+        num_points = min(int(num_points), BURST_MAX_POINTS)
+        index = int(np.argmin(np.abs(np.log2(np.array(BURST_RATES) / rate))))
+
+        self.burst_config = {"channels": list(channels), "buffers": buffers,
+                             "num_points": num_points,
+                             "rate": BURST_RATES[index]}
+
+        if not self.DEBUG:
+            with self.transaction():
+                for channel, buffer in zip(channels, buffers):
+                    self.write('DDEF %i,%i,0' % (
+                        buffer, BURST_DISPLAYS[buffer - 1][channel]))
+                # one shot, internal sample rate
+                self.write('SRAT %i;SEND 0;TSTR 0' % (index))
+                self.write('REST;STRT')
+
+        return num_points / BURST_RATES[index]
+
+    def fetch_burst(self):
+        """ Wait for the end of the acquisition started by start_burst and
+        read the buffers with TRCB?, as 4 bytes floats. Returns the times of
+        the points relative to the first one and an array with one column
+        per channel.
+        """
+        config = self.burst_config
+        num_points = config["num_points"]
+
+        if not self.DEBUG:
+            deadline = time.time() + num_points / config["rate"] + BURST_TIMEOUT
+            stored = int(self.ask('SPTS?'))
+            while stored < num_points and time.time() < deadline:
+                time.sleep(0.05)
+                stored = int(self.ask('SPTS?'))
+            if stored < num_points:
+                logging.error("The lockin GPIB::%s only stored %i of the %i \
+points of the burst" % (self.resource_name, stored, num_points))
+                num_points = stored
+            self.write('PAUS')
+
+            block = np.empty((num_points, len(config["buffers"])))
+            for column, buffer in enumerate(config["buffers"]):
+                data = self.ask_raw('TRCB? %i,0,%i' % (buffer, num_points),
+                                    4 * num_points)
+                block[:, column] = np.frombuffer(data, dtype='<f4',
+                                                 count=num_points)
+        else:
+            block = 1.23e-4 * np.random.random(
+                (num_points, len(config["buffers"])))
+
+        return np.arange(num_points) / config["rate"], block
+
     def set_scale(self, scale):
         """ Set the sensitivity of the input channel. Refer to SR830 
         documentation for the full list of settings
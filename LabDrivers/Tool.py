@@ -5,6 +5,11 @@ Created on Fri Jun 21 17:19:35 2013
 @author: pfduc
 """
 import sys, io
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
 from collections import OrderedDict
 from importlib import import_module
 
@@ -68,6 +73,140 @@ except:
 
  # Tobe moved into InstrumentHub class as this class should only be GUI
 
+# priorities of the transactions on a bus, the lowest value goes first : the
+# setpoints are written before the pending readings
+PRIORITY_SETPOINT = 0
+PRIORITY_READ = 1
+
+
+class PriorityLock(object):
+    """
+        reentrant lock which is given to the waiting thread of lowest
+        priority value, in the order of arrival for equal priorities
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.owner = None
+        self.count = 0
+        self.waiting = []
+        self.tickets = itertools.count()
+
+    def acquire(self, priority=PRIORITY_READ):
+        me = threading.current_thread()
+        with self.condition:
+            if self.owner is me:
+                self.count = self.count + 1
+                return
+
+            ticket = (priority, next(self.tickets))
+            heapq.heappush(self.waiting, ticket)
+            while self.owner is not None or self.waiting[0] != ticket:
+                self.condition.wait()
+
+            heapq.heappop(self.waiting)
+            self.owner = me
+            self.count = 1
+
+    def release(self):
+        with self.condition:
+            if self.owner is not threading.current_thread():
+                raise RuntimeError("PriorityLock released by a thread which \
+doesn't hold it")
+            self.count = self.count - 1
+            if self.count == 0:
+                self.owner = None
+                self.condition.notify_all()
+
+
+class BusManager(object):
+    """
+        arbitrates the access to the physical buses (see MeasInstr.bus_id) :
+        one PriorityLock per bus so that the transactions of different
+        threads (script, GUI, readers of other buses) on the same bus can't
+        interleave, while the different buses stay independent.
+        The time waited for each bus and the time it was held are recorded.
+    """
+
+    def __init__(self):
+        self.locks = {}
+        self.bus_stats = {}
+        self.mutex = threading.Lock()
+
+    def bus_lock(self, bus):
+        with self.mutex:
+            if bus not in self.locks:
+                self.locks[bus] = PriorityLock()
+                self.bus_stats[bus] = {"transactions": 0, "wait_time": 0.0,
+                                       "max_wait_time": 0.0, "busy_time": 0.0,
+                                       "max_busy_time": 0.0,
+                                       "last_busy_time": 0.0}
+            return self.locks[bus]
+
+    @contextmanager
+    def transaction(self, instrument, priority=PRIORITY_READ):
+        """hold the bus of instrument for the duration of the with block"""
+        bus = instrument.bus_id()
+        if bus is None:
+            # nothing to share
+            yield
+            return
+
+        lock = self.bus_lock(bus)
+        start = time.time()
+        lock.acquire(priority)
+        acquired = time.time()
+        try:
+            yield
+        finally:
+            outermost = lock.count == 1
+            lock.release()
+            if outermost:
+                self.record(bus, acquired - start, time.time() - acquired)
+
+    def record(self, bus, wait_time, busy_time):
+        with self.mutex:
+            stats = self.bus_stats[bus]
+            stats["transactions"] = stats["transactions"] + 1
+            stats["wait_time"] = stats["wait_time"] + wait_time
+            stats["max_wait_time"] = max(stats["max_wait_time"], wait_time)
+            stats["busy_time"] = stats["busy_time"] + busy_time
+            stats["max_busy_time"] = max(stats["max_busy_time"], busy_time)
+            stats["last_busy_time"] = busy_time
+
+    def stats(self):
+        """the timing statistics of the transactions, for each bus"""
+        with self.mutex:
+            return dict([(bus, dict(stats)) for bus, stats in
+                         list(self.bus_stats.items())])
+
+
+@contextmanager
+def no_transaction():
+    yield
+
+
+def binary_block_data(data):
+    """
+        the bytes of an IEEE 488.2 binary block : '#n' followed by the n
+        digits of the length of the data, or '#0' followed by the data up to
+        the end of the transfer (the end of line is then kept, the caller
+        knows how many bytes it expects). The data is returned unchanged if
+        it has no header.
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('latin1')
+
+    if data[:1] != b'#':
+        return data
+
+    num_digits = int(data[1:2])
+    if num_digits == 0:
+        return data[2:]
+    else:
+        length = int(data[2:2 + num_digits])
+        return data[2 + num_digits:2 + num_digits + length]
+
 
 
 
@@ -101,6 +240,9 @@ class MeasInstr(object):
     # the name of the communication port
     resource_name = ''
 
+    # the BusManager of the InstrumentHub the instrument belongs to
+    bus_manager = None
+
     #**kwargs can be any of the following param "timeout", "term_chars","chunk_size", "lock","delay", "send_end","values_format"
     # example inst=MeasInstr('GPIB0::0','Inst_name',True,timeout=12,term_char='\n')
     # other exemple inst=MeasInstr('GPIB0::0',timeout=12,term_char='\n')
@@ -220,15 +362,35 @@ class MeasInstr(object):
             
             return msg + self.ID_name
 
+    def transaction(self, priority=PRIORITY_READ):
+        """
+            context manager holding the bus of the instrument, the commands
+            sent inside a with block can't be interleaved with the ones of
+            other threads on the same bus
+        """
+        if self.bus_manager is None:
+            return no_transaction()
+        else:
+            return self.bus_manager.transaction(self, priority)
+
     def read(self, num_bytes=None):
         """ Reads data available on the port (up to a newline char) """
+        with self.transaction():
+            return self._read(num_bytes)
+
+    def _read(self, num_bytes=None):
         if not self.DEBUG:
             
             if self.interface == INTF_VISA:
                 
                 answer = self.connection.read()
 
-            elif self.interface == INTF_SERIAL or self.interface == INTF_PROLOGIX:
+            elif self.interface == INTF_PROLOGIX:
+                
+                # the controller asks the instrument for its answer if needed
+                answer = self.connection.read_reply(num_bytes)
+
+            elif self.interface == INTF_SERIAL:
                 
                 if not num_bytes == None:
                     
@@ -238,6 +400,8 @@ class MeasInstr(object):
                     
                     answer = self.connection.readline()
 
+            if self.interface == INTF_SERIAL or self.interface == INTF_PROLOGIX:
+
                 # remove the newline character if it is at the end
                 if len(answer) > 1:
                     
@@ -257,18 +421,70 @@ class MeasInstr(object):
             
         return answer
 
+    def read_raw(self, num_bytes=None):
+        """ Reads binary data, the end of line characters are kept """
+        with self.transaction():
+            if self.DEBUG:
+                return b''
+
+            if self.interface == INTF_VISA:
+                # the transfer ends with EOI
+                return self.connection.read_raw()
+
+            elif self.interface == INTF_PROLOGIX:
+                return self.connection.read_reply(num_bytes)
+
+            elif self.interface == INTF_SERIAL:
+                if num_bytes is None:
+                    return self.connection.readline()
+                else:
+                    return self.connection.read(num_bytes)
+
+    def ask_raw(self, msg, num_bytes=None):
+        """ Writes a command to the instrument and reads its binary reply """
+        with self.transaction():
+            self.write(msg)
+            return self.read_raw(num_bytes)
+
+    def start_burst(self, channels, num_points, rate):
+        """
+            Start the acquisition of num_points values of the channels in
+            the internal buffer of the instrument, at rate points per
+            second. Returns the time the acquisition should take, in s.
+            Only the instruments which have a buffer implement it.
+        """
+        raise NotImplementedError("%s has no burst mode" % (self.ID_name))
+
+    def fetch_burst(self):
+        """
+            Read back the points of the acquisition started by start_burst
+            in one transfer. Returns the times of the points relative to the
+            first one and an array with one column per channel.
+        """
+        raise NotImplementedError("%s has no burst mode" % (self.ID_name))
+
+    def burst(self, channels, num_points, rate):
+        """ Acquire a block of points with start_burst and fetch_burst """
+        time.sleep(self.start_burst(channels, num_points, rate))
+        return self.fetch_burst()
+
     def write(self, msg):
         """ 
             Writes command to the instrument but does not check for a response
         """
-        
+        # a write is usually a setpoint, it goes before the pending readings
+        with self.transaction(PRIORITY_SETPOINT):
+            return self._write(msg)
+
+    def _write(self, msg):
         if not self.DEBUG:
             
             if self.interface == INTF_PROLOGIX:
-                # make sure the address is the right one (might be faster to
-                # check for that, might be not)
-                self.connection.write("++addr %s" % (self.resource_name))
-            answer = self.connection.write(msg + self.term_chars)
+                # the controller only sends ++addr if the address changed
+                answer = self.connection.send(self.resource_name,
+                                              msg + self.term_chars)
+            else:
+                answer = self.connection.write(msg + self.term_chars)
             
         else:
             
@@ -278,7 +494,10 @@ class MeasInstr(object):
 
     def ask(self, msg, num_bytes=None):
         """ Writes a command to the instrument and reads its reply """
-        
+        with self.transaction():
+            return self._ask(msg, num_bytes)
+
+    def _ask(self, msg, num_bytes=None):
         answer = None
         
         if not self.DEBUG:
@@ -297,8 +516,15 @@ class MeasInstr(object):
                 
                 try:
                     
-                    self.write(msg)
-                    answer = self.read(num_bytes)
+                    if self.interface == INTF_PROLOGIX:
+                        # another instrument of the bus must not talk to the
+                        # controller between the command and the answer
+                        with self.connection.lock:
+                            self.write(msg)
+                            answer = self.read(num_bytes)
+                    else:
+                        self.write(msg)
+                        answer = self.read(num_bytes)
                     
                 except:
                     print("\n\n### command %s bugged###\n\n"%msg)
@@ -417,6 +643,43 @@ class MeasInstr(object):
         """
         return None
 
+    def measure_many(self, channels):
+        """
+            measure a list of channels and return the list of their values,
+            the DataTaker uses it to read all the channels of an instrument
+            at once. Instruments which can read several channels with a
+            single command should redefine it, by default measure is called
+            for each channel.
+        """
+        return [self.measure(channel) for channel in channels]
+
+    def bus_id(self):
+        """
+            identify the physical bus through which the instrument is
+            reached, the DataTaker queries instruments on different buses at
+            the same time and the ones sharing a bus one after the other.
+            None means that measure doesn't talk to any hardware (TIME,
+            DICE...), the instrument is then simply measured in the DataTaker
+            thread. Instruments with a custom connection should redefine it.
+        """
+        if self.interface == INTF_PROLOGIX:
+            # all the GPIB addresses go through the COM port of the
+            # controller
+            return "%s:%s" % (INTF_PROLOGIX, id(self.connection))
+
+        elif self.interface == INTF_VISA:
+            board = str(self.resource_name).split("::")[0]
+            if board.upper().startswith("GPIB"):
+                return "%s:%s" % (INTF_VISA, board)
+            else:
+                return "%s:%s" % (INTF_VISA, self.resource_name)
+
+        elif self.interface == INTF_SERIAL:
+            return "%s:%s" % (INTF_SERIAL, self.resource_name)
+
+        else:
+            return None
+
 
 class InstrumentHub(QObject):
     """
@@ -450,6 +713,9 @@ class InstrumentHub(QObject):
         # Tool.MeasInstr and implement a measure(string) function)
         self.instrument_list = OrderedDict()
 
+        # one lock per physical bus shared by all the instruments of the hub
+        self.bus_manager = BusManager()
+
         # this will be the list of [GPIB address, parameter name] pairs
         # the read data command can then call instrument_list[port].measure param for
         # each element in this list
@@ -506,8 +772,8 @@ class InstrumentHub(QObject):
                 
                 self.emit(SIGNAL("changed_list()"))
                 
-        print self.port_param_pairs
-        print self.instrument_list
+        print(self.port_param_pairs)
+        print(self.instrument_list)
         
     def connect_instrument(self,instr_name,device_port,param,send_signal=True):
         #device_port should contain the name of the GPIB or the COM port
@@ -522,7 +788,7 @@ class InstrumentHub(QObject):
             class_inst=import_module("."+instr_name,package=utils.LABDRIVER_PACKAGE_NAME)
         
         if device_port in self.instrument_list:
-            print 'Instrument already exists at' + device_port
+            print('Instrument already exists at' + device_port)
             # Another data channel already used this instrument - make
             # sure it's the same type!!!
             if instr_name != self.instrument_list[device_port].ID_name:
@@ -560,6 +826,7 @@ class InstrumentHub(QObject):
                     
                     device_port = obj.resource_name
 
+                obj.bus_manager = self.bus_manager
                 self.instrument_list[device_port] = obj
 
                 print("Connect_instrument: Connected %s to %s to measure %s" %
@@ -585,6 +852,10 @@ class InstrumentHub(QObject):
         """get the port name together with the associated parameter measured"""
         return self.port_param_pairs
 
+    def get_bus_stats(self):
+        """get the timing statistics of the transactions on each bus"""
+        return self.bus_manager.stats()
+
     def get_instrument_nb(self):
         """get the number of instrument in the hub"""
         return len(self.port_param_pairs)
@@ -805,7 +1076,7 @@ def test_prologix_Hub():
 
         if inst != None:
 
-            print insts[inst].identify()
+            print(insts[inst].identify())
 
     print(h.get_prologix_gpib_ports())
 
@@ -10,12 +10,17 @@ Created on Mon Aug 12 16:16:02 2013
 import time
 import random
 import Tool
+import ramp
 
 
 param = {'V': 'V'}
 
 INTERFACE = Tool.INTF_VISA
 
+# limits of the interval of a step of a program, in s
+PROGRAM_MIN_INTERVAL = 0.1
+PROGRAM_MAX_INTERVAL = 3600
+
 class Instrument(Tool.MeasInstr):
 
     def __init__(self, resource_name, debug=False, V_step_limit=None):
@@ -155,43 +160,61 @@ class Instrument(Tool.MeasInstr):
                 source_mode, source_mode, output_level, protection, compliance_level)
             self.write(s)
             
-    def move_voltage(self, p_reader, p_target_voltage, step=0.0001, wait=0.001):
-    #    def move_voltage(self, p_reader, p_target_voltage, step=0.001, wait=0.005):
-    #        print 'Moving voltage'        
-        current_voltage = self.measure('V')
-        # Parse move direction cases
-        if current_voltage < p_target_voltage:  # If keithley needs to move up
-            # While the current_voltage is not within one increment of the
-            # target voltage
-            while current_voltage < p_target_voltage:
-                # Stop if it needs to
-                if p_reader.isStopped():
-                    print "Stopping"
-                    return 0
-                # Increment the current voltage by a safe amount
-                current_voltage += step
-                self.set_voltage(current_voltage)
-                # Wait
-                time.sleep(wait)
-        elif current_voltage > p_target_voltage:  # If keithley needs to move up
-            # While the current_voltage is not within one increment of the
-            # target voltage
-            while current_voltage > p_target_voltage:
-                # Stop if it needs to
-                if p_reader.isStopped():
-                    print "Stopping"
-                    return 0
-                # Decrement the current voltage by a safe amount
-                current_voltage -= step
-                self.set_voltage(current_voltage)
-                # Wait
-                time.sleep(wait)
-        # Correct for offset
-        self.set_voltage(p_target_voltage)
-    #        time.sleep(1)
-        # return success
-    #        print "Done moving"
-        return 1
+    def move_voltage(self, p_reader, p_target_voltage, step=0.0001, wait=0.001,
+                     rate=None, max_step=None):
+        """
+            ramp the voltage to p_target_voltage at rate (in V/s, step/wait
+            by default), with a program of the source if possible (see
+            ramp.ramp). The ramp stops if p_reader.isStopped() becomes True.
+            Returns 1 once the target is reached, 0 if it was stopped.
+        """
+        if rate is None:
+            rate = step / float(wait)
+
+        if self.V_step_limit is not None:
+            # set_voltage refuses the bigger steps
+            if max_step is None:
+                max_step = rate * ramp.MAX_STEP_TIME
+            max_step = min(max_step, 0.99 * self.V_step_limit)
+
+        if ramp.ramp(p_target_voltage, rate, self.measure, self.set_voltage,
+                     max_step, getattr(p_reader, "isStopped", None),
+                     native=self):
+            return 1
+        else:
+            return 0
+
+    def start_sweep(self, start, target, duration):
+        """
+            ramp the output to target with a program of a single step whose
+            slope time is duration. Returns False if the duration is out of
+            the range of the programs, the ramp is then done by steps.
+        """
+        if self.DEBUG or duration > PROGRAM_MAX_INTERVAL:
+            return False
+
+        interval = max(duration, PROGRAM_MIN_INTERVAL)
+        self.sweep_end = time.time() + interval
+
+        with self.transaction():
+            self.write(':PROG:EDIT:STAR')
+            self.write(':SOUR:FUNC VOLT;:SOUR:LEV %f' % target)
+            self.write(':PROG:EDIT:END')
+            self.write(':PROG:REP 0;:PROG:INT %f;:PROG:SLOP %f' % (
+                interval, duration))
+            self.write(':PROG:RUN')
+        return True
+
+    def sweep_done(self):
+        """
+            tell if the program started by start_sweep is over, the source
+            doesn't report it so it is over after its interval
+        """
+        return time.time() >= self.sweep_end
+
+    def abort_sweep(self):
+        """ hold the program started by start_sweep where the output is """
+        self.write(':PROG:HOLD')
 
 
 """ BUNCH OF COMMENTED FUNCTIONS FROM THE ORIGINAL KT2400 DRIVER"""
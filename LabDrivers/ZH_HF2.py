@@ -12,6 +12,10 @@ param = OrderedDict([('X','V'), ('Y', 'V'),('X2','V'), ('Y2', 'V'),('X3','V'), (
      
 INTERFACE = Tool.INTF_NONE  
 
+# demodulator and component of the sample giving each parameter
+DEMOD_PARAMETERS = {'X': (0, 'x'), 'Y': (0, 'y'), 'X2': (1, 'x'),
+                    'Y2': (1, 'y'), 'X3': (2, 'x'), 'Y3': (2, 'y')}
+
 class Instrument(Tool.MeasInstr):  
     def __init__(self, name, debug = False): 
         super(Instrument, self).__init__(None, name = 'ZH_HF2', debug=debug, interface = INTERFACE)
@@ -37,6 +41,10 @@ class Instrument(Tool.MeasInstr):
     def __del__(self):
         super(Instrument, self).__del__()
 
+    def bus_id(self):
+        # the samples come from the ziDAQServer
+        return "zhinst:localhost:8005"
+
     def measure(self,channel):
 
         if channel in param:
@@ -66,6 +74,26 @@ class Instrument(Tool.MeasInstr):
             answer=None
         return answer         
 
+    def measure_many(self, channels):
+        """
+            measure a list of channels, the sample of each demodulator is
+            fetched only once for all its channels
+        """
+        samples = {}
+        answers = []
+        for channel in channels:
+            if channel in DEMOD_PARAMETERS:
+                demod, component = DEMOD_PARAMETERS[channel]
+                if demod not in samples:
+                    samples[demod] = self.get_sample(
+                        '/dev855/demods/%i/sample' % (demod))
+                answer = samples[demod][component][0]
+                self.last_measure[channel] = answer
+            else:
+                answer = self.measure(channel)
+            answers.append(answer)
+        return answers
+
     def get_sample(self, stri):
         try:
             return self.daq.getSample(stri) 
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:41:27 2026
+
+License: see LICENSE.txt file
+
+ramping of the output of the sources (move_voltage of KT2400, SIM900,
+YOKOGS200...) at a given rate.
+
+    - the instruments which can sweep their output by themselves (Keithley
+      sweep, Yokogawa program) implement start_sweep, sweep_done and
+      abort_sweep, the ramp is then a single transaction and the bus is only
+      used to check if it is over
+    - the others are stepped : the steps are written every STEP_INTERVAL and
+      their size is the distance the rate allows since the previous one, so
+      a slow bus gives bigger steps instead of a slower ramp, up to max_step
+
+A ramp can be stopped with is_stopped, usually the isStopped method of the
+DataTaker, the output then stays where it was.
+
+The slow ramps that the instruments do by themselves (magnet sweep of the
+IPS120, setpoint ramps of the Lakeshores) are followed by a RampTask from a
+thread of its own, so the script keeps measuring the other channels while
+they go on.
+"""
+
+import time
+import logging
+import threading
+import traceback
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # python 2 has no monotonic clock
+    monotonic = time.time
+
+# time between two steps of a stepped ramp, in s
+STEP_INTERVAL = 0.02
+
+# the steps of a stepped ramp are limited to the distance covered at the
+# rate during this time, in s, when the bus is slow
+MAX_STEP_TIME = 0.1
+
+# time between two checks of the end of a native sweep, in s
+SWEEP_POLL_INTERVAL = 0.1
+
+# extra time given to a native sweep before it is considered stuck, in s
+SWEEP_TIMEOUT = 10
+
+# time between two checks of the end of a RampTask, in s
+RAMP_POLL_INTERVAL = 1
+
+# states of a RampTask
+RAMP_RUNNING = "running"
+RAMP_DONE = "done"
+RAMP_ABORTED = "aborted"
+RAMP_TIMED_OUT = "timed out"
+RAMP_FAILED = "failed"
+
+
+def ramp(target, rate, get_value, set_value, max_step=None, is_stopped=None,
+         native=None):
+    """
+        move an output from its present value (get_value()) to target at
+        rate (in units per s) and return True, or False if is_stopped()
+        became True on the way. native is the instrument if it can sweep by
+        itself (see the module docstring), set_value is then only used if
+        start_sweep refuses the sweep.
+    """
+    start_value = float(get_value())
+    target = float(target)
+
+    if native is not None and start_value != target:
+        reached = sweep(native, start_value, target, rate, is_stopped)
+        if reached is not None:
+            return reached
+
+    return step(start_value, target, rate, set_value, max_step, is_stopped)
+
+
+def sweep(native, start_value, target, rate, is_stopped=None):
+    """
+        ramp with the sweep of the instrument native, returns None if it
+        can't do this sweep
+    """
+    duration = abs(target - start_value) / float(rate)
+    if not native.start_sweep(start_value, target, duration):
+        return None
+
+    deadline = monotonic() + duration + SWEEP_TIMEOUT
+    while not native.sweep_done():
+        if is_stopped is not None and is_stopped():
+            native.abort_sweep()
+            logging.info("ramp : the sweep to %g was stopped" % (target))
+            return False
+
+        if monotonic() > deadline:
+            native.abort_sweep()
+            logging.error("ramp : the sweep to %g isn't over after %.1f s, \
+it was aborted" % (target, duration + SWEEP_TIMEOUT))
+            return False
+
+        time.sleep(SWEEP_POLL_INTERVAL)
+
+    return True
+
+
+def step(start_value, target, rate, set_value, max_step=None,
+         is_stopped=None, interval=STEP_INTERVAL):
+    """
+        ramp by steps written every interval, the output never moves faster
+        than rate whatever the time set_value takes
+    """
+    if max_step is None:
+        max_step = rate * MAX_STEP_TIME
+
+    if target >= start_value:
+        direction = 1
+    else:
+        direction = -1
+
+    value = start_value
+    last_time = monotonic()
+    while value != target:
+        if is_stopped is not None and is_stopped():
+            logging.info("ramp : stopped at %g on the way to %g" % (
+                value, target))
+            return False
+
+        next_time = last_time + interval
+        now = monotonic()
+        if now < next_time:
+            time.sleep(next_time - now)
+            now = monotonic()
+
+        # the distance allowed since the previous step
+        distance = min(rate * (now - last_time), max_step)
+        last_time = now
+
+        if abs(target - value) <= distance:
+            value = target
+        else:
+            value = value + direction * distance
+        set_value(value)
+
+    return True
+
+
+class RampTask(object):
+    """
+        a ramp which the instrument does by itself, followed in the
+        background like a future : is_done(task) is polled every
+        poll_interval by a thread of the task, after the present value is
+        read into task.value with read_value() if given. The script can go on measuring and
+        check done(), or wait() for the end. abort() calls the abort
+        function given by the driver, the ramp is aborted as well if it
+        isn't over after timeout s.
+    """
+
+    def __init__(self, is_done, abort=None, read_value=None, start_value=None,
+                 target=None, poll_interval=RAMP_POLL_INTERVAL, timeout=None,
+                 name="ramp"):
+        self.is_done = is_done
+        self.abort_function = abort
+        self.read_value = read_value
+        self.start_value = start_value
+        self.target = target
+        self.value = start_value
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.name = name
+
+        self.state = RAMP_RUNNING
+        self.error = None
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.abort_requested = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, name="RampTask %s" % (
+            name))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        if self.timeout is not None:
+            deadline = monotonic() + self.timeout
+        else:
+            deadline = None
+
+        try:
+            while not self.abort_requested.is_set():
+                if self.read_value is not None:
+                    self.value = self.read_value()
+
+                if self.is_done(self):
+                    self.finish(RAMP_DONE)
+                    return
+
+                if deadline is not None and monotonic() > deadline:
+                    logging.error("RampTask : the ramp of %s isn't over after \
+%.0f s, it is aborted" % (self.name, self.timeout))
+                    self.abort_ramp()
+                    self.finish(RAMP_TIMED_OUT)
+                    return
+
+                self.abort_requested.wait(self.poll_interval)
+
+            self.abort_ramp()
+            self.finish(RAMP_ABORTED)
+
+        except Exception as e:
+            logging.error("RampTask : the ramp of %s failed\n%s" % (
+                self.name, traceback.format_exc()))
+            self.error = e
+            self.finish(RAMP_FAILED)
+
+    def abort_ramp(self):
+        if self.abort_function is not None:
+            self.abort_function()
+
+    def finish(self, state):
+        with self.lock:
+            self.state = state
+            self.finished.set()
+            callbacks = self.callbacks
+            self.callbacks = []
+
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """call callback(task) at the end of the ramp, from its thread"""
+        with self.lock:
+            if not self.finished.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def done(self):
+        """tell if the ramp is over, whatever the way it ended"""
+        return self.finished.is_set()
+
+    def result(self):
+        """True if the ramp reached its target, None while it runs"""
+        if not self.done():
+            return None
+        return self.state == RAMP_DONE
+
+    def progress(self):
+        """
+            fraction of the ramp done according to the last value read, None
+            if the task doesn't know its start and target values
+        """
+        if self.value is None or self.start_value is None or \
+                self.target is None:
+            return None
+        if self.target == self.start_value:
+            return 1.0
+        fraction = (self.value - self.start_value) / float(
+            self.target - self.start_value)
+        return min(1.0, max(0.0, fraction))
+
+    def wait(self, timeout=None, is_stopped=None):
+        """
+            wait for the end of the ramp, returns result(). It returns None
+            early if timeout s passed or if is_stopped() became True, the
+            ramp goes on.
+        """
+        if timeout is not None:
+            deadline = monotonic() + timeout
+
+        while not self.finished.wait(SWEEP_POLL_INTERVAL):
+            if is_stopped is not None and is_stopped():
+                return None
+            if timeout is not None and monotonic() > deadline:
+                return None
+
+        return self.result()
+
+    def abort(self):
+        """stop the ramp and wait for the task to end, returns result()"""
+        self.abort_requested.set()
+        self.finished.wait()
+        return self.result()
+
+
+def lakeshore_ramp(instrument, loop, setpoint, rate,
+                   poll_interval=RAMP_POLL_INTERVAL, timeout=None):
+    """
+        ramp the setpoint of the control loop of a Lakeshore temperature
+        controller (LS332, LS340) to setpoint at rate in K/min and return
+        the RampTask which follows it. It is done when the controller says
+        the setpoint ramp is over (RAMPST?), an abort sets the setpoint to
+        the temperature of the control input. The ramp setting of the loop
+        is put back at the end, the later SETP don't ramp.
+    """
+    if instrument.DEBUG:
+        return RampTask(lambda task: True, start_value=setpoint, target=setpoint,
+                        name="%s loop %i" % (instrument.ID_name, loop))
+
+    with instrument.transaction():
+        control_input = str(instrument.ask('CSET? %i' % (loop))).split(',')[0]
+        start_value = float(instrument.ask('SETP? %i' % (loop)))
+        # on/off and rate
+        previous_ramp = str(instrument.ask('RAMP? %i' % (loop))).strip()
+        instrument.write('RAMP %i,1,%.4g' % (loop, rate))
+        instrument.write('SETP %i,%.4f' % (loop, setpoint))
+
+    def is_done(task):
+        if int(float(instrument.ask('RAMPST? %i' % (loop)))) == 0:
+            instrument.write('RAMP %i,%s' % (loop, previous_ramp))
+            return True
+        return False
+
+    def read_value():
+        return float(instrument.ask('SETP? %i' % (loop)))
+
+    def abort():
+        with instrument.transaction():
+            temperature = float(instrument.ask('KRDG? %s' % (control_input)))
+            # the setpoint stops where it is instead of ramping to it
+            instrument.write('RAMP %i,0,%.4g' % (loop, rate))
+            instrument.write('SETP %i,%.4f' % (loop, temperature))
+            instrument.write('RAMP %i,%s' % (loop, previous_ramp))
+
+    return RampTask(is_done, abort, read_value, start_value, setpoint,
+                    poll_interval, timeout,
+                    name="%s loop %i" % (instrument.ID_name, loop))
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:12:08 2026
+
+License: see LICENSE.txt file
+
+asyncio transports for the instruments, so that the DataTaker can send all
+the queries of a row from a single event loop instead of waiting for each
+instrument in turn.
+
+    - SerialTransport reads a serial port without blocking, it only reads
+      the bytes already received and lets the event loop run in between.
+      The bus of the instrument is held during each query (see
+      Tool.BusManager), so the commands sent from the other threads can't
+      be mixed with it
+    - ExecutorTransport runs the blocking read, write and ask of a MeasInstr
+      in a thread of its bus (VISA, Prologix...)
+
+AsyncInstrument adapts an existing synchronous driver : its measure and
+measure_many are run in the thread of its bus unless a coroutine is
+registered for the driver in ASYNC_MEASURES, and AsyncPoller reads the
+rows like data_management.BusPoller. The FridgeClient is read in the thread
+of its bus as well : its measure_many already sends all the requests at once
+on a connection which stays open.
+
+This module needs python 3.5 or later, it is not imported otherwise (see
+data_management).
+"""
+
+import sys
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .utils import INTF_SERIAL
+except ImportError:
+    from utils import INTF_SERIAL
+
+if sys.version_info < (3, 5):
+    raise ImportError("The asyncio transports need python 3.5 or later")
+
+# time between two checks of a serial port for new bytes, in s
+SERIAL_POLL_INTERVAL = 0.002
+
+# time after which a transport gives up waiting for an answer, in s
+DEFAULT_TIMEOUT = 3
+
+
+class Transport(object):
+    """
+        asynchronous version of the read, write and ask methods of
+        Tool.MeasInstr, the transports of the same bus share a lock so that
+        their transactions don't get mixed
+    """
+
+    def __init__(self, lock=None, timeout=DEFAULT_TIMEOUT):
+        self.lock = lock
+        self.timeout = timeout
+
+    async def write(self, msg):
+        raise NotImplementedError
+
+    async def read(self):
+        raise NotImplementedError
+
+    async def ask(self, msg):
+        """write msg and return the answer, as one transaction of the bus"""
+        if self.lock is None:
+            return await self._ask(msg)
+        async with self.lock:
+            return await self._ask(msg)
+
+    async def _ask(self, msg):
+        await self.write(msg)
+        return await asyncio.wait_for(self.read(), self.timeout)
+
+    def close(self):
+        pass
+
+
+class SerialTransport(Transport):
+    """
+        transport on the pyserial connection of an instrument, the answers
+        end with terminator. If the instrument is given, its bus is held by
+        the thread of executor during each query.
+    """
+
+    def __init__(self, connection, term_chars='', terminator=b'\n',
+                 lock=None, timeout=DEFAULT_TIMEOUT, instrument=None,
+                 executor=None):
+        super(SerialTransport, self).__init__(lock, timeout)
+        self.connection = connection
+        self.term_chars = term_chars
+        self.terminator = terminator
+        self.buffer = bytearray()
+        self.instrument = instrument
+        self.executor = executor
+
+    def waiting(self):
+        """number of bytes received and not read yet"""
+        try:
+            return self.connection.in_waiting
+        except AttributeError:
+            # pyserial 2
+            return self.connection.inWaiting()
+
+    async def _ask(self, msg):
+        if self.instrument is None:
+            return await self._ask_port(msg)
+
+        # the PriorityLock of the bus belongs to a thread, it is taken and
+        # released by the single thread of the executor of the bus
+        loop = asyncio.get_event_loop()
+        transaction = self.instrument.transaction()
+        await loop.run_in_executor(self.executor, transaction.__enter__)
+        try:
+            return await self._ask_port(msg)
+        finally:
+            await loop.run_in_executor(self.executor, transaction.__exit__,
+                                       None, None, None)
+
+    async def _ask_port(self, msg):
+        # the end of an answer which timed out would be taken for the
+        # answer to msg
+        self.discard_input()
+        try:
+            return await super(SerialTransport, self)._ask(msg)
+        except asyncio.TimeoutError:
+            del self.buffer[:]
+            raise
+
+    def discard_input(self):
+        """forget the bytes received and not read yet"""
+        del self.buffer[:]
+        num_bytes = self.waiting()
+        if num_bytes > 0:
+            self.connection.read(num_bytes)
+
+    async def write(self, msg):
+        data = msg + self.term_chars
+        if not isinstance(data, bytes):
+            data = data.encode('latin1')
+        self.connection.write(data)
+
+    async def read(self):
+        while True:
+            end = self.buffer.find(self.terminator)
+            if end >= 0:
+                answer = bytes(self.buffer[:end])
+                del self.buffer[:end + len(self.terminator)]
+                return answer.decode('latin1').rstrip('\r\n')
+
+            num_bytes = self.waiting()
+            if num_bytes > 0:
+                # the bytes are already there, this doesn't block
+                self.buffer.extend(self.connection.read(num_bytes))
+            else:
+                await asyncio.sleep(SERIAL_POLL_INTERVAL)
+
+
+class ExecutorTransport(Transport):
+    """
+        runs the blocking methods of a MeasInstr in the executor of its bus,
+        an executor with a single thread keeps the transactions of the bus
+        in order
+    """
+
+    def __init__(self, instrument, executor, lock=None,
+                 timeout=DEFAULT_TIMEOUT):
+        super(ExecutorTransport, self).__init__(lock, timeout)
+        self.instrument = instrument
+        self.executor = executor
+
+    async def run(self, function, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def write(self, msg):
+        return await self.run(self.instrument.write, msg)
+
+    async def read(self):
+        return await self.run(self.instrument.read)
+
+    async def _ask(self, msg):
+        # the driver's ask knows the details of its interface
+        return await self.run(self.instrument.ask, msg)
+
+
+async def hlt560_measure_many(instrument, channels):
+    """
+        measure_many of the HLT560 leak detector through its SerialTransport,
+        the telegrams are built and parsed by the driver
+    """
+    driver = instrument.instrument
+    answers = []
+    for channel in channels:
+        if channel in driver.MEASURE_PARAMETERS and \
+                isinstance(instrument.transport, SerialTransport):
+            reply = await instrument.ask(driver.read_message(
+                driver.MEASURE_PARAMETERS[channel]))
+            answer = driver.parse_value(reply)
+            driver.last_measure[channel] = answer
+        else:
+            answer = await instrument.run(driver.measure, channel)
+        answers.append(answer)
+    return answers
+
+
+# coroutines replacing measure_many for the drivers which have a native
+# asynchronous transport, indexed by the ID_name of the driver
+ASYNC_MEASURES = {'HLT560': hlt560_measure_many}
+
+# end of the answers of the serial drivers which don't end them with a new
+# line, indexed by the ID_name of the driver
+SERIAL_TERMINATORS = {'HLT560': b'\r'}
+
+
+class AsyncInstrument(object):
+    """
+        asynchronous adapter of a synchronous driver (a Tool.MeasInstr),
+        ask and measure can be awaited
+    """
+
+    def __init__(self, instrument, transport, executor):
+        self.instrument = instrument
+        self.transport = transport
+        self.executor = executor
+
+    async def ask(self, msg):
+        return await self.transport.ask(msg)
+
+    async def measure(self, channel):
+        answers = await self.measure_many([channel])
+        return answers[0]
+
+    async def run(self, function, *args):
+        """
+            run a blocking method of the driver in the thread of its bus,
+            after the queries of the transports of the bus
+        """
+        loop = asyncio.get_event_loop()
+        if self.transport.lock is None:
+            return await loop.run_in_executor(self.executor, function, *args)
+        async with self.transport.lock:
+            return await loop.run_in_executor(self.executor, function, *args)
+
+    async def measure_many(self, channels):
+        measure_many = ASYNC_MEASURES.get(self.instrument.ID_name)
+        if measure_many is not None:
+            return await measure_many(self, channels)
+        else:
+            return await self.run(self.instrument.measure_many, channels)
+
+
+class AsyncPoller(object):
+    """
+        reads the rows like data_management.BusPoller but from an event loop
+        of its own : all the instruments are queried at the same time, the
+        ones of the same bus one after the other
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # executor and lock of each bus, and the adapter of each instrument
+        self.executors = {}
+        self.locks = {}
+        self.adapters = {}
+
+    def bus(self, instrument):
+        """the executor and the lock of the bus of instrument"""
+        bus = instrument.bus_id()
+        if bus not in self.executors:
+            self.executors[bus] = ThreadPoolExecutor(max_workers=1)
+            # only called from the running loop, which the lock is bound to
+            self.locks[bus] = asyncio.Lock()
+        return self.executors[bus], self.locks[bus]
+
+    def adapter(self, instrument):
+        """the AsyncInstrument of instrument, it is created if needed"""
+        key = id(instrument)
+        if key not in self.adapters:
+            executor, lock = self.bus(instrument)
+            self.adapters[key] = AsyncInstrument(
+                instrument, make_transport(instrument, executor, lock),
+                executor)
+        return self.adapters[key]
+
+    def read(self, instruments, port_param_pairs, due=None):
+        """see data_management.BusPoller.read"""
+        data_set = [0] * len(port_param_pairs)
+
+        # the parameters of each instrument are measured together
+        groups = {}
+        for i, (port, param) in enumerate(port_param_pairs):
+            if due is not None and not due[i]:
+                data_set[i] = None
+                continue
+
+            inst = instruments[port]
+            if inst != '' and inst != None:
+                groups.setdefault(id(inst), (inst, []))[1].append((i, param))
+
+        async def measure(inst, params):
+            # the transactions of a bus are serialised by its executor, which
+            # has a single thread, or by the lock of its transport
+            answers = await self.adapter(inst).measure_many(
+                [param for i, param in params])
+            for (i, param), answer in zip(params, answers):
+                data_set[i] = answer
+
+        async def measure_all():
+            await asyncio.gather(*[measure(inst, params) for inst, params
+                                   in list(groups.values())])
+
+        self.loop.run_until_complete(measure_all())
+        return data_set
+
+    def stop(self):
+        """close the transports and stop the threads of the buses"""
+        for adapter in list(self.adapters.values()):
+            adapter.transport.close()
+        for executor in list(self.executors.values()):
+            executor.shutdown(wait=False)
+        self.executors = {}
+        self.locks = {}
+        self.adapters = {}
+
+
+def make_transport(instrument, executor, lock=None):
+    """
+        the transport suited to the connection of instrument, the ones which
+        have no asynchronous transport go through the executor
+    """
+    if instrument.interface == INTF_SERIAL and \
+            not instrument.DEBUG and instrument.connection is not None:
+        return SerialTransport(
+            instrument.connection, instrument.term_chars,
+            SERIAL_TERMINATORS.get(instrument.ID_name, b'\n'), lock=lock,
+            instrument=instrument, executor=executor)
+
+    else:
+        return ExecutorTransport(instrument, executor, lock)
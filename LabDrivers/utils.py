@@ -16,6 +16,7 @@ import logging
 
 import glob
 import sys
+import threading
 import serial
 import visa
 
@@ -158,7 +159,7 @@ def list_drivers(interface = [INTF_VISA,INTF_PROLOGIX,INTF_SERIAL,INTF_NONE]):
 
     for file_name in driver_files:
 	
-        if file_name.endswith(".py") and (not file_name == 'Tool.py' and not file_name == '__init__.py' and not file_name == 'utils.py'):
+        if file_name.endswith(".py") and (not file_name == 'Tool.py' and not file_name == '__init__.py' and not file_name == 'utils.py' and not file_name == 'transport.py' and not file_name == 'ramp.py'):
             name = file_name.split('.py')[0]
             
             # import the module of the instrument in the package drivers
@@ -211,12 +212,31 @@ def test_prologix_controller_creation_with_no_arg_conflict():
     pc2 = PrologixController()
     print(pc2)
     
+def gpib_address(address):
+    """the GPIB address number from 7, "7" or "GPIB0::7" """
+    return str(address).replace('GPIB0::', '').split('::')[0]
+
+
 class PrologixController(object):
+     """
+         the Prologix GPIB-USB controller, all the instruments on its GPIB
+         bus go through its serial port.
+         The address the controller talks to and its read-after-write mode
+         are remembered, so ++addr and ++auto are only sent when they change.
+         The instruments of different threads should use send, query or
+         transaction, which hold the lock of the controller so that their
+         commands can't get mixed.
+     """
     
      connection = None
     
      def __init__(self,com_port = None, baud_rate = 9600, timeout = 3 ):
 
+         # the current GPIB address and ++auto mode, None when unknown
+         self.address = None
+         self.auto = None
+         self.lock = threading.RLock()
+
          if com_port == None:
              #the user didn't provide a COM port, so we look for one
              com_port = find_prologix_ports()
@@ -281,6 +301,70 @@ ller (try to plug and unplug the cable if it is there nevertheless)"%(com_port))
          if not self.connection == None:
 #             print "Prologix in : ", cmd
              self.connection.write(cmd)
+
+             # keep track of the settings changed by the command
+             for line in cmd.splitlines():
+                 setting = line.split()
+                 if len(setting) == 2 and setting[0] == "++addr":
+                     self.address = setting[1]
+                 elif len(setting) == 2 and setting[0] == "++auto":
+                     self.auto = setting[1] != "0"
+
+     def select(self, address):
+         """make the controller talk to address, if it doesn't already"""
+         address = gpib_address(address)
+         if address != self.address:
+             self.write("++addr %s" % (address))
+
+     def set_auto(self, auto):
+         """change the read-after-write mode, if it isn't already auto"""
+         if auto != self.auto:
+             self.write("++auto %i" % (auto))
+
+     def read_reply(self, num_bit = None):
+         """
+         read the answer of the instrument addressed, it is asked for with
+         ++read eoi if the controller is not in read-after-write mode
+         """
+         with self.lock:
+             if not self.auto:
+                 self.write("++read eoi")
+             if num_bit == None:
+                 return self.readline()
+             else:
+                 return self.read(num_bit)
+
+     def send(self, address, cmd):
+         """send cmd to the instrument at address"""
+         with self.lock:
+             self.select(address)
+             self.write(cmd)
+
+     def query(self, address, cmd, num_bit = None):
+         """send cmd to the instrument at address and return its answer"""
+         with self.lock:
+             self.select(address)
+             self.write(cmd)
+             return self.read_reply(num_bit)
+
+     def transaction(self, commands):
+         """
+         run a list of (address, command, expect_reply) back to back, the
+         answers are read with ++read eoi. Returns the list of the answers
+         (stripped of the end of line), None for the commands without reply.
+         """
+         answers = []
+         with self.lock:
+             # only the commands expecting a reply make the instrument talk
+             self.set_auto(False)
+             for address, cmd, expect_reply in commands:
+                 self.select(address)
+                 self.write(cmd)
+                 if expect_reply:
+                     answers.append(self.read_reply().rstrip("\r\n"))
+                 else:
+                     answers.append(None)
+         return answers
      
      def read(self,num_bit):
          """use serial.read"""
@@ -314,26 +398,28 @@ ller (try to plug and unplug the cable if it is there nevertheless)"%(com_port))
      def get_open_gpib_ports(self, num_ports = 30):
         """Finds out which GPIB ports are available through prologix controller"""
         open_ports = []  
-        #sets the timeout to quite fast
-        old_timeout = self.timeout(0.1)
-        #iterate the ports number
-        for i in range(num_ports + 1):
-        
-            #change the GPIB address on the prologix controller
-            #prove if an instrument is connected to the port
-            self.write('++addr %i\n*IDN?\n'%i)
-        
-            #probe the answer
-            s = self.readline();            
-        
-            #if it is longer than zero it is an instrument
-            #we store the GPIB address
-            if len(s) > 0:
-                open_ports.append("GPIB0::%s"%(i))
-         
-        #resets the timeout to its original value
-        self.timeout(old_timeout)
-#        print "Time out is", self.timeout()
+        with self.lock:
+            #sets the timeout to quite fast
+            old_timeout = self.timeout(0.1)
+            try:
+                #iterate the ports number
+                for i in range(num_ports + 1):
+
+                    #change the GPIB address on the prologix controller
+                    #prove if an instrument is connected to the port
+                    self.select(i)
+                    self.write('*IDN?\n')
+
+                    #probe the answer
+                    s = self.read_reply()
+
+                    #if it is longer than zero it is an instrument
+                    #we store the GPIB address
+                    if len(s) > 0:
+                        open_ports.append("GPIB0::%s"%(i))
+            finally:
+                #resets the timeout to its original value
+                self.timeout(old_timeout)
 
         return open_ports       
 
@@ -360,7 +446,7 @@ def command_line_test(instrument_class):
         if stri.lower() == 'x':
             break
         try:
-            print eval('inst.' + stri)
+            print(eval('inst.' + stri))
         except AttributeError:
             print("Command not recognized.")
 
@@ -14,7 +14,7 @@ import sys
 import PyQt4.QtGui as QtGui
 
 # just grab the parts we need from QtCore
-from PyQt4.QtCore import Qt, SIGNAL, QReadWriteLock, QSettings
+from PyQt4.QtCore import Qt, SIGNAL, QReadWriteLock, QSettings, QTimer
 #from file_treatment_general_functions import load_experiment
 import py_compile
 #import plot_menu_and_toolbar
@@ -33,7 +33,8 @@ ABS_PATH=os.path.abspath(os.curdir)
 logging.config.fileConfig(os.path.join(ABS_PATH,"logging.conf"))
 
 
-from LabTools.IO import IOTool
+from LabTools.IO import IOTool, OutputFormats
+from LabTools import DataStructure, Calculations
 from LabTools.Display import QtTools, PlotDisplayWindow
 from LabDrivers import Tool
 from LabTools.Widgets import data_management
@@ -52,6 +53,13 @@ PYTHON_VERSION = int(sys.version[0])
 
 CONFIG_FILE = IOTool.CONFIG_FILE
 
+# columns of the file saved next to the output file with the timing of the
+# samples, row is the index of the row in the output file. They are followed
+# by a column per channel, 1 if the value was measured for this row and 0 if
+# it is the last value of a channel polled less often (see MultiRateSampler)
+SAMPLE_INFO_LABELS = ['row', 'timestamp', 'jitter', 'missed']
+FRESHNESS_PREFIX = 'fresh_'
+
 class LabGuiMain(QtGui.QMainWindow):
     """
 
@@ -86,6 +94,14 @@ class LabGuiMain(QtGui.QMainWindow):
             DATAFILE="The path of the older data file and its name to load them into the plotting system"    
             SAMPLE= "this is simply the sample_name which will display automatically in the filename choosen to save the data
             DATA_PATH= "this is the path where the data should be saved"
+            BUFFER_ROWS= "if set, only this number of the most recent rows are kept in memory for the live plots (the file still gets everything), useful for runs lasting several days"
+            DATA_FORMAT= "the format of the output file : text (the default, one line per row), npy (a numpy array with a .json file for the header) or hdf5 (needs h5py)"
+            WRITER_BATCH_ROWS= "the number of rows the output writer thread gathers before writing them (100 by default)"
+            WRITER_QUEUE_SIZE= "the maximum number of rows waiting to be written (10000 by default)"
+            WRITER_FSYNC= "when the output file is forced to the disk : never (the default), batch (after each batch) or close"
+            WRITER_WHEN_FULL= "what to do with a new row when the writer queue is full : block (wait for the writer, the default) or drop (the row is not saved)"
+            ASYNC_POLLING= "if True the instruments are read from an asyncio event loop instead of a thread per bus (needs python 3.5 or later)"
+            PLOT_MAX_FPS= "the maximum number of times per second the live plots are redrawn (25 by default), the data arriving in between is shown at the next redraw"
 
             You can add any keyword you want and get what the value is using the function get_config_setting from the module IOTool
 
@@ -93,6 +109,8 @@ class LabGuiMain(QtGui.QMainWindow):
         The script is anything you want your instruments to do, a few examples are provided in the script folder under the names demo_*.py
 
         If measures are performed and you want to save them in a file and/or plot them, simply use the signal named "data(PyQt_PyObject)" in your script. The instance of LabGuiMain will catch it save it in a file and relay it through the signal "data_array_updated(PyQt_PyObject)"
+        The instruments with an internal buffer (SR830, KT2400, KT2450) can acquire a block of points at a high rate with self.read_burst in your script, the block is handled like the rows of the signal "data(PyQt_PyObject)" through the signal "data_block(PyQt_PyObject)".
+        When the script samples on a schedule (self.start_schedule) the timestamp, jitter and number of missed samples of each row are saved in a file named like the output file with _samples.txt at the end, and the overruns are shown in the status bar. When some channels are polled at their own interval, this file also tells for each row which values were measured and which ones are the last value of the channel.
         The data will always be saved if you use the signal "data(PyQt_PyObject)", and the filename will change automatically in case you stop the datataker and restart it, this way you will never erase your data.
 
         It is therefore quite easy to add your own widget which treats the data and do something else with them, you only need to connect it to the signal "data_array_updated(PyQt_PyObject)" and you will have access to the data.
@@ -103,6 +121,8 @@ class LabGuiMain(QtGui.QMainWindow):
     cmdwin = None
 
     outputfile = None
+
+    output_file = None
     
     DEBUG = True
 
@@ -127,6 +147,16 @@ class LabGuiMain(QtGui.QMainWindow):
             self.update_current_window)
         self.setCentralWidget(self.zoneCentrale)
 
+        # the live plots are not redrawn each time data arrives but at a
+        # limited rate, and only if they can be seen
+        self.redraw_scheduler = QtTools.RedrawScheduler(
+            self, max_fps=IOTool.get_plot_max_fps_setting())
+        self.connect(self, SIGNAL("data_array_updated(PyQt_PyObject)"),
+                     self.redraw_scheduler.data_updated)
+        # a window restored from the minimised state needs to catch up
+        self.zoneCentrale.subWindowActivated.connect(
+            self.redraw_scheduler.start)
+
 
         self.DEBUG = IOTool.get_debug_setting()
        
@@ -176,11 +206,55 @@ class LabGuiMain(QtGui.QMainWindow):
         # central array)
         self.connect(self.datataker, SIGNAL(
             "data(PyQt_PyObject)"), self.update_data_array)
+        self.connect(self.datataker, SIGNAL(
+            "data_block(PyQt_PyObject)"), self.update_data_block)
         self.connect(self.datataker, SIGNAL(
             "spectrum_data(PyQt_PyObject)"), self.update_spectrum_data)
         self.connect(self.datataker, SIGNAL(
             "script_finished(bool)"), self.finished_DTT)
-        self.data_array = np.array([])
+        self.connect(self.datataker, SIGNAL(
+            "sample_timing(PyQt_PyObject)"), self.update_sample_timing)
+        self.connect(self.datataker, SIGNAL(
+            "data_freshness(PyQt_PyObject)"), self.update_data_freshness)
+
+        # the rows are stored in a preallocated buffer, self.data_array is
+        # only a view on the rows recorded so far
+        self.data_buffer = DataStructure.DataArrayBuffer(
+            max_rows=IOTool.get_buffer_rows_setting())
+        self.data_array = self.data_buffer.data
+
+        # the calculations are compiled when the run starts and when they are
+        # edited, num_data_columns is the number of columns emitted by the
+        # DataTaker, the calculated columns follow them
+        self.calculations = None
+        self.num_data_columns = 0
+
+        # the timing of the samples of a script using a schedule (see
+        # data_management.PeriodicSchedule) and which channels were actually
+        # measured are kept for each row in sample_buffer and saved in
+        # sample_file, next to the output file
+        self.sample_timing = None
+        self.data_freshness = None
+        self.sample_buffer = DataStructure.DataArrayBuffer(
+            max_rows=IOTool.get_buffer_rows_setting())
+        self.sample_file = None
+        self.sample_fname = None
+        self.rows_received = 0
+        self.sample_overruns = 0
+
+        # the output file is written by batches, this timer makes sure the
+        # last rows get written even when the data arrives slowly
+        self.output_flush_timer = QTimer(self)
+        self.connect(self.output_flush_timer, SIGNAL("timeout()"),
+                     self.flush_output_file)
+
+        # counters of the output writer thread (queue depth, write latency)
+        self.writerStatusLabel = QtGui.QLabel()
+        self.statusBar().addPermanentWidget(self.writerStatusLabel)
+
+        # jitter and overruns of the samples of the schedule
+        self.samplingStatusLabel = QtGui.QLabel()
+        self.statusBar().addPermanentWidget(self.samplingStatusLabel)
 
 ###### DOCK WIDGET SETUP: INSTRUMENT CONNECTION PANEL ######
         self.cmdwin = CW.InstrumentWindow(self)
@@ -216,6 +290,8 @@ class LabGuiMain(QtGui.QMainWindow):
             "colorsChanged()"), self.update_colors)
         self.connect(self.calcWidget, SIGNAL(
             "labelsChanged()"), self.update_labels)
+        self.connect(self.calcWidget, SIGNAL(
+            "calculationsChanged()"), self.update_calculations)
         calcDockWidget = QtGui.QDockWidget("Live Calculations", self)
         calcDockWidget.setObjectName("startDockWidget")
         calcDockWidget.setAllowedAreas(
@@ -533,8 +609,8 @@ class LabGuiMain(QtGui.QMainWindow):
         """
         num_channels = self.instr_hub.get_instrument_nb() + self.calcWidget.get_calculation_nb()
         pdw = PlotDisplayWindow.PlotDisplayWindow(data_array=self.data_array, name="Live Data Window", default_channels=num_channels)  # self.datataker)
-        self.connect(self, SIGNAL("data_array_updated(PyQt_PyObject)"),
-                     pdw.update_plot)
+        # the data updates reach the window through the redraw scheduler
+        self.redraw_scheduler.add_window(pdw)
         self.connect(pdw.mplwidget, SIGNAL(
             "limits_changed(int,PyQt_PyObject)"), self.emit_axis_lim)
 
@@ -609,7 +685,11 @@ class LabGuiMain(QtGui.QMainWindow):
         extension = load_fname.rsplit('.')[len(load_fname.rsplit('.')) - 1]
 #        print extension
 
-        if extension == "adat":
+        if OutputFormats.is_binary_file(load_fname):
+            # a .npy file is memory-mapped, its rows are only read when they
+            # are plotted
+            [data, labels] = OutputFormats.load_output_file(load_fname)
+        elif extension == "adat":
             [data, labels] = IOTool.load_file_windows(load_fname, '\t')
         elif extension == "adat2":
             [data, labels] = IOTool.load_file_windows(load_fname)
@@ -743,30 +823,43 @@ class LabGuiMain(QtGui.QMainWindow):
             # just update the color boxes in case
             self.update_colors()
             self.update_labels()
+            self.compile_calculations()
 
-            # read the name of the output file and determine if it exists
+            # read the name of the output file, its extension depends on the
+            # format used to save the data. If this file is new, the header
+            # contains the instrument and parameters list, otherwise the rows
+            # are appended to it so it won't erase previous data
             of_name = str(self.startWidget.outputFileLineEdit.text())
-            is_new_file = not os.path.exists(of_name)
+            # the file is written by a separate thread so that a slow disk
+            # doesn't stall the GUI
+            self.output_file = OutputFormats.BackgroundOutputWriter(
+                OutputFormats.open_output_file(
+                    of_name, IOTool.get_data_format_setting()),
+                **IOTool.get_writer_settings())
+            is_new_file = self.output_file.is_new_file
+
+            # the timing of the samples goes in another file, created with
+            # the first sample taken on a schedule
+            self.sample_fname = os.path.splitext(of_name)[0] + "_samples.txt"
+            self.sample_file = None
+            self.sample_timing = None
+            self.data_freshness = None
+            self.sample_buffer.clear()
+            self.rows_received = 0
+            self.sample_overruns = 0
+            self.samplingStatusLabel.setText("")
 
-            # if this file is new, the first 2 lines contain the instrument and
-            # parameters list
             if is_new_file:
-
-                self.output_file = open(of_name, 'w')
                 [instr_name_list, dev_list, param_list] = self.collect_instruments()
-                self.output_file.write(str(self.startWidget.get_header_text()))
-                self.output_file.write(
-                    "#C" + str(self.cmdwin.get_label_list()).strip('[]') + '\n')
-                self.output_file.write(
-                    "#I" + str(self.cmdwin.get_descriptor_list()).strip('[]') + '\n')
+                self.output_file.write_header(
+                    self.startWidget.get_header_text(),
+                    self.cmdwin.get_label_list(),
+                    self.cmdwin.get_descriptor_list(), param_list)
 
-                self.output_file.write(
-                    "#P" + str(param_list).strip('[]') + '\n')
+            # the rows are written by batches, make sure they don't wait
+            # too long in memory
+            self.output_flush_timer.start(OutputFormats.FLUSH_INTERVAL)
 
-            else:
-                # here I want to perform a check to see whether the number of instrument match
-                # open it in append mode, so it won't erase previous data
-                self.output_file = open(of_name, 'a')
             self.datataker.initialize(is_new_file)
             # read the name of the script file to run
             self.datataker.set_script(
@@ -788,7 +881,10 @@ class LabGuiMain(QtGui.QMainWindow):
         if not self.datataker.isStopped():
             self.datataker.resume()
             self.datataker.stop()
+            self.output_flush_timer.stop()
             self.output_file.close()
+            self.close_sample_file()
+            self.update_writer_stats()
 
             self.start_DTT_action.setEnabled(True)
             self.pause_DTT_action.setEnabled(False)
@@ -825,56 +921,212 @@ class LabGuiMain(QtGui.QMainWindow):
             
             # just make sure the pause setting is left as false after ther run
             self.datataker.resume()
+            self.output_flush_timer.stop()
             self.output_file.close()
+            self.close_sample_file()
+            self.update_writer_stats()
 
     def write_data(self, data_set):
         if self.output_file:
             if not self.output_file.closed:
-                # a quick way to make a comma separated list of the values
-                stri = str(data_set).strip('[]\n\r')
-                # numpy arrays include newlines in their strings, get rid of
-                # them.
-                stri = stri.replace('\n', '')
-                stri = stri.replace(',', ' ')
+                # the row is queued and written with the next batch, it is
+                # only turned into text by the writer thread
+                self.output_file.write_row(data_set)
+
+    def flush_output_file(self):
+        """ write the rows waiting in memory to the output file """
+        if self.output_file and not self.output_file.closed:
+            self.output_file.flush()
+            self.update_writer_stats()
+        if self.sample_file and not self.sample_file.closed:
+            self.sample_file.flush()
+
+    def update_sample_timing(self, timing):
+        """
+            slot for the timing of a sample (see PeriodicSchedule), it is
+            recorded with the row which follows it
+        """
+        self.sample_timing = timing
 
-                self.output_file.write(stri + '\n')
-                print('>>' + stri)
+        if timing["missed"] > 0:
+            self.sample_overruns = self.sample_overruns + 1
+            self.statusBar().showMessage("Sampling overrun : %i sample(s) \
+skipped to keep the period of the schedule" % (timing["missed"]), 5000)
+
+        self.samplingStatusLabel.setText(
+            "Sampling : jitter %.1f ms, %i overruns" % (
+                1000 * timing["jitter"], self.sample_overruns))
+
+    def update_data_freshness(self, due):
+        """
+            slot for the list telling which channels of the next row were
+            measured, the others hold the last value of the channel
+        """
+        self.data_freshness = due
+
+    def record_sample_info(self, num_rows=1):
+        """
+            keep the timing and the freshness of the row just received, if
+            it was taken on a schedule or with channels polled at their own
+            interval, num_rows is the number of rows received
+        """
+        row_number = self.rows_received
+        self.rows_received = self.rows_received + num_rows
+
+        if self.sample_timing is None and self.data_freshness is None:
+            return
+
+        timing = self.sample_timing
+        freshness = self.data_freshness
+        self.sample_timing = None
+        self.data_freshness = None
+
+        if timing is None:
+            info = [row_number, np.nan, np.nan, np.nan]
+        else:
+            info = [row_number, timing["timestamp"], timing["jitter"],
+                    timing["missed"]]
+        if freshness is None:
+            freshness = [True] * self.num_data_columns
+        info = info + [float(is_due) for is_due in freshness]
+        self.sample_buffer.append(info)
+
+        if self.sample_file is None and self.output_file and \
+                not self.output_file.closed:
+            self.sample_file = OutputFormats.BackgroundOutputWriter(
+                OutputFormats.TextOutputWriter(self.sample_fname))
+            if self.sample_file.is_new_file:
+                self.sample_file.write_header(
+                    "# timing of the samples of %s\n" % (self.output_file.name),
+                    SAMPLE_INFO_LABELS + [FRESHNESS_PREFIX + label for label
+                                          in self.cmdwin.get_label_list()],
+                    [], [])
+
+        if self.sample_file and not self.sample_file.closed:
+            self.sample_file.write_row(info)
+
+    def close_sample_file(self):
+        if self.sample_file and not self.sample_file.closed:
+            self.sample_file.close()
+
+    def update_writer_stats(self):
+        """ show the state of the output writer thread in the status bar """
+        stats = self.output_file.stats()
+
+        text = "Output queue : %i/%i rows, write %.1f ms (max %.1f ms)" % (
+            stats["queue_depth"], stats["queue_size"],
+            1000 * stats["last_latency"], 1000 * stats["max_latency"])
+        if stats["rows_dropped"] > 0:
+            text = text + ", %i rows dropped" % (stats["rows_dropped"])
+        if stats["write_errors"] > 0:
+            text = text + ", %i write errors" % (stats["write_errors"])
+
+        self.writerStatusLabel.setText(text)
+        self.emit(SIGNAL("output_writer_stats(PyQt_PyObject)"), stats)
 
     def update_spectrum_data(self, spectrum_data):
-        chan_num = 0
-        self.emit(SIGNAL("spectrum_data_updated(PyQt_PyObject)"),
-                  spectrum_data, chan_num)
+        """ slot for a spectrum, or a list of spectra (one per channel) """
+        if not isinstance(spectrum_data, list):
+            spectrum_data = [spectrum_data]
 
-    def update_data_array(self, data_set):
-        """ slot for when the thread emits data """
+        for chan_num, spectrum in enumerate(spectrum_data):
+            self.emit(SIGNAL("spectrum_data_updated(PyQt_PyObject,int)"),
+                      spectrum, chan_num)
 
-        # convert this latest data to an array
-        data = np.array(data_set)
+    def compile_calculations(self):
+        """
+            compile the expressions of the calculation window, returns True
+            if they changed since the last time
+        """
+        expressions = self.calcWidget.get_calculation_list()
+        names = self.calcWidget.get_name_list()
+        channel_labels = self.cmdwin.get_label_list()
+
+        if self.calculations is not None and self.calculations.same_as(
+                expressions, names, channel_labels):
+            return False
+
+        self.calculations = Calculations.CompiledCalculations(
+            expressions, names, channel_labels)
+        return True
+
+    def update_calculations(self):
+        """
+            slot for when a calculation is edited, the calculated columns of
+            the rows in memory are computed again (the rows already written
+            in the output file are left as they were)
+        """
+        if not self.compile_calculations():
+            return
+
+        if self.num_data_columns == 0 or not np.ndim(self.data_array) == 2:
+            return
+
+        if np.size(self.data_array, 1) < self.num_data_columns:
+            return
+
+        # the new rows are computed before the buffer is cleared as the
+        # measured columns are a view on it
+        rows = self.calculations(self.data_array[:, :self.num_data_columns])
+        self.data_buffer.clear()
+        self.data_buffer.extend(rows)
+        self.data_array = self.data_buffer.data
+
+        self.update_labels()
+        self.emit(SIGNAL("data_array_updated(PyQt_PyObject)"), self.data_array)
+
+    def update_data_array(self, data_set):
+        """
+            slot for when the thread emits data, a read-only float row. The
+            row and its calculated columns are written in place at the end
+            of the buffer, the writer and the windows share that row.
+        """
 
-        for calculation in self.calcWidget.get_calculation_list():
-            calculation = calculation.strip()
-            if calculation:
-                data = np.append(data, eval(calculation + '\n'))
-            #else:
-                #print "here's the zero"
-                #data = np.append(data, 0)
+        if self.calculations is None:
+            self.compile_calculations()
 
-        # writes data and calculated columns
-        self.write_data(data.tolist())
+        if not isinstance(data_set, np.ndarray):
+            data_set = DataStructure.to_float_row(data_set)
 
-        # check if this is the first piece of data
-        if self.data_array.size == 0:
-            self.data_array = data
+        self.num_data_columns = len(data_set)
+        row = self.data_buffer.new_row(
+            self.num_data_columns + len(self.calculations))
+        self.calculations.evaluate(data_set, out=row)
+        self.data_buffer.commit_row()
+        self.record_sample_info()
 
-            # need to make sure the shape is 2D even though there's only
-            # one line of data so far
-            self.data_array.shape = [1, self.data_array.size]
+        # writes data and calculated columns, the place of a row of a ring
+        # buffer is reused later so the writer gets its own copy then
+        if self.data_buffer.stable_rows:
+            self.write_data(self.data_buffer.last_row)
         else:
-            # vstack just appends the data
-            try:
-                self.data_array = np.vstack([self.data_array, data])
-            except:
-                self.data_array = data
+            self.write_data(DataStructure.read_only(row.copy()))
+
+        self.data_array = self.data_buffer.data
+
+        self.emit(SIGNAL("data_array_updated(PyQt_PyObject)"), self.data_array)
+
+    def update_data_block(self, block):
+        """ slot for when the thread emits a block of rows (burst mode) """
+        block = np.asarray(block, dtype=float)
+        if len(block) == 0:
+            return
+
+        if self.calculations is None:
+            self.compile_calculations()
+
+        # the calculations are evaluated once for the whole block
+        self.num_data_columns = np.size(block, 1)
+        block = self.calculations(block)
+        self.record_sample_info(len(block))
+        block.flags.writeable = False
+
+        if self.output_file and not self.output_file.closed:
+            self.output_file.write_rows(block)
+
+        # the whole block is copied at once at the end of the buffer
+        self.data_buffer.extend(block)
+        self.data_array = self.data_buffer.data
 
         self.emit(SIGNAL("data_array_updated(PyQt_PyObject)"), self.data_array)
 
@@ -1017,7 +1269,8 @@ class LabGuiMain(QtGui.QMainWindow):
         self.set_Yaxis_scale(self.axR)
 
     def clear_plot(self):
-        self.data_array = np.array([])
+        self.data_buffer.clear()
+        self.data_array = self.data_buffer.data
         self.emit(SIGNAL("data_array_updated(PyQt_PyObject)"), self.data_array)
 
     def remove_fit(self):
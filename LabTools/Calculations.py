@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 10:12:36 2026
+
+License: see LICENSE.txt file
+
+Live calculations of the calculation window. The expressions are parsed and
+checked once, when the run starts or when one of them is edited, and are then
+evaluated on whole columns : a single row or a block of rows costs one
+evaluation of each expression.
+
+An expression can use
+    - the channels by their label (when the label is a valid python name),
+      and the results of the calculations above it by their name
+    - data, the columns by index like the old expressions (data[2] is the
+      third column, for a block of rows it is the whole column)
+    - numpy as np and the usual functions (sqrt, log10, sin, where...),
+      max, min, abs, round, float, int and get_calibration
+
+Only simple expressions are accepted : no import, lambda, comprehension or
+attribute starting with an underscore. The expressions which only work on
+single values (x if a > 0 else y, a and b, max(a, b), float(a)...) can't be
+evaluated on whole columns, they are then evaluated row by row, as well as the
+ones which don't give one value per row (np.mean(T), np.max(data[1:3])...).
+A calculation which can't be compiled or fails gives NaN, the error is logged
+once.
+"""
+
+import re
+import ast
+import keyword
+import logging
+
+import numpy as np
+
+from LabTools.Fitting.Calibration import get_calibration
+
+# the syntax allowed in an expression (names of the ast nodes, python 2 and 3)
+ALLOWED_NODES = set([
+    'Expression', 'Expr', 'BinOp', 'UnaryOp', 'BoolOp', 'Compare', 'IfExp',
+    'Call', 'keyword', 'Name', 'Load', 'Attribute', 'Subscript', 'Index',
+    'Slice', 'ExtSlice', 'Num', 'Constant', 'Str', 'Tuple', 'List',
+    'NameConstant', 'Ellipsis',
+    'Add', 'Sub', 'Mult', 'Div', 'FloorDiv', 'Mod', 'Pow', 'MatMult',
+    'LShift', 'RShift', 'BitOr', 'BitXor', 'BitAnd',
+    'UAdd', 'USub', 'Not', 'Invert', 'And', 'Or',
+    'Eq', 'NotEq', 'Lt', 'LtE', 'Gt', 'GtE'])
+
+# the names an expression can use besides the channels
+FUNCTIONS = {'np': np, 'numpy': np, 'get_calibration': get_calibration,
+             'abs': np.abs, 'max': max, 'min': min, 'round': round,
+             'float': float, 'int': int, 'nan': np.nan, 'inf': np.inf,
+             'True': True, 'False': False, 'None': None}
+for function_name in ['sqrt', 'exp', 'log', 'log10', 'sin', 'cos', 'tan',
+                      'arcsin', 'arccos', 'arctan', 'arctan2', 'sinh', 'cosh',
+                      'tanh', 'hypot', 'degrees', 'radians', 'sign', 'floor',
+                      'ceil', 'absolute', 'minimum', 'maximum', 'clip',
+                      'where', 'pi', 'e']:
+    FUNCTIONS[function_name] = getattr(np, function_name)
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class CalculationError(Exception):
+    pass
+
+
+def is_identifier(name):
+    return bool(IDENTIFIER.match(name)) and not keyword.iskeyword(name) \
+        and name not in FUNCTIONS and not name == 'data'
+
+
+def parse_calculation(expression, known_names, name='calculation'):
+    """
+        check the expression and compile it, known_names are the labels it
+        can use besides data and the FUNCTIONS. Raises CalculationError.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise CalculationError("%s : syntax error in '%s' (%s)" % (
+            name, expression, e))
+
+    unknown = []
+    for node in ast.walk(tree):
+        node_type = type(node).__name__
+        if node_type not in ALLOWED_NODES:
+            raise CalculationError("%s : '%s' is not allowed in '%s'" % (
+                name, node_type, expression))
+        if node_type == 'Attribute' and node.attr.startswith('_'):
+            raise CalculationError("%s : the attribute '%s' is not allowed \
+in '%s'" % (name, node.attr, expression))
+        if node_type == 'Name' and not (node.id in known_names or
+                                        node.id in FUNCTIONS or
+                                        node.id == 'data'):
+            unknown.append(node.id)
+
+    if unknown:
+        raise CalculationError("%s : unknown name(s) %s in '%s'" % (
+            name, ', '.join(sorted(set(unknown))), expression))
+
+    return compile(tree, '<%s>' % (name), 'eval')
+
+
+class CompiledCalculations(object):
+    """
+        the calculations of a run. expressions and names are the lists of the
+        calculation window (the empty expressions are ignored like before),
+        channel_labels the labels of the columns given by the DataTaker.
+        Calling it on rows (a 2D array, or a single row) returns a new
+        array with the calculated columns after the columns of the rows,
+        evaluate can write them in place instead.
+    """
+
+    def __init__(self, expressions, names=None, channel_labels=None):
+        if names is None:
+            names = []
+        if channel_labels is None:
+            channel_labels = []
+
+        self.channel_labels = list(channel_labels)
+        self.expressions = []
+        self.names = []
+        self.codes = []
+        self.errors = {}
+        # the calculations which already logged an error while evaluated
+        self.failed = set()
+
+        # the channels which can be used by their label
+        self.channel_columns = {}
+        for i, label in enumerate(self.channel_labels):
+            if is_identifier(label) and label not in self.channel_columns:
+                self.channel_columns[label] = i
+        known_names = set(self.channel_columns)
+
+        for i, expression in enumerate(expressions):
+            expression = expression.strip()
+            if not expression:
+                continue
+            if i < len(names):
+                name = names[i].strip()
+            else:
+                name = ''
+
+            self.expressions.append(expression)
+            self.names.append(name)
+            try:
+                self.codes.append(parse_calculation(
+                    expression, known_names, name or expression))
+            except CalculationError as e:
+                logging.error(str(e))
+                self.errors[len(self.codes)] = str(e)
+                self.codes.append(None)
+
+            if is_identifier(name):
+                known_names.add(name)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __call__(self, rows):
+        return self.evaluate(rows)
+
+    def same_as(self, expressions, names, channel_labels):
+        """tell if these lists would compile to the same calculations"""
+        other = [(e.strip(), n.strip()) for e, n in zip(
+            expressions, list(names) + [''] * len(expressions)) if e.strip()]
+        return other == list(zip(self.expressions, self.names)) and \
+            list(channel_labels) == self.channel_labels
+
+    def evaluate(self, rows, out=None):
+        """
+            the rows with the calculated columns, a single row gives a
+            single row. They are written in out if it is given (with room
+            for the calculated columns), a row of a DataArrayBuffer for
+            example.
+        """
+        rows = np.asarray(rows, dtype=float)
+        single_row = rows.ndim == 1
+        if single_row:
+            rows = rows.reshape(1, rows.size)
+
+        num_rows, num_columns = rows.shape
+        if out is None:
+            out = np.empty((num_rows, num_columns + len(self.codes)))
+            result = out
+            if single_row:
+                result = out[0]
+        else:
+            result = out
+            if single_row:
+                out = out.reshape(1, out.size)
+        out[:, :num_columns] = rows
+
+        # the column of each name the expressions can use
+        columns = {}
+        for label, i in self.channel_columns.items():
+            if i < num_columns:
+                columns[label] = i
+
+        namespace = dict(FUNCTIONS)
+        for name, i in columns.items():
+            namespace[name] = out[:, i]
+
+        with np.errstate(all='ignore'):
+            for j, code in enumerate(self.codes):
+                column = num_columns + j
+                # data only holds the columns before this calculation, the
+                # way the old expressions saw it
+                namespace['data'] = out[:, :column].T
+                if code is None:
+                    out[:, column] = np.nan
+                else:
+                    try:
+                        values = eval(code, {'__builtins__': {}}, namespace)
+                        # a reduction like np.max(data[1:3]) gives a single
+                        # value for the whole block, not one per row
+                        elementwise = num_rows == 1 or \
+                            np.shape(values) == (num_rows,)
+                    except Exception:
+                        # conditions and builtins like max or float need
+                        # single values
+                        elementwise = False
+                    if not elementwise:
+                        values = self.evaluate_rows(j, out, column, columns)
+                    out[:, column] = values
+
+                if is_identifier(self.names[j]):
+                    columns[self.names[j]] = column
+                    namespace[self.names[j]] = out[:, column]
+
+        return result
+
+    def evaluate_rows(self, j, out, column, columns):
+        """
+            the calculation j evaluated on each row of out, which holds its
+            columns up to column, the rows where it fails give NaN
+        """
+        values = np.empty(np.size(out, 0))
+        namespace = dict(FUNCTIONS)
+        for r, row in enumerate(out):
+            for name, i in columns.items():
+                namespace[name] = row[i]
+            namespace['data'] = row[:column]
+            try:
+                values[r] = eval(self.codes[j], {'__builtins__': {}},
+                                 namespace)
+            except Exception as e:
+                values[r] = np.nan
+                if j not in self.failed:
+                    self.failed.add(j)
+                    logging.error("calculation '%s' failed : %s" % (
+                        self.expressions[j], e))
+        return values
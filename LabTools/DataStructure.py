@@ -216,6 +216,280 @@ class LabeledData(object):
         return answer
         
 
+class DataArrayBuffer(object):
+    """
+    Preallocated store for the rows emitted by the DataTaker.
+
+    The rows are copied once into a float64 array whose capacity doubles
+    when it is full, so appending a row is amortised O(1) instead of copying
+    the whole history each time like np.vstack does. The property 'data'
+    returns a read-only view (no copy) of the rows stored so far, it stays
+    valid until the next call to append, extend or clear. A row can also be
+    written in place with new_row and commit_row, without a temporary array.
+
+    If max_rows is given the buffer becomes a ring buffer which only keeps
+    the last max_rows rows, this is meant for unattended runs of several
+    days. Each row is then written twice (at i and i + max_rows) so that the
+    last max_rows rows are always contiguous in memory and can still be
+    returned as a view.
+    """
+
+    def __init__(self, ncols=None, max_rows=None, chunk_rows=1024):
+
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows should be a positive integer")
+
+        self.max_rows = max_rows
+        self.chunk_rows = chunk_rows
+
+        self.ncols = None
+        self._buffer = None
+
+        # number of rows currently held and number of rows appended since
+        # the last clear (they differ only in ring buffer mode)
+        self.nrows = 0
+        self.total_rows = 0
+
+        if ncols is not None:
+            self._allocate(ncols)
+
+    def __len__(self):
+        return self.nrows
+
+    def _allocate(self, ncols):
+        """create an empty buffer for rows with ncols columns"""
+        if self.max_rows is None:
+            capacity = self.chunk_rows
+        else:
+            capacity = 2 * self.max_rows
+
+        self.ncols = ncols
+        self._buffer = np.empty((capacity, ncols))
+        self.nrows = 0
+        self.total_rows = 0
+
+    def _check_width(self, ncols):
+        """reset the buffer if the rows don't have the expected length"""
+        if self._buffer is None or not ncols == self.ncols:
+            if self.nrows > 0:
+                logging.warning("DataArrayBuffer : the rows now have %i \
+columns instead of %i, the previous data is discarded" % (ncols, self.ncols))
+            self._allocate(ncols)
+
+    def _reserve(self, nrows):
+        """make sure there is room for nrows more rows (unbounded mode)"""
+        capacity = np.size(self._buffer, 0)
+        needed = self.nrows + nrows
+
+        if needed > capacity:
+            while capacity < needed:
+                capacity = 2 * capacity
+            new_buffer = np.empty((capacity, self.ncols))
+            new_buffer[:self.nrows] = self._buffer[:self.nrows]
+            self._buffer = new_buffer
+
+    def new_row(self, ncols):
+        """
+            writable view on the place of the next row, it is filled in
+            place by the caller and becomes part of the data with commit_row
+        """
+        self._check_width(ncols)
+
+        if self.max_rows is None:
+            self._reserve(1)
+            return self._buffer[self.nrows]
+        else:
+            return self._buffer[self.total_rows % self.max_rows]
+
+    def commit_row(self):
+        """add the row filled through new_row to the data"""
+        if self.max_rows is not None:
+            idx = self.total_rows % self.max_rows
+            self._buffer[idx + self.max_rows] = self._buffer[idx]
+
+        self.total_rows = self.total_rows + 1
+
+        if self.max_rows is None or self.nrows < self.max_rows:
+            self.nrows = self.nrows + 1
+
+    def append(self, row):
+        """copy a single row at the end of the buffer"""
+        row = np.asarray(row, dtype=float).ravel()
+        self.new_row(row.size)[:] = row
+        self.commit_row()
+
+    def extend(self, rows):
+        """copy a block of rows (a 2D array) at the end of the buffer"""
+        rows = np.asarray(rows, dtype=float)
+
+        if rows.ndim == 1:
+            rows.shape = [1, rows.size]
+
+        num_new = np.size(rows, 0)
+
+        if num_new == 0:
+            return
+
+        self._check_width(np.size(rows, 1))
+
+        if self.max_rows is None:
+            self._reserve(num_new)
+            self._buffer[self.nrows:self.nrows + num_new] = rows
+            self.nrows = self.nrows + num_new
+        else:
+            if num_new > self.max_rows:
+                # only the last max_rows rows would survive anyway
+                self.total_rows = self.total_rows + num_new - self.max_rows
+                rows = rows[-self.max_rows:]
+                num_new = self.max_rows
+
+            idx = np.mod(self.total_rows + np.arange(num_new), self.max_rows)
+            self._buffer[idx] = rows
+            self._buffer[idx + self.max_rows] = rows
+            self.nrows = min(self.nrows + num_new, self.max_rows)
+
+        self.total_rows = self.total_rows + num_new
+
+    def clear(self):
+        """
+            forget all the rows, a new array is allocated with the next row
+            so the views given before stay valid
+        """
+        self._buffer = None
+        self.nrows = 0
+        self.total_rows = 0
+
+    @property
+    def stable_rows(self):
+        """
+            tells if a view on a row keeps its values for good. In ring
+            buffer mode the place of a row is reused max_rows rows later.
+        """
+        return self.max_rows is None
+
+    @property
+    def last_row(self):
+        """read-only view on the last row, None if there is no data"""
+        if self.nrows == 0:
+            return None
+        return self.data[-1]
+
+    @property
+    def data(self):
+        """
+            read-only view on the rows currently held, the oldest row first.
+            An empty 1D array is returned when there is no data yet, like the
+            data_array attribute of LabGuiMain used to be.
+        """
+        if self.nrows == 0:
+            return np.array([])
+
+        if self.max_rows is None:
+            view = self._buffer[:self.nrows]
+        else:
+            start = (self.total_rows - self.nrows) % self.max_rows
+            view = self._buffer[start:start + self.nrows]
+
+        view.flags.writeable = False
+        return view
+
+
+def to_float_row(values, out=None):
+    """
+        a row emitted by the DataTaker as a float array, the values which
+        are not numbers (None, error messages...) become NaN. The values are
+        written in out if it is given.
+    """
+    if out is None:
+        out = np.empty(len(values))
+    for i, value in enumerate(values):
+        try:
+            out[i] = value
+        except (TypeError, ValueError):
+            out[i] = np.nan
+    return out
+
+
+class RowAllocator(object):
+    """
+        float64 rows handed out from preallocated blocks of block_rows rows,
+        so the measurement loop fills its rows in place without creating an
+        array each time. A block is never reused : the rows given to the
+        other threads keep their values, and the block is freed when no row
+        of it is referenced anymore.
+    """
+
+    def __init__(self, ncols, block_rows=1024):
+        self.ncols = ncols
+        self.block_rows = block_rows
+        self._block = None
+        self._next = block_rows
+
+    def new_row(self):
+        """writable view on an unused row"""
+        if self._next >= self.block_rows:
+            self._block = np.empty((self.block_rows, self.ncols))
+            self._next = 0
+
+        row = self._block[self._next]
+        self._next = self._next + 1
+        return row
+
+
+def read_only(row):
+    """a read-only view on row, to share it between threads"""
+    view = row.view()
+    view.flags.writeable = False
+    return view
+
+
+def count_new_rows(previous_nrows, previous_last_row, data_array):
+    """
+        compare a data array with what it was the last time it was looked at
+        (its number of rows and its last row) and return [num_new, num_dropped]
+        the number of rows appended since then and the number of rows removed
+        at the beginning (when a DataArrayBuffer is in ring buffer mode).
+        Return None if data_array is not simply the previous array with rows
+        appended, the caller should then consider all the rows as new.
+    """
+    if previous_nrows == 0 or previous_last_row is None:
+        return None
+
+    if not np.ndim(data_array) == 2 or len(data_array) == 0:
+        return None
+
+    nrows, ncols = np.shape(data_array)
+
+    if not ncols == np.size(previous_last_row) or nrows < previous_nrows:
+        return None
+
+    def same_row(rows):
+        # NaN stands for a missing value, two NaNs are considered equal
+        return np.all((rows == previous_last_row) |
+                      (np.isnan(rows) & np.isnan(previous_last_row)), axis=-1)
+
+    if nrows > previous_nrows:
+        # the array only grew
+        if same_row(data_array[previous_nrows - 1]):
+            return [nrows - previous_nrows, 0]
+        else:
+            return None
+
+    # same number of rows : either nothing changed or the oldest rows were
+    # dropped to make room for the new ones, look for the last row seen,
+    # starting from the end as it is usually among the last rows
+    window = 1
+    while True:
+        start = max(nrows - window, 0)
+        matches = np.nonzero(same_row(data_array[start:]))[0]
+        if len(matches) > 0:
+            num_new = nrows - 1 - (start + matches[-1])
+            return [num_new, num_new]
+        elif start == 0:
+            return None
+        window = 2 * window
+
+
 def test_labels_class_LabeledData(labels=["a","b","c"]):
     mydat=LabeledData(np.array([[1,2,3],[4,5,6],[7,8,9]]),labels)  
 
@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 12 10:14:37 2026
+
+License: see LICENSE.txt file
+
+Helpers keeping the full resolution data of the plotted lines on the side so
+that matplotlib only gets what can actually be seen on the screen.
+
+A MinMaxPyramid stores, for blocks of 2, 4, 8, ... consecutive points, the
+index of the smallest and of the largest value of the block. It is updated
+incrementally when rows are appended to the data. When the plot is redrawn
+the level whose blocks are about one pixel wide is used, each block gives
+two points (its minimum and its maximum), so a line never gets more than
+about 2 x width points whatever the number of points recorded, while the
+spikes and the envelope of the signal are preserved.
+
+RunningExtrema and SlidingExtrema keep the limits of the data up to date as
+rows are appended so that autoscaling the axes doesn't need to go through
+all the points on each update.
+"""
+
+from __future__ import division
+
+from collections import deque
+
+import numpy as np
+
+
+# size of the smallest blocks stored in a MinMaxPyramid is 2**FIRST_LEVEL
+FIRST_LEVEL = 5
+
+# maximum number of points handled at once when going through a column
+CHUNK_POINTS = 2 ** 20
+
+
+def bucket_argminmax(ydata, start, stop, size):
+    """
+        split ydata[start:stop] in buckets of size points (the last one can
+        be shorter) and return the indexes of the minimum and of the maximum
+        of each bucket, NaNs are ignored unless there is nothing else
+    """
+    chunk = np.array(ydata[start:stop], dtype=float)
+    num_buckets = -(-len(chunk) // size)
+    padding = num_buckets * size - len(chunk)
+
+    if padding > 0:
+        chunk = np.append(chunk, np.nan * np.ones(padding))
+    chunk.shape = (num_buckets, size)
+
+    nans = np.isnan(chunk)
+    first = start + size * np.arange(num_buckets)
+
+    # an argmin over +inf instead of NaN gives the first point of a bucket
+    # full of NaNs, which is inside the range even for the padded bucket
+    chunk[nans] = np.inf
+    imin = first + np.argmin(chunk, axis=1)
+    chunk[nans] = -np.inf
+    imax = first + np.argmax(chunk, axis=1)
+
+    return imin, imax
+
+
+def argminmax(ydata, start, stop):
+    """
+        return the index of the minimum and the index of the maximum of
+        ydata[start:stop], NaNs are ignored unless there is nothing else
+    """
+    chunk = ydata[start:stop]
+    valid = ~np.isnan(chunk)
+
+    if valid.all():
+        return start + np.argmin(chunk), start + np.argmax(chunk)
+    elif valid.any():
+        return start + np.nanargmin(chunk), start + np.nanargmax(chunk)
+    else:
+        return start, start
+
+
+class BlockLevel(object):
+    """
+        one level of the pyramid: the indexes of the minimum and of the
+        maximum of the consecutive blocks of size 2**level, the block n
+        covering the points n * size to (n + 1) * size - 1
+    """
+
+    def __init__(self, level):
+        self.level = level
+        self.size = 2 ** level
+
+        # absolute number of the first block stored and number of blocks
+        self.first_block = 0
+        self.num_blocks = 0
+
+        self.imin = np.empty(64, dtype=np.int64)
+        self.imax = np.empty(64, dtype=np.int64)
+
+    def end_block(self):
+        """number of the block following the last one stored"""
+        return self.first_block + self.num_blocks
+
+    def add_blocks(self, imin, imax):
+        """store the indexes of the new blocks after the existing ones"""
+        num_new = len(imin)
+        needed = self.num_blocks + num_new
+
+        if needed > len(self.imin):
+            capacity = len(self.imin)
+            while capacity < needed:
+                capacity = 2 * capacity
+
+            for name in ["imin", "imax"]:
+                new_array = np.empty(capacity, dtype=np.int64)
+                new_array[:self.num_blocks] = getattr(self, name)[
+                    :self.num_blocks]
+                setattr(self, name, new_array)
+
+        self.imin[self.num_blocks:needed] = imin
+        self.imax[self.num_blocks:needed] = imax
+        self.num_blocks = needed
+
+    def drop_blocks_before(self, block):
+        """forget the blocks whose number is smaller than block"""
+        num_dropped = min(max(block - self.first_block, 0), self.num_blocks)
+
+        if num_dropped > 0:
+            remaining = self.num_blocks - num_dropped
+            self.imin[:remaining] = self.imin[num_dropped:self.num_blocks]
+            self.imax[:remaining] = self.imax[num_dropped:self.num_blocks]
+            self.num_blocks = remaining
+            self.first_block = self.first_block + num_dropped
+
+    def blocks(self, start, stop):
+        """indexes of the minimum and maximum of the blocks start to stop-1"""
+        i0 = start - self.first_block
+        i1 = stop - self.first_block
+        return self.imin[i0:i1], self.imax[i0:i1]
+
+
+class MinMaxPyramid(object):
+    """
+        multi-resolution min/max summary of one data column.
+
+        The indexes stored are absolute: they count the points since the
+        pyramid was created. When points are dropped at the beginning of the
+        column (ring buffer mode of the live data buffer) 'offset' keeps
+        track of how many, the point of absolute index i is then
+        ydata[i - offset].
+
+        The levels start at blocks of 2**first_level points, the pyramid
+        then only needs a fraction of the memory of the column, which can
+        be memory-mapped from a file. Ranges too small for the first level
+        are decimated directly from the data.
+    """
+
+    def __init__(self, first_level=FIRST_LEVEL):
+        self.first_level = first_level
+        self.levels = []
+        self.offset = 0
+        self.num_points = 0
+
+    def reset(self):
+        self.levels = []
+        self.offset = 0
+        self.num_points = 0
+
+    def drop(self, num_dropped):
+        """the num_dropped oldest points are no longer in the data column"""
+        self.offset = self.offset + num_dropped
+
+        for level in self.levels:
+            # the blocks that start before the offset are no longer valid
+            first_valid = -(-self.offset // level.size)
+            level.drop_blocks_before(first_valid)
+
+    def extend(self, ydata):
+        """
+            update the pyramid after points were appended to ydata, ydata
+            is the whole column (not only the new points)
+        """
+        self.num_points = self.offset + len(ydata)
+
+        level_num = self.first_level
+        while 2 ** level_num <= self.num_points:
+
+            idx = level_num - self.first_level
+            if len(self.levels) <= idx:
+                level = BlockLevel(level_num)
+                # no block of this level can be built from points already
+                # dropped
+                level.first_block = -(-self.offset // level.size)
+                self.levels.append(level)
+
+            level = self.levels[idx]
+            # number of blocks which are now complete
+            stop = self.num_points // level.size
+            start = max(level.end_block(), -(-self.offset // level.size))
+
+            if stop > start and level.num_blocks == 0:
+                level.first_block = start
+
+            # go through the new blocks by pieces to limit the size of the
+            # temporary arrays
+            chunk_blocks = max(CHUNK_POINTS // level.size, 1)
+            for chunk_start in range(start, stop, chunk_blocks):
+                chunk_stop = min(chunk_start + chunk_blocks, stop)
+
+                if idx == 0:
+                    # reduce the blocks of points directly
+                    imin, imax = bucket_argminmax(
+                        ydata, chunk_start * level.size - self.offset,
+                        chunk_stop * level.size - self.offset, level.size)
+                    imin = imin + self.offset
+                    imax = imax + self.offset
+                else:
+                    # compare pairs of blocks from the level below
+                    below = self.levels[idx - 1]
+                    bmin, bmax = below.blocks(2 * chunk_start, 2 * chunk_stop)
+                    imin = self._pick(ydata, bmin[0::2], bmin[1::2],
+                                      np.less_equal)
+                    imax = self._pick(ydata, bmax[0::2], bmax[1::2],
+                                      np.greater_equal)
+                level.add_blocks(imin, imax)
+
+            level_num = level_num + 1
+
+    def _pick(self, ydata, first, second, compare):
+        """
+            between the points of absolute indexes first and second keep the
+            one which satisfies compare, NaNs lose against numbers
+        """
+        y1 = ydata[first - self.offset]
+        y2 = ydata[second - self.offset]
+        with np.errstate(invalid='ignore'):
+            keep_first = compare(y1, y2) | np.isnan(y2)
+        return np.where(keep_first, first, second)
+
+    def indices(self, ydata, start, stop, num_buckets):
+        """
+            return the sorted indexes (relative to ydata) of the points to
+            plot to represent ydata[start:stop] with about num_buckets
+            min/max pairs
+        """
+        num = stop - start
+
+        if num <= 2 * num_buckets:
+            return np.arange(start, stop)
+
+        # choose the level whose blocks are about the size of a bucket
+        level_num = int(np.ceil(np.log2(num / num_buckets)))
+        idx = min(level_num, self.first_level + len(self.levels) - 1) - \
+            self.first_level
+
+        if idx < 0:
+            # the range is small enough to be decimated from the data
+            imin, imax = bucket_argminmax(ydata, start, stop, 2 ** level_num)
+            return np.unique(np.concatenate(
+                [np.array([start, stop - 1]), imin, imax]))
+
+        level = self.levels[idx]
+
+        abs_start = start + self.offset
+        abs_stop = stop + self.offset
+
+        # complete blocks inside the range
+        first = max(-(-abs_start // level.size), level.first_block)
+        last = min(abs_stop // level.size, level.end_block())
+
+        if last <= first:
+            imin, imax = bucket_argminmax(ydata, start, stop, level.size)
+            return np.unique(np.concatenate(
+                [np.array([start, stop - 1]), imin, imax]))
+
+        bmin, bmax = level.blocks(first, last)
+
+        parts = [np.array([start, stop - 1])]
+        parts.append(bmin - self.offset)
+        parts.append(bmax - self.offset)
+
+        # the ends of the range which are not covered by complete blocks
+        head_stop = first * level.size - self.offset
+        tail_start = last * level.size - self.offset
+        if head_stop > start:
+            parts.append(np.array(argminmax(ydata, start, head_stop)))
+        if stop > tail_start:
+            parts.append(np.array(argminmax(ydata, tail_start, stop)))
+
+        return np.unique(np.concatenate(parts))
+
+
+class RunningExtrema(object):
+    """
+        minimum and maximum of a growing set of values, the values are
+        numbered from start and count is the number of the next value to
+        come. NaNs are ignored, min and max are None if there is no number.
+    """
+
+    def __init__(self, values=None, start=0):
+        self.min = None
+        self.max = None
+        self.start = start
+        self.count = start
+        if values is not None:
+            self.extend(values)
+
+    def extend(self, values):
+        """take the values appended since the last call into account"""
+        for chunk in chunks(values):
+            self._extend(chunk)
+
+    def _extend(self, values):
+        values = np.asarray(values)
+        self.count = self.count + values.size
+        values = values[~np.isnan(values)]
+
+        if values.size > 0:
+            vmin = values.min()
+            vmax = values.max()
+
+            if self.min is None:
+                self.min = vmin
+                self.max = vmax
+            else:
+                self.min = min(self.min, vmin)
+                self.max = max(self.max, vmax)
+
+
+class SlidingExtrema(object):
+    """
+        minimum and maximum of the values within a window whose both ends
+        only move forward : values are appended with extend and the oldest
+        ones are forgotten with drop_before.
+
+        Two monotonic deques of (number, value) are kept, the one for the
+        maximum only holds the values which are larger than all the values
+        coming after them, so its first element is the maximum of the window,
+        and conversely for the minimum. Each value enters and leaves a deque
+        at most once.
+    """
+
+    def __init__(self, values=None, start=0):
+        self._min = deque()
+        self._max = deque()
+        self.start = start
+        self.count = start
+        if values is not None:
+            self.extend(values)
+
+    @property
+    def min(self):
+        if len(self._min) > 0:
+            return -self._min[0][1]
+        else:
+            return None
+
+    @property
+    def max(self):
+        if len(self._max) > 0:
+            return self._max[0][1]
+        else:
+            return None
+
+    def extend(self, values):
+        """take the values appended since the last call into account"""
+        for chunk in chunks(values):
+            self._extend(chunk)
+
+    def _extend(self, values):
+        values = np.asarray(values, dtype=float)
+        numbers = self.count + np.arange(values.size)
+        self.count = self.count + values.size
+
+        valid = ~np.isnan(values)
+        values = values[valid]
+        numbers = numbers[valid]
+
+        # the minimum is handled as the maximum of the opposite values
+        push_maximum(self._max, numbers, values)
+        push_maximum(self._min, numbers, -values)
+
+    def drop_before(self, number):
+        """forget the values numbered below number"""
+        self.start = max(self.start, number)
+
+        for values in [self._min, self._max]:
+            while len(values) > 0 and values[0][0] < self.start:
+                values.popleft()
+
+
+def push_maximum(values, numbers, new_values):
+    """
+        append new_values to the monotonic deque values (see SlidingExtrema),
+        the whole block is handled at once instead of one value at a time
+    """
+    if new_values.size == 0:
+        return
+
+    # a new value is kept only if it is larger than all the ones after it
+    following_max = np.empty_like(new_values)
+    following_max[:-1] = np.maximum.accumulate(new_values[::-1])[::-1][1:]
+    following_max[-1] = -np.inf
+    keep = new_values > following_max
+
+    # the first value kept is the maximum of the block, it makes the values
+    # already in the deque which are not larger than it useless
+    block_max = new_values[keep][0]
+    while len(values) > 0 and values[-1][1] <= block_max:
+        values.pop()
+
+    values.extend(zip(numbers[keep].tolist(), new_values[keep].tolist()))
+
+
+class LineSource(object):
+    """
+        full resolution data of a plotted line, the line itself only gets
+        the points returned by decimate
+    """
+
+    def __init__(self, xdata, ydata, invert=False):
+        self.pyramid = MinMaxPyramid()
+        self.set_data(xdata, ydata, invert)
+
+    def set_data(self, xdata, ydata, invert=False, num_new=None,
+                 num_dropped=0):
+        """
+            give new data to the source, if num_new is None the data is
+            considered as entirely new, otherwise xdata and ydata should be
+            the previous data with num_new points appended and the
+            num_dropped oldest points removed.
+            When invert is True the line shows -ydata.
+        """
+        self.invert = invert
+
+        if num_new is None:
+            self.pyramid.reset()
+            self.x_increasing = is_increasing(xdata)
+
+            # the limits will be computed again from the new data
+            self.x_extrema = None
+            self.y_extrema = None
+            self.y_window = None
+        else:
+            if num_dropped > 0:
+                self.pyramid.drop(num_dropped)
+            if num_new > 0 and self.x_increasing:
+                # only look at the new points and the one before them
+                self.x_increasing = is_increasing(xdata[-(num_new + 1):])
+
+        self.xdata = xdata
+        self.ydata = ydata
+        self.pyramid.extend(ydata)
+
+    def __len__(self):
+        return len(self.ydata)
+
+    def _extrema(self, name, values, start, sliding=False):
+        """
+            bring the extrema of values[start:] stored in the attribute name
+            up to date with the points appended since the last call, they
+            are only computed again from scratch when the window moved back
+            or when a RunningExtrema would need to forget old points
+        """
+        abs_start = start + self.pyramid.offset
+        extrema = getattr(self, name)
+
+        if extrema is None or abs_start < extrema.start or (
+                abs_start > extrema.start and
+                not isinstance(extrema, SlidingExtrema)):
+            if sliding or self.pyramid.offset > 0:
+                extrema = SlidingExtrema(values[start:], abs_start)
+            else:
+                extrema = RunningExtrema(values[start:], abs_start)
+            setattr(self, name, extrema)
+        else:
+            extrema.extend(values[extrema.count - self.pyramid.offset:])
+            if abs_start > extrema.start:
+                extrema.drop_before(abs_start)
+
+        return extrema
+
+    def x_range(self):
+        """return the minimum and the maximum of xdata, or None"""
+        if len(self.xdata) == 0:
+            return None
+        elif self.x_increasing:
+            return self.xdata[0], self.xdata[-1]
+        else:
+            extrema = self._extrema("x_extrema", self.xdata, 0)
+            if extrema.min is None:
+                return None
+            else:
+                return extrema.min, extrema.max
+
+    def y_range(self, xstart=None):
+        """
+            return the minimum and the maximum of the line (-ydata if it is
+            inverted), or None. If xstart is given only the points whose x is
+            larger than xstart are considered.
+        """
+        if xstart is None:
+            extrema = self._extrema("y_extrema", self.ydata, 0)
+        elif self.x_increasing:
+            start = np.searchsorted(self.xdata, xstart, "left")
+            extrema = self._extrema("y_window", self.ydata, start, True)
+        else:
+            # no window can be maintained without sorted x values
+            extrema = RunningExtrema(self.ydata[self.xdata >= xstart])
+
+        if extrema.min is None:
+            return None
+        elif self.invert:
+            return -extrema.max, -extrema.min
+        else:
+            return extrema.min, extrema.max
+
+    def decimate(self, xlim, num_buckets):
+        """
+            return the points to plot to show the data within xlim on an
+            axes num_buckets pixels wide
+        """
+        num = len(self.ydata)
+
+        if self.x_increasing and num > 0:
+            xmin, xmax = min(xlim), max(xlim)
+            # keep one point outside the range on each side so that the line
+            # goes up to the edges of the axes
+            start = max(np.searchsorted(self.xdata, xmin, "left") - 1, 0)
+            stop = min(np.searchsorted(self.xdata, xmax, "right") + 1, num)
+        else:
+            start = 0
+            stop = num
+
+        idx = self.pyramid.indices(self.ydata, start, stop, num_buckets)
+
+        if self.invert:
+            return self.xdata[idx], -self.ydata[idx]
+        else:
+            return self.xdata[idx], self.ydata[idx]
+
+
+def is_increasing(xdata):
+    """check whether the values of xdata never decrease"""
+    # the chunks overlap by one point so that no difference is missed
+    for start in range(0, len(xdata) - 1, CHUNK_POINTS):
+        if not np.all(np.diff(xdata[start:start + CHUNK_POINTS + 1]) >= 0):
+            return False
+    return True
+
+
+def chunks(values):
+    """
+        go through values by pieces of CHUNK_POINTS, a memory-mapped column
+        is then never copied at once into temporary arrays
+    """
+    for start in range(0, len(values), CHUNK_POINTS):
+        yield values[start:start + CHUNK_POINTS]
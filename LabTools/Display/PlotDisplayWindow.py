@@ -32,6 +32,7 @@ from matplotlib.ticker import MultipleLocator, FormatStrFormatter
 
 
 from mplZoomWidget import MatplotlibZoomWidget
+from LabTools import DataStructure
 import ui_plotdisplaywindow
 from matplotlib import dates
 from matplotlib import ticker
@@ -133,6 +134,15 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
         self.time_Xaxis=False
         self.date_txt=self.fig.text(0.03,0.95,"",fontsize=15)
 
+        # what was given to the lines at the last call of update_plot, used
+        # to update them incrementally when only new rows were added
+        self.rows_plotted = 0
+        self.last_row_plotted = None
+        self.chan_X_plotted = None
+        self.time_Xaxis_plotted = False
+        # the X channel converted to dates when it is a time axis
+        self.time_data = None
+
     def closeEvent(self, event):
         """
         when the window get close the destruction of the layout is handled
@@ -492,11 +502,30 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
             return time_data
         
 
+    def update_time_data(self, new_rows = None):
+        """
+            the X channel converted to dates, when new_rows ([num_new,
+            num_dropped], see DataStructure.count_new_rows) is given only the
+            new rows are converted
+        """
+        if new_rows is None or self.time_data is None:
+            self.time_data = np.asarray(self.set_axis_time())
+        else:
+            num_new, num_dropped = new_rows
+            time_data = self.time_data[num_dropped:]
+            if num_new > 0:
+                time_data = np.concatenate([time_data, self.convert_timestamp(
+                    self.data_array[-num_new:, self.chan_X])])
+            self.time_data = time_data
+        return self.time_data
+
     def set_marker(self,idx,marker):
         """change the marker style of the plotted line in position idx"""
         if idx < len(self.ax.lines):
             self.ax.lines[idx].set_marker(marker)
             self.axR.lines[idx].set_marker(marker)
+        # the legend shows the style of the lines
+        self.mplwidget.invalidate_background()
         self.mplwidget.rescale_and_draw() 
         
     def set_linestyle(self,idx,linesty):
@@ -504,6 +533,7 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
         if idx < len(self.ax.lines):
             self.ax.lines[idx].set_linestyle(linesty)
             self.axR.lines[idx].set_linestyle(linesty)
+        self.mplwidget.invalidate_background()
         self.mplwidget.rescale_and_draw() 
         
 
@@ -512,6 +542,7 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
         if idx < len(self.ax.lines):
             self.ax.lines[idx].set_color(color)
             self.axR.lines[idx].set_color(color)                
+        self.mplwidget.invalidate_background()
         self.mplwidget.rescale_and_draw()              
         
 
@@ -521,6 +552,7 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
             if idx < len(self.ax.lines):
                 self.ax.lines[idx].set_marker(m)
                 self.axR.lines[idx].set_marker(m)                
+        self.mplwidget.invalidate_background()
         self.mplwidget.rescale_and_draw() 
 
     def update_colors(self, color_list):
@@ -529,6 +561,7 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
             if idx < len(self.ax.lines):
                 self.ax.lines[idx].set_color(color)
                 self.axR.lines[idx].set_color(color)                
+        self.mplwidget.invalidate_background()
         self.mplwidget.rescale_and_draw()                 
 
     def update_labels(self, label_list):
@@ -546,7 +579,7 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
             it only plots if the checkbox of the line is checked
         """
         
-        if not data_array == None:
+        if data_array is not None:
             if not isnparray(data_array) == True:
                 raise isnparray(data_array)
             else:
@@ -564,38 +597,59 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
             while self.num_channels < num_channels:
                 self.add_channel_controls()
 
+            #find out whether rows were only appended since the last call, in which case the lines are updated incrementally
+            if not self.chan_X == self.chan_X_plotted or not self.time_Xaxis == self.time_Xaxis_plotted:
+                new_rows = None
+            else:
+                new_rows = DataStructure.count_new_rows(self.rows_plotted, self.last_row_plotted, self.data_array)
+
             #there is a different treatment if x is choosen to be a time axis or quantity measured by an instrument                
             if self.time_Xaxis:
-                xdata=self.set_axis_time()
+                xdata = self.update_time_data(new_rows)
             else:
                 xdata = self.data_array[:,self.chan_X]   
 
+            if new_rows is None:
+                num_new, num_dropped = None, 0
+            else:
+                num_new, num_dropped = new_rows
+
             #go through the channels and update the lines for those who are checked
             for chan_Y, [line_L, line_R] in enumerate(zip (self.ax.lines, self.axR.lines)):
                 
                 if self.data_array.size>0:
                     
-                    if self.channel_objects["groupBox_invert"][chan_Y].isChecked():
-                        ydata = -self.data_array[:, chan_Y]
-                    else:
-                        ydata = self.data_array[:, chan_Y]                  
+                    invert = self.channel_objects["groupBox_invert"][chan_Y].isChecked()
+                    ydata = self.data_array[:, chan_Y]                  
                         
-                    #look which checkbox is checked and plot corresponding data
+                    #look which checkbox is checked and plot corresponding data, the line only gets the points which can be seen
                     if self.channel_objects["groupBox_Y"][chan_Y].isChecked() and self.data_array.size>0:
-                        line_L.set_data(xdata, ydata)
+                        self.mplwidget.set_line_source(line_L, xdata, ydata, invert, num_new, num_dropped)
                     else:
+                        self.mplwidget.remove_line_source(line_L)
                         line_L.set_data([],[])
                         
                     #look which checkbox is checked and plot corresponding data    
                     if self.channel_objects["groupBox_YR"][chan_Y].isChecked() and self.data_array.size>0:
-                        line_R.set_data(xdata, ydata)
+                        self.mplwidget.set_line_source(line_R, xdata, ydata, invert, num_new, num_dropped)
                     else:
+                        self.mplwidget.remove_line_source(line_R)
                         line_R.set_data([],[])      
+
+            self.rows_plotted = len(self.data_array)
+            self.last_row_plotted = np.array(self.data_array[-1])
+            self.chan_X_plotted = self.chan_X
+            self.time_Xaxis_plotted = self.time_Xaxis
         else:
             #if an empty array was given we set the lines to empty arrays
             for line_L, line_R in zip (self.ax.lines, self.axR.lines):
+                self.mplwidget.remove_line_source(line_L)
+                self.mplwidget.remove_line_source(line_R)
                 line_L.set_data([],[])
                 line_R.set_data([],[])
+            self.rows_plotted = 0
+            self.last_row_plotted = None
+            self.time_data = None
         self.mplwidget.rescale_and_draw() 
                 
 
@@ -632,6 +686,8 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
 
         self.ax.lines[-2].set_data(xdata, fitY)              
       
+        # the fit lines are part of the cached background in blit mode
+        self.mplwidget.invalidate_background()
         #call a method defined in the module mplZoomwidget.py         
         self.mplwidget.rescale_and_draw() 
             
@@ -642,6 +698,8 @@ class PlotDisplayWindow(QtGui.QMainWindow,ui_plotdisplaywindow.Ui_PlotDisplayWin
         if self.num_channels < len(self.ax.lines):
             self.ax.lines[-1].set_data([], [])
             self.ax.lines[-2].set_data([], [])
+            self.mplwidget.invalidate_background()
+            self.mplwidget.rescale_and_draw()
             
     def print_figure(self, file_name = "unknown"):
         """Sends the current plot to a printer"""
@@ -17,6 +17,9 @@ ZOOM_MODE = 0
 PAN_MODE = 1
 SELECT_MODE =2
 
+#default maximum number of redraws per second of the live plots
+DEFAULT_MAX_FPS = 25
+
 
 # A silly little class to replace stdout that both prints and emits the text as a signal
 class printerceptor():
@@ -32,6 +35,96 @@ class printerceptor():
     def flush(self):
         self.old_stoud.flush()
         
+class RedrawScheduler(QObject):
+    """
+    Coalesce the updates of the live plot windows.
+
+    Instead of redrawing every window each time a row of data arrives, the
+    windows are only marked as dirty and a timer redraws them at most
+    max_fps times per second with the latest data. Windows which are hidden
+    or minimised (themselves or in the MDI area) are not redrawn, they stay
+    dirty and are updated as soon as they are shown and the timer is
+    started again (by new data or by calling start).
+    """
+
+    def __init__(self, parent=None, max_fps=DEFAULT_MAX_FPS):
+        super(RedrawScheduler, self).__init__(parent)
+
+        self.windows = []
+        self.dirty = []
+        self.data_array = None
+
+        self.timer = QTimer(self)
+        self.connect(self.timer, SIGNAL("timeout()"), self.redraw)
+        self.set_max_fps(max_fps)
+
+    def set_max_fps(self, max_fps):
+        self.timer.setInterval(int(1000.0 / max_fps))
+
+    def add_window(self, window):
+        """the window should have a method update_plot(data_array)"""
+        if window not in self.windows:
+            self.windows.append(window)
+
+    def remove_window(self, window):
+        if window in self.windows:
+            self.windows.remove(window)
+        if window in self.dirty:
+            self.dirty.remove(window)
+
+    def data_updated(self, data_array):
+        """slot for new data, all the windows will need to be redrawn"""
+        self.data_array = data_array
+
+        for window in self.windows:
+            if window not in self.dirty:
+                self.dirty.append(window)
+
+        self.start()
+
+    def start(self, *args):
+        """make sure the dirty windows will be redrawn"""
+        if self.dirty and not self.timer.isActive():
+            self.timer.start()
+
+    def redraw(self):
+        """redraw the dirty windows which can be seen"""
+        redrawn = False
+
+        for window in list(self.dirty):
+            try:
+                shown = is_shown(window)
+            except RuntimeError:
+                # the underlying C++ object was deleted
+                self.remove_window(window)
+                continue
+
+            if shown:
+                self.dirty.remove(window)
+                window.update_plot(self.data_array)
+                redrawn = True
+
+        # nothing new to draw, the timer will be started by the next data
+        if not redrawn:
+            self.timer.stop()
+
+
+def is_shown(widget):
+    """
+    False if the widget is hidden or if it or one of its parents (like a
+    subwindow of a QMdiArea) is minimised
+    """
+    if not widget.isVisible():
+        return False
+
+    while widget is not None:
+        if widget.isMinimized():
+            return False
+        widget = widget.parentWidget()
+
+    return True
+
+        
 def create_action(parent, text, slot=None, shortcut=None, icon=None, tip=None, checkable=False, signal="triggered()"):
     action = QAction(text, parent)
     if icon is not None:
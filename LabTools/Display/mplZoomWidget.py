@@ -13,6 +13,7 @@ import matplotlib as mpl
 import logging
 
 from QtTools import ZOOM_MODE, PAN_MODE, SELECT_MODE
+from PlotData import LineSource
 
 
 class MatplotlibZoomWidget(MatplotlibWidget):
@@ -59,6 +60,22 @@ class MatplotlibZoomWidget(MatplotlibWidget):
         self.autoscale_y_on = True
         self.autoscale_R_on = True
 
+        # when not 0 the autoscale only shows the last span_x of the x axis
+        self.span_x = 0
+
+        # full resolution data of the lines, the lines themselves only get
+        # the points which can be seen (see PlotData.py)
+        self.line_sources = {}
+
+        # in blit mode the lines with a source are animated : a full draw
+        # leaves them out and caches the rest of the figure (axes, ticks,
+        # labels...), when only the data changed the background is restored
+        # and only the lines are drawn on top of it
+        self.blit_on = True
+        self.background = None
+        self.background_state = None
+        self.mpl_connect('draw_event', self.on_draw)
+
         # Shrink current axis by 20%
         #box = self.axes.get_position()
         #axes.set_position([box.x0, box.y0, box.width * 0.8, box.height])
@@ -106,20 +123,43 @@ class MatplotlibZoomWidget(MatplotlibWidget):
 
         has_data = False
 
-        for line in axes.get_lines():
-            xdata = line.get_xdata()
+        lines = axes.get_lines()
 
-            if len(xdata) > 0:
+        for line in lines:
 
-                x_max = max(x_max, np.amax(xdata))
-                x_min = min(x_min, np.amin(xdata))
+            if line in self.line_sources:
+                # the limits are kept up to date by the source as rows are
+                # appended, the line itself only holds the decimated data
+                x_range = self.line_sources[line].x_range()
+            else:
+                x_range = data_range(line.get_xdata())
+
+            if x_range is not None:
+                x_max = max(x_max, x_range[1])
+                x_min = min(x_min, x_range[0])
                 has_data = True
 
-            ydata = line.get_ydata()
+        # with span_x only the points within the last span_x of the x axis
+        # are considered for the y axis
+        if span_x == 0 or not has_data:
+            x_start = None
+        else:
+            x_start = x_max - span_x
+
+        for line in lines:
 
-            if len(ydata) > 0:
-                y_max = max(y_max, np.amax(ydata))
-                y_min = min(y_min, np.amin(ydata))
+            if line in self.line_sources:
+                y_range = self.line_sources[line].y_range(x_start)
+            else:
+                ydata = line.get_ydata()
+                if x_start is not None and len(ydata) > 0:
+                    ydata = np.asarray(ydata)[
+                        np.asarray(line.get_xdata()) >= x_start]
+                y_range = data_range(ydata)
+
+            if y_range is not None:
+                y_max = max(y_max, y_range[1])
+                y_min = min(y_min, y_range[0])
                 has_data = True
 
         if x_max == x_min:
@@ -146,6 +186,11 @@ class MatplotlibZoomWidget(MatplotlibWidget):
 
             axes.set_ylim(y_min - margin, y_max + margin)
 
+    def set_span_x(self, span_x):
+        self.span_x = span_x
+        if self.autoscale_x_on:
+            self.rescale_and_draw()
+
     def set_autoscale_x(self, setting):
         self.autoscale_x_on = setting
         if setting:
@@ -178,11 +223,12 @@ class MatplotlibZoomWidget(MatplotlibWidget):
     def rescale_and_draw(self):
         # self.adjust_units()
         self.autoscale_axes(axes=self.axes, scale_x=self.autoscale_x_on,
-                            scale_y=self.autoscale_y_on)
+                            scale_y=self.autoscale_y_on, span_x=self.span_x)
 
         if self.usingR:
             self.autoscale_axes(axes=self.axesR, scale_x=False,
-                                scale_y=self.autoscale_R_on)
+                                scale_y=self.autoscale_R_on,
+                                span_x=self.span_x)
 #        self.axes.relim()
 #        self.axes.autoscale_view()
 #        self.axesR.relim()
@@ -194,8 +240,101 @@ class MatplotlibZoomWidget(MatplotlibWidget):
 
         self.redraw()
 
+    def set_line_source(self, line, xdata, ydata, invert=False,
+                        num_new=None, num_dropped=0):
+        """ Give the full resolution data of a line, the line will be
+        decimated to the points which can be seen each time the plot is
+        redrawn. num_new and num_dropped allow to update the line
+        incrementally when rows were only appended to the data (see
+        LineSource.set_data)
+        """
+        if line in self.line_sources and num_new is not None:
+            self.line_sources[line].set_data(xdata, ydata, invert, num_new,
+                                             num_dropped)
+        else:
+            if line not in self.line_sources and self.blit_on:
+                # the line was part of the cached background until now
+                line.set_animated(True)
+                self.background = None
+            self.line_sources[line] = LineSource(xdata, ydata, invert)
+
+    def remove_line_source(self, line):
+        """ The line data will be set directly with line.set_data """
+        if line in self.line_sources:
+            del self.line_sources[line]
+            line.set_animated(False)
+            self.background = None
+
+    def set_blit(self, setting):
+        """ Turn the blit mode on or off """
+        self.blit_on = setting
+        for line in self.line_sources:
+            line.set_animated(setting)
+        self.background = None
+        self.figure.canvas.draw_idle()
+
+    def invalidate_background(self):
+        """ To be called when an artist which isn't animated changed (a fit
+        line for example), the next redraw is then a full draw
+        """
+        self.background = None
+
+    def static_state(self):
+        """ Everything which, when changed, makes the cached background
+        obsolete
+        """
+        state = [tuple(self.figure.bbox.bounds)]
+        for ax in [self.axes, self.axesR]:
+            state.append(tuple(ax.get_xlim()))
+            state.append(tuple(ax.get_ylim()))
+            state.append((ax.get_xscale(), ax.get_yscale()))
+            state.append((ax.get_xlabel(), ax.get_ylabel()))
+            state.append(id(ax.xaxis.get_major_formatter()))
+            # a new legend is created when the labels change
+            legend = ax.get_legend()
+            if legend is not None:
+                state.append((id(legend), tuple(
+                    [text.get_text() for text in legend.get_texts()])))
+        state.append(tuple([text.get_text() for text in self.figure.texts]))
+        return state
+
+    def on_draw(self, event):
+        """ Called after each full draw of the figure, which left out the
+        animated lines
+        """
+        if self.blit_on:
+            self.background = self.copy_from_bbox(self.figure.bbox)
+            self.background_state = self.static_state()
+            self.draw_animated_lines()
+
+    def draw_animated_lines(self):
+        for line in self.line_sources:
+            if line.get_animated() and line.get_visible():
+                line.axes.draw_artist(line)
+
+    def decimate_lines(self):
+        """ Give each line with a source only the points within its x range,
+        at most about a minimum and a maximum per pixel
+        """
+        for line, source in self.line_sources.items():
+            axes = line.axes
+            num_buckets = max(int(axes.bbox.width), 1)
+            xdata, ydata = source.decimate(axes.get_xlim(), num_buckets)
+            line.set_data(xdata, ydata)
+
     def redraw(self):
-        self.figure.canvas.draw()
+        self.decimate_lines()
+
+        if (self.blit_on and self.background is not None and
+                self.background_state == self.static_state()):
+            # only the lines changed
+            self.restore_region(self.background)
+            self.draw_animated_lines()
+            self.blit(self.figure.bbox)
+        else:
+            # the actual drawing happens once the event loop is idle, several
+            # requests in a row only lead to a single draw
+            self.figure.canvas.draw_idle()
 
     def mousePressEvent(self, event):
         if event.button() == QtCore.Qt.LeftButton:
@@ -283,7 +422,7 @@ class MatplotlibZoomWidget(MatplotlibWidget):
                     ax.set_ylim(y_min, y_max)
 
                     self.zoom_rectangle.remove()
-                    self.figure.canvas.draw()
+                    self.redraw()
 
                 elif self.mouseMode == self.SELECT_MODE:
                     self.zoom_rectangle.remove()
@@ -442,6 +581,16 @@ class MatplotlibZoomWidget(MatplotlibWidget):
         print("line " + str(selected) + " selected!")
 
 
+def data_range(data):
+    """return the minimum and the maximum of data ignoring NaNs, or None"""
+    data = np.asarray(data, dtype=float)
+    data = data[~np.isnan(data)]
+    if data.size > 0:
+        return np.amin(data), np.amax(data)
+    else:
+        return None
+
+
 def get_axis_limits(axis):
     x_min, x_max = axis.get_view_interval()
     if axis.get_scale() == 'log':
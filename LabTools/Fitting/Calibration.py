@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 14:05:12 2026
+
+License: see LICENSE.txt file
+
+Thermometer calibrations given as Chebyshev fits by ranges of resistance,
+the way Lake Shore gives them. In each range the temperature is
+
+    T = sum_i a_i cos(i acos(k)),  k = ((Z - ZL) - (ZU - Z)) / (ZU - ZL)
+
+with Z = log10(R) (or R with log_resistance=False). The conversions work on
+whole arrays : the range of each point is found with np.searchsorted and
+each range is evaluated at once with chebval. A LookupTable interpolates a
+dense table of a calibration instead, which costs the same for any number
+of terms.
+
+A calibration file has one line per range with R_min, R_max, ZL, ZU and the
+coefficients a_0 ... a_n separated by spaces, the lines starting with # are
+comments. get_calibration loads them once, it can be used in the
+calculations of the calculation window, for example
+    get_calibration('RX102A.txt')(data[2])
+
+The calibrations of the thermometers of the lab (RX_102A, RX_202A,
+RUOX_U02627) are defined at the end of the module, the converter_*.py
+modules and the LS340 driver use them.
+"""
+
+import numpy as np
+from numpy.polynomial.chebyshev import chebval
+
+# number of points of a LookupTable
+LOOKUP_POINTS = 100000
+
+# calibrations already loaded by get_calibration
+loaded_calibrations = {}
+
+# temperature given out of the ranges of a calibration by the old converter
+# modules, some scripts test for it
+OUT_OF_RANGE_T = 99999
+
+
+class ChebyshevCalibration(object):
+    """
+        conversion from resistance to temperature with Chebyshev fits by
+        range, ranges is a list of (R_min, R_max, ZL, ZU, coefficients).
+        A range goes from R_min included to R_max excluded, except the last
+        one which includes R_max, like the old converters. The values out
+        of all the ranges give NaN.
+    """
+
+    def __init__(self, ranges, log_resistance=True):
+        ranges = sorted(ranges, key=lambda fit_range: fit_range[0])
+        self.log_resistance = log_resistance
+        self.r_min = np.array([fit_range[0] for fit_range in ranges],
+                              dtype=float)
+        self.r_max = np.array([fit_range[1] for fit_range in ranges],
+                              dtype=float)
+        self.z_lower = [float(fit_range[2]) for fit_range in ranges]
+        self.z_upper = [float(fit_range[3]) for fit_range in ranges]
+        self.coefficients = [np.array(fit_range[4], dtype=float)
+                             for fit_range in ranges]
+        # the table used by T_to_R, it is made by the first call
+        self.inverse_table = None
+
+    def __call__(self, R):
+        return self.R_to_T(R)
+
+    def z(self, R):
+        if self.log_resistance:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.log10(R)
+        else:
+            return R
+
+    def range_index(self, R):
+        """the index of the range of each resistance, -1 out of range"""
+        index = np.searchsorted(self.r_max, R, side='right')
+        index[R == self.r_max[-1]] = len(self.r_max) - 1
+        valid = index < len(self.r_max)
+        valid[valid] = R[valid] >= self.r_min[index[valid]]
+        index[~valid] = -1
+        return index
+
+    def R_to_T(self, R, out_of_range=np.nan):
+        """
+            the temperatures of the resistances R (a number or an array),
+            out_of_range for the resistances out of all the ranges
+        """
+        scalar = np.ndim(R) == 0
+        R = np.atleast_1d(np.asarray(R, dtype=float))
+        Z = self.z(R)
+        index = self.range_index(R)
+
+        T = np.empty(R.shape)
+        T.fill(out_of_range)
+        for i, coefficients in enumerate(self.coefficients):
+            in_range = index == i
+            if np.any(in_range):
+                z_lower = self.z_lower[i]
+                z_upper = self.z_upper[i]
+                k = ((Z[in_range] - z_lower) - (z_upper - Z[in_range])) / (
+                    z_upper - z_lower)
+                T[in_range] = chebval(k, coefficients)
+
+        if scalar:
+            return float(T[0])
+        return T
+
+    def T_to_R(self, T):
+        """
+            the resistances of the temperatures T (a number or an array),
+            interpolated in the LookupTable of the calibration. The
+            temperatures out of the calibration give its end resistances.
+        """
+        if self.inverse_table is None:
+            table = self.lookup_table()
+            valid = ~np.isnan(table.T_table)
+            if self.log_resistance:
+                R_table = 10 ** table.z_table[valid]
+            else:
+                R_table = table.z_table[valid]
+            T_table = table.T_table[valid]
+            # np.interp needs increasing temperatures
+            order = np.argsort(T_table)
+            self.inverse_table = (T_table[order], R_table[order])
+
+        T_table, R_table = self.inverse_table
+        return np.interp(T, T_table, R_table)
+
+    def lookup_table(self, num_points=LOOKUP_POINTS):
+        """a LookupTable of this calibration"""
+        return LookupTable(self, num_points)
+
+
+class LookupTable(object):
+    """
+        dense table of a calibration, regularly spaced in Z between the
+        smallest and the largest resistance of the calibration. A value is
+        interpolated from the two points around it, the index of which is
+        computed directly.
+    """
+
+    def __init__(self, calibration, num_points=LOOKUP_POINTS):
+        self.calibration = calibration
+        self.z_table = np.linspace(calibration.z(calibration.r_min[0]),
+                                   calibration.z(calibration.r_max[-1]),
+                                   num_points)
+        if calibration.log_resistance:
+            R_table = 10 ** self.z_table
+        else:
+            R_table = self.z_table
+        # the ends of the table fall on the limits of the ranges
+        R_table[0] = calibration.r_min[0]
+        R_table[-1] = calibration.r_max[-1]
+        self.T_table = calibration.R_to_T(R_table)
+
+        self.z_start = self.z_table[0]
+        self.z_step = self.z_table[1] - self.z_table[0]
+
+    def __call__(self, R):
+        return self.R_to_T(R)
+
+    def R_to_T(self, R):
+        """the temperatures of the resistances R (a number or an array)"""
+        scalar = np.ndim(R) == 0
+        R = np.atleast_1d(np.asarray(R, dtype=float))
+
+        position = (self.calibration.z(R) - self.z_start) / self.z_step
+        outside = ~((position >= 0) & (position <= len(self.z_table) - 1))
+        position[outside] = 0
+
+        index = np.minimum(position.astype(int), len(self.z_table) - 2)
+        fraction = position - index
+        T = self.T_table[index] + fraction * (self.T_table[index + 1] -
+                                              self.T_table[index])
+        T[outside] = np.nan
+
+        if scalar:
+            return float(T[0])
+        return T
+
+
+def load_calibration(fname, log_resistance=True):
+    """read a ChebyshevCalibration from a file (see the module docstring)"""
+    ranges = []
+    calibration_file = open(fname, 'r')
+    for line in calibration_file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            values = [float(value) for value in line.split()]
+            ranges.append((values[0], values[1], values[2], values[3],
+                           values[4:]))
+    calibration_file.close()
+    return ChebyshevCalibration(ranges, log_resistance)
+
+
+def get_calibration(fname, lookup=False):
+    """
+        the calibration of the file fname, it is only read the first time.
+        With lookup its LookupTable is returned.
+    """
+    key = (fname, lookup)
+    if key not in loaded_calibrations:
+        calibration = load_calibration(fname)
+        if lookup:
+            calibration = calibration.lookup_table()
+        loaded_calibrations[key] = calibration
+    return loaded_calibrations[key]
+
+
+# the calibrations of the thermometers of the lab, from the Lake Shore data of
+# each sensor : (R_min, R_max, ZL, ZU, coefficients) in Ohm
+
+# RX-102A, on the dilution refrigerator at several stages (1K pot, still,
+# intermediate cold plate and mixing chamber), 50 mK to 40 K
+RX_102A = ChebyshevCalibration([
+    (1049.08, 1239.03, 2.95500000000, 3.10855552727,
+     [3074.395992, -5680.735415, 4510.873058, -3070.206226, 1775.293345,
+      -857.606658, 336.220971, -101.617491, 21.390256, -2.407847]),
+    (1239.03, 2391.58, 3.08086045368, 3.44910010859,
+     [2.813252, -2.976371, 1.299095, -0.538334, 0.220456, -0.090969,
+      0.037095, -0.015446, 0.005104, -0.004254]),
+    (2391.58, 63765.1, 3.35453159798, 5.00000000000,
+     [0.300923, -0.401714, 0.220055, -0.098891, 0.046804, -0.017379,
+      0.009090, -0.002703, 0.002170])])
+
+# RX-202A, on the cold plate of the dilution refrigerator (in the field
+# region, it isn't reliable in large magnetic fields), 50 mK to 40 K
+RX_202A = ChebyshevCalibration([
+    (2243.15, 2843.53, 3.27800000000, 3.46671731726,
+     [102.338126, -161.190611, 94.158738, -43.080048, 15.317949, -3.881270,
+      0.540313]),
+    (2843.53, 5166.86, 3.44161440913, 3.74909980595,
+     [2.129752, -2.281779, 0.981996, -0.386190, 0.143467, -0.050844,
+      0.017569, -0.006164, 0.002311]),
+    (5166.86, 69191.1, 3.67248634198, 5.08000000000,
+     [0.216272, -0.297572, 0.146302, -0.083696, 0.026669, -0.019932,
+      0.003085, -0.004804, 0.000177, -0.001218, 0.000286])])
+
+# RuOx U02627, read by the LS340, 300 mK to 40 K. The coldest range goes up
+# to the resistance of its ZU.
+RUOX_U02627 = ChebyshevCalibration([
+    (1050, 1154, 3.019185975, 3.07391113361,
+     [20.598498, -15.703463, 5.639488, -1.996474, 0.697037, -0.239353,
+      0.082146, -0.03352, 0.013951, -0.007427]),
+    # the old converter used this range up to 1676 included
+    (1154, np.nextafter(1676, np.inf), 3.05398896134, 3.25850099806,
+     [5.23383, -4.796975, 1.886803, -0.726021, 0.278156, -0.107016,
+      0.041521, -0.015844, 0.00691, -0.002499, 0.001198]),
+    (np.nextafter(1676, np.inf), 10 ** 3.81987282195, 3.19922619413, 3.81987282195,
+     [0.973123, -1.004511, 0.397604, -0.144157, 0.050408, -0.017547,
+      0.006314, -0.002121, 0.000407])])
@@ -1,2 +1,2 @@
-__all__ = ['analyse_data', 'analyse_data_widget', 'Functions']
+__all__ = ['analyse_data', 'analyse_data_widget', 'Functions', 'Calibration']
 
@@ -12,6 +12,9 @@ from importlib import import_module
 import logging
 import time
 import os
+import json
+import binascii
+import warnings
 
 CONFIG_FILE="config.txt"
 
@@ -22,6 +25,14 @@ SAVE_DATA_PATH_ID = "DATA_PATH"
 SETTINGS_ID = "SETTINGS"
 LOAD_DATA_FILE_ID = "DATAFILE"
 GPIB_INTF_ID = "GPIB_INTF"
+BUFFER_ROWS_ID = "BUFFER_ROWS"
+PLOT_MAX_FPS_ID = "PLOT_MAX_FPS"
+DATA_FORMAT_ID = "DATA_FORMAT"
+WRITER_BATCH_ROWS_ID = "WRITER_BATCH_ROWS"
+WRITER_QUEUE_SIZE_ID = "WRITER_QUEUE_SIZE"
+WRITER_FSYNC_ID = "WRITER_FSYNC"
+WRITER_WHEN_FULL_ID = "WRITER_WHEN_FULL"
+ASYNC_POLLING_ID = "ASYNC_POLLING"
 
 def create_config_file(main_dir=None):
     """
@@ -265,96 +276,479 @@ def get_debug_setting():
 def get_interface_setting():
     return get_config_setting(GPIB_INTF_ID)
 
+def get_buffer_rows_setting():
+    """
+        returns the maximum number of rows the live data buffer should keep
+        or None if the buffer is unbounded (the default)
+    """
+    setting = get_config_setting(BUFFER_ROWS_ID)
+    max_rows = None
+    if setting:
+        try:
+            max_rows = int(setting)
+        except ValueError:
+            logging.warning("The %s setting should be an integer, the live \
+data buffer will be unbounded" % (BUFFER_ROWS_ID))
+        else:
+            if max_rows < 1:
+                max_rows = None
+    return max_rows
+
+
+def get_plot_max_fps_setting(default=25):
+    """
+        returns the maximum number of times per second the live plots are
+        redrawn
+    """
+    setting = get_config_setting(PLOT_MAX_FPS_ID)
+    max_fps = default
+    if setting:
+        try:
+            max_fps = float(setting)
+        except ValueError:
+            logging.warning("The %s setting should be a number, the default \
+value of %s is used" % (PLOT_MAX_FPS_ID, default))
+        else:
+            if max_fps <= 0:
+                max_fps = default
+    return max_fps
+
+
+def get_data_format_setting():
+    """
+        returns the format in which the data should be saved (see
+        OutputFormats.DATA_FORMATS) or None for the default text format
+    """
+    return get_config_setting(DATA_FORMAT_ID)
+
+
+def get_writer_settings():
+    """
+        returns a dict with the settings of the output writer thread found
+        in the config file, the keys are the names of the arguments of
+        OutputFormats.BackgroundOutputWriter, missing settings are left out
+    """
+    settings = {}
+
+    for setting_id, name in [(WRITER_BATCH_ROWS_ID, "batch_rows"),
+                             (WRITER_QUEUE_SIZE_ID, "queue_size")]:
+        setting = get_config_setting(setting_id)
+        if setting:
+            try:
+                value = int(setting)
+            except ValueError:
+                logging.warning("The %s setting should be an integer, the \
+default value is used" % (setting_id))
+            else:
+                if value > 0:
+                    settings[name] = value
+
+    for setting_id, name in [(WRITER_FSYNC_ID, "fsync_policy"),
+                             (WRITER_WHEN_FULL_ID, "full_policy")]:
+        setting = get_config_setting(setting_id)
+        if setting:
+            settings[name] = setting.lower()
+
+    return settings
+
+
+def get_async_polling_setting():
+    """
+        returns True if the instruments should be read from an asyncio event
+        loop (see LabDrivers.transport) rather than by a thread per bus
+    """
+    setting = get_config_setting(ASYNC_POLLING_ID)
+    return bool(setting) and setting.upper() == 'TRUE'
+
 
 def get_drivers(drivers_path):
     print('DEPRECATED: USE LabDrivers.utils.list_drivers instead.')
     return None
 
 
+# size of the blocks read at once by the data file loader
+LOAD_CHUNK_BYTES = 2 ** 23
+
+# version of the format of the parse cache of the data files, a cache
+# written with another version is ignored
+PARSE_CACHE_VERSION = 1
+
+# number of bytes compared to check that a data file was only appended to
+# since its parse cache was written
+PARSE_CACHE_CHECK_BYTES = 64
+
+
 def load_file_linux(fname, splitchar='\t'):
     """
     This one is for Linux
     """
-    instr = open(fname, 'r')
-    data = []
-    for dat in instr:
-        if dat[0] != "#":
-            lines = dat.split(splitchar)
-            nrow = 0
-            row = []
-            for el in lines:
-                nrow = nrow + 1
-#                print el
-                row.append(float(el))
-
-            data.append(row)
-    data = np.array(data)
-#    data.reshape(nrow,ncolumn)#,nrow)
-    return data
+    return load_file_fast(fname, splitchar, headers=False)
 
 
 def load_file_windows(fname, splitchar=' ', headers=True):
     """
     This one is for Window
     """
-    str(fname)
-    instr = open(fname, 'r')
-    data = []
-    label = {}
-    row_length = 0
-    for i, dat in enumerate(instr):
-        #        print dat
-        if dat[0] != "#":
-            lines = dat.split('\r')
-            nrow = 0
-
-            for el in lines:
-                #                print el
-                nrow = nrow + 1
-                mes = el.split(splitchar)
-                ncolumn = 0
-                row = []
-                for p in mes:
-                    #                    print p
-                    #                    print p
-                    ncolumn = ncolumn + 1
-                    try:
-                        row.append(float(p))
-                    except:
-                        pass
-                if row_length == 0:
-                    row_length = len(row)
-                if len(row) == row_length:
-                    data.append(row)
-                else:
-                    print("IOTools.load_file_windows : line", i, " skipped")
-        else:
-            label_id = dat[1:2]
+    return load_file_fast(fname, splitchar, headers)
 
-            dat = dat[2:len(dat)].replace("'", "")
-            dat = dat.strip("\n")
-            print("IOTools.load_file_windows : labels", dat)
-            if label_id == 'P':
-                if splitchar == '\t':
-                    dat = dat.strip('\t')
-                    print("IOTools.load_file_windows : labels", dat)
-                    label['param'] = dat.split(splitchar)
-                else:
-                    label['param'] = dat.split(', ')
-            elif label_id == 'I':
-                label['instr'] = dat.split(', ')
 
-    data = np.array(data)
-#    data.reshape(nrow,ncolumn)#,nrow)
+def load_file_fast(fname, splitchar=' ', headers=True, usecols=None,
+                   use_cache=True):
+    """
+        load a data file (.dat, .adat ...) the header lines starting with #
+        are parsed into a dict (the #P line gives label['param'] and the #I
+        line label['instr']), the other lines are the rows of the data.
+        The rows are read by large blocks and converted to floats all at once
+        by numpy, lines which don't have the same number of values as the
+        first row are skipped, and so are the lines with a value which is not
+        a number (the old loader only dropped that value from the line).
+        usecols is a list of the indexes of the columns to keep, to avoid
+        holding in memory the channels which are not needed.
+        If use_cache is True the parsed rows are kept in a binary cache next
+        to the file (see load_file_cached).
+    """
+    fname = str(fname)
+
+    if use_cache:
+        data, label = load_file_cached(fname, splitchar, usecols)
+    else:
+        label = {}
+        chunks = list(iter_data_file(fname, splitchar, usecols, label=label))
+
+        if chunks:
+            data = np.concatenate(chunks)
+        else:
+            data = np.array([])
+
+    if usecols is not None and 'param' in label:
+        try:
+            label['param'] = [label['param'][i] for i in usecols]
+        except IndexError:
+            pass
 
     if headers:
         if len(label) == 0:
-            print("IOTools.load_file_windows : #P or #I headers are missing, all lines starting with # will be ignored")
+            print("IOTools.load_file_fast : #P or #I headers are missing, all lines starting with # will be ignored")
         return data, label
     else:
         return data
 
 
+def iter_data_file(fname, splitchar=' ', usecols=None,
+                   chunk_bytes=LOAD_CHUNK_BYTES, label=None, start=0,
+                   stop=None, ncols=None, info=None):
+    """
+        generator which reads a data file by blocks of chunk_bytes and yields
+        the rows of each block as a 2D array, so a file can be processed
+        without holding all of it in memory. If label is a dict, it is
+        filled with the header information as it is found (see
+        load_file_fast).
+        Only the bytes between the positions start and stop are read, ncols
+        is the number of values expected per line if it is already known.
+        If info is a dict, info['ncols'] is set to the number of values per
+        line once it is known (before usecols is applied).
+    """
+    for lines in iter_file_lines(fname, chunk_bytes, start, stop):
+        data_lines = []
+        for line in lines:
+            if line.startswith('#'):
+                if label is not None:
+                    parse_header_line(line, label, splitchar)
+            elif line.strip():
+                data_lines.append(line)
+
+        if data_lines:
+            data, ncols = parse_data_lines(data_lines, ncols, usecols,
+                                           splitchar)
+            if info is not None:
+                info['ncols'] = ncols
+            if len(data) > 0:
+                yield data
+
+
+def iter_file_lines(fname, chunk_bytes=LOAD_CHUNK_BYTES, start=0,
+                    stop=None):
+    """
+        generator which reads a text file from the byte position start (up
+        to the position stop if it is given) by blocks of chunk_bytes and
+        yields the list of the complete lines of each block, whatever the end
+        of line is (LF, CRLF or CR)
+    """
+    with open(fname, 'rb') as data_file:
+        data_file.seek(start)
+        position = start
+        rest = b''
+        while True:
+            if stop is None:
+                block = data_file.read(chunk_bytes)
+            else:
+                block = data_file.read(max(min(chunk_bytes, stop - position),
+                                           0))
+            if not block:
+                break
+            position = position + len(block)
+            block = rest + block
+            cut = max(block.rfind(b'\n'), block.rfind(b'\r'))
+            if cut < 0:
+                rest = block
+            else:
+                rest = block[cut + 1:]
+                yield split_lines(block[:cut + 1])
+        if rest:
+            yield split_lines(rest)
+
+
+def parse_cache_names(fname):
+    """
+        names of the files of the parse cache of the data file fname, the
+        rows are not in a .npy file so that the cache isn't taken for a
+        recorded data file (see OutputFormats.is_binary_file)
+    """
+    return fname + ".parsecache", fname + ".parsecache.json"
+
+
+def last_line_end(fname, start, stop):
+    """
+        position just after the last end of line found between the byte
+        positions start and stop of the file, or start if there is none
+    """
+    with open(fname, 'rb') as data_file:
+        position = stop
+        while position > start:
+            block_start = max(start, position - 4096)
+            data_file.seek(block_start)
+            block = data_file.read(position - block_start)
+            cut = max(block.rfind(b'\n'), block.rfind(b'\r'))
+            if cut >= 0:
+                return block_start + cut + 1
+            position = block_start
+    return start
+
+
+def file_bytes_check(fname, stop):
+    """
+        hexadecimal string of the PARSE_CACHE_CHECK_BYTES bytes before the
+        position stop, to recognize the part of a file which was parsed
+    """
+    with open(fname, 'rb') as data_file:
+        start = max(stop - PARSE_CACHE_CHECK_BYTES, 0)
+        data_file.seek(start)
+        return binascii.hexlify(data_file.read(stop - start)).decode('ascii')
+
+
+def read_parse_cache(fname, splitchar, mmap_mode=None):
+    """
+        returns the rows, the label dict and the number of bytes of fname
+        stored in its parse cache, or None if there is no cache valid for
+        the current content of the file. mmap_mode is given to np.load, the
+        rows are then read from the file when they are used.
+    """
+    data_name, info_name = parse_cache_names(fname)
+
+    try:
+        with open(info_name, 'r') as info_file:
+            info = json.load(info_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+    try:
+        stat = os.stat(fname)
+        if (info["version"] != PARSE_CACHE_VERSION or
+                info["path"] != os.path.abspath(fname) or
+                info["splitchar"] != splitchar or
+                info["size"] > stat.st_size):
+            return None
+
+        if info["size"] == stat.st_size:
+            # the same size with another modification time means the file
+            # was edited in place
+            if info["mtime"] != stat.st_mtime:
+                return None
+        elif file_bytes_check(fname, info["parsed_bytes"]) != info["check"]:
+            # the file grew, the cache is still good if data was only
+            # appended to it
+            return None
+
+        data = np.load(data_name, mmap_mode=mmap_mode)
+        if len(data) != info["rows"]:
+            return None
+
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+    label = {}
+    for key, values in info["label"].items():
+        label[str(key)] = [str(value) for value in values]
+
+    return data, label, info["parsed_bytes"]
+
+
+def write_parse_cache(fname, splitchar, data, label, parsed_bytes, stat):
+    """store the rows parsed from the parsed_bytes first bytes of fname"""
+    data_name, info_name = parse_cache_names(fname)
+
+    info = {"version": PARSE_CACHE_VERSION,
+            "path": os.path.abspath(fname),
+            "splitchar": splitchar,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "parsed_bytes": parsed_bytes,
+            "check": file_bytes_check(fname, parsed_bytes),
+            "rows": len(data),
+            "label": label}
+
+    try:
+        # np.save would add .npy to the name
+        with open(data_name, 'wb') as data_file:
+            np.save(data_file, data)
+        with open(info_name, 'w') as info_file:
+            json.dump(info, info_file)
+    except (IOError, OSError) as e:
+        logging.info("IOTool.write_parse_cache : the parse cache of %s \
+could not be written (%s)" % (fname, e))
+
+
+def load_file_cached(fname, splitchar=' ', usecols=None):
+    """
+        load a data file like load_file_fast, going through its parse cache.
+        The first load stores the rows in a .parsecache file (in the .npy
+        format) next to the data file and a .json file with the path, size and modification time of the
+        file. The next loads read the rows from there, and if lines were
+        appended to the file in the meantime, only those are parsed and the
+        cache is updated.
+        A last line without end of line (a file being written) is parsed
+        but not stored in the cache.
+        If usecols is given only those columns are held in memory : the
+        cache is read through a memory map, and it is neither written nor
+        updated (the next load of all the columns does it).
+    """
+    stat = os.stat(fname)
+    if usecols is None:
+        cache = read_parse_cache(fname, splitchar)
+    else:
+        cache = read_parse_cache(fname, splitchar, mmap_mode='r')
+
+    if cache is None:
+        chunks = []
+        label = {}
+        start = 0
+        ncols = None
+    else:
+        data, label, start = cache
+        if data.ndim == 2:
+            ncols = data.shape[1]
+            if usecols is not None:
+                data = np.array(data[:, usecols])
+            chunks = [data]
+        else:
+            chunks = []
+            ncols = None
+
+    # the lines complete when the file was checked
+    stop = last_line_end(fname, start, stat.st_size)
+
+    info = {'ncols': ncols}
+    new_chunks = list(iter_data_file(fname, splitchar, usecols, label=label,
+                                     start=start, stop=stop, ncols=ncols,
+                                     info=info))
+    ncols = info['ncols']
+    chunks = chunks + new_chunks
+    if chunks:
+        data = np.concatenate(chunks)
+    else:
+        data = np.array([])
+
+    if usecols is None and (cache is None or stop > start):
+        write_parse_cache(fname, splitchar, data, label, stop, stat)
+
+    # the end of the file is not cached, it can still be changed
+    tail_label = dict(label)
+    tail = list(iter_data_file(fname, splitchar, usecols, label=tail_label,
+                               start=stop, ncols=ncols))
+    if tail:
+        data = np.concatenate([data] + tail if data.ndim == 2 else tail)
+
+    return data, tail_label
+
+
+def split_lines(block):
+    """split a block of bytes read from a file into lines"""
+    if not isinstance(block, str):
+        # python 3
+        block = block.decode('latin1')
+    return block.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+
+
+def parse_header_line(dat, label, splitchar=' '):
+    """
+        store the information of a header line of a data file in label, #P
+        gives the parameters (the names of the columns) and #I the
+        instruments
+    """
+    label_id = dat[1:2]
+
+    dat = dat[2:len(dat)].replace("'", "")
+    dat = dat.strip("\n")
+    if label_id == 'P':
+        if splitchar == '\t':
+            dat = dat.strip('\t')
+            label['param'] = dat.split(splitchar)
+        else:
+            label['param'] = dat.split(', ')
+    elif label_id == 'I':
+        label['instr'] = dat.split(', ')
+
+
+def parse_data_lines(lines, ncols=None, usecols=None, splitchar=' '):
+    """
+        convert lines of values separated by splitchar (or any whitespace)
+        into a 2D array. The rows which don't have ncols values (by default
+        the number of values of the first line) are skipped.
+        Returns the array and ncols.
+    """
+    if not splitchar.isspace():
+        lines = [line.replace(splitchar, ' ') for line in lines]
+
+    counts = np.array([len(line.split()) for line in lines])
+
+    if ncols is None:
+        ncols = counts[0]
+
+    good = counts == ncols
+    if not good.all():
+        logging.warning("IOTool.parse_data_lines : %i lines without %i \
+values were skipped" % (np.sum(~good), ncols))
+        lines = [line for line, is_good in zip(lines, good) if is_good]
+
+    with warnings.catch_warnings():
+        # numpy complains (or stops) when a value is not a number, the
+        # recent versions raise a ValueError
+        warnings.simplefilter("ignore")
+        try:
+            values = np.fromstring(" ".join(lines), sep=' ')
+        except ValueError:
+            values = None
+
+    if values is not None and values.size == len(lines) * ncols:
+        data = values.reshape(len(lines), ncols)
+    else:
+        # one of the values couldn't be read, go through the lines one by one
+        # to find which ones
+        rows = []
+        for line in lines:
+            try:
+                rows.append([float(value) for value in line.split()])
+            except ValueError:
+                logging.warning("IOTool.parse_data_lines : line skipped, \
+'%s' contains a value which is not a number" % (line))
+        data = np.array(rows, dtype=float).reshape(len(rows), ncols)
+
+    if usecols is not None:
+        data = data[:, usecols]
+
+    return data, ncols
+
+
 def load_pset_file(fname, labels=None, splitchar=' '):
     """
         gets the channels ticks for a plot
@@ -0,0 +1,642 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 13 09:42:51 2026
+
+License: see LICENSE.txt file
+
+Writers for the data recorded by the DataTaker.
+
+The rows are not written one by one as they arrive, they are kept in memory
+and written by batches, either when there are batch_rows of them or when
+flush is called (LabGuiMain calls it on a timer), which is much cheaper than
+a write per sample.
+
+Three formats are available :
+    - text : the historical format, a header with the #C, #I and #P lines
+      followed by one line of space separated values per row
+    - npy : a float64 array in the numpy .npy format whose header is updated
+      as rows are appended, the header text and the #C, #I and #P
+      information go into a JSON sidecar file with the same name
+    - hdf5 : an appendable 'data' dataset, the header information is stored
+      in the attributes of the file (needs h5py)
+
+Files written in the binary formats are loaded back with load_output_file,
+the .npy files are memory-mapped.
+
+A BackgroundOutputWriter wraps any of these writers so that the file is
+written by a separate thread, fed through a bounded queue, and a slow disk
+or network share doesn't stall the GUI.
+"""
+
+import os
+import json
+import time
+import struct
+import logging
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import numpy as np
+
+try:
+    import h5py
+    h5py_available = True
+except ImportError:
+    h5py_available = False
+
+TEXT_FORMAT = "text"
+NPY_FORMAT = "npy"
+HDF5_FORMAT = "hdf5"
+
+DATA_FORMATS = [TEXT_FORMAT, NPY_FORMAT, HDF5_FORMAT]
+
+# number of rows kept in memory before they are written to the file
+DEFAULT_BATCH_ROWS = 100
+
+# time between two flushes of the output file by LabGuiMain, in ms
+FLUSH_INTERVAL = 1000
+
+# size of the header of the .npy files, large enough for any shape so it can
+# be rewritten in place when rows are appended
+NPY_HEADER_SIZE = 256
+
+# number of rows per chunk of the HDF5 dataset
+HDF5_CHUNK_ROWS = 1024
+
+# maximum number of rows waiting for the writer thread
+DEFAULT_QUEUE_SIZE = 10000
+
+# when the data is forced to the disk with os.fsync
+FSYNC_NEVER = "never"
+FSYNC_BATCH = "batch"
+FSYNC_CLOSE = "close"
+FSYNC_POLICIES = [FSYNC_NEVER, FSYNC_BATCH, FSYNC_CLOSE]
+
+# what happens to a new row when the queue of the writer thread is full
+BLOCK_WHEN_FULL = "block"
+DROP_WHEN_FULL = "drop"
+FULL_POLICIES = [BLOCK_WHEN_FULL, DROP_WHEN_FULL]
+
+
+def check_format(data_format):
+    """
+        returns the format which will actually be used for data_format, the
+        text format is used if data_format is unknown or not available
+    """
+    if data_format is None:
+        return TEXT_FORMAT
+
+    data_format = data_format.lower()
+
+    if data_format not in DATA_FORMATS:
+        logging.warning("The data format '%s' is unknown, the data will be \
+saved as text (the formats available are %s)" % (data_format,
+                                                  ", ".join(DATA_FORMATS)))
+        data_format = TEXT_FORMAT
+
+    elif data_format == HDF5_FORMAT and not h5py_available:
+        logging.warning("h5py is needed to save the data in the HDF5 format, \
+the data will be saved as text")
+        data_format = TEXT_FORMAT
+
+    return data_format
+
+
+def output_file_name(fname, data_format=TEXT_FORMAT):
+    """
+        the name of the file actually written for fname in data_format, the
+        extension is changed for the binary formats
+    """
+    if data_format == NPY_FORMAT:
+        return os.path.splitext(fname)[0] + ".npy"
+    elif data_format == HDF5_FORMAT:
+        return os.path.splitext(fname)[0] + ".h5"
+    else:
+        return fname
+
+
+def sidecar_file_name(fname):
+    """the name of the JSON file describing the data of a .npy file"""
+    return os.path.splitext(fname)[0] + ".json"
+
+
+def open_output_file(fname, data_format=TEXT_FORMAT,
+                     batch_rows=DEFAULT_BATCH_ROWS):
+    """
+        returns a writer for the data file fname (see output_file_name),
+        the file is created if it doesn't exist, otherwise the rows are
+        appended to it. The attribute is_new_file of the writer tells which
+        case it is, write_header should only be called for a new file.
+    """
+    data_format = check_format(data_format)
+
+    if data_format == NPY_FORMAT:
+        writer_class = NpyOutputWriter
+    elif data_format == HDF5_FORMAT:
+        writer_class = HDF5OutputWriter
+    else:
+        writer_class = TextOutputWriter
+
+    return writer_class(output_file_name(fname, data_format), batch_rows)
+
+
+def is_binary_file(fname):
+    """whether fname was written in one of the binary formats"""
+    return os.path.splitext(fname)[1].lower() in [".npy", ".h5"]
+
+
+def load_output_file(fname):
+    """
+        load a file written in one of the binary formats, the rows are
+        returned with the same label dict as IOTool.load_file_windows
+        (label['param'] and label['instr']).
+        The rows of a .npy file are memory-mapped : nothing is read before
+        it is needed, so a large file can be opened at once and only the
+        parts which are plotted are brought in memory.
+    """
+    if os.path.splitext(fname)[1].lower() == ".h5":
+        return load_hdf5_file(fname)
+    else:
+        return load_npy_file(fname)
+
+
+def load_npy_file(fname):
+    """load a .npy file memory-mapped, see load_output_file"""
+    data = np.load(fname, mmap_mode='r')
+
+    label = {}
+    try:
+        with open(sidecar_file_name(fname), 'r') as sidecar_file:
+            sidecar = json.load(sidecar_file)
+    except (IOError, ValueError):
+        logging.warning("No description of the data of %s was found in %s"
+                        % (fname, sidecar_file_name(fname)))
+    else:
+        label['param'] = [str(param) for param in sidecar["parameters"]]
+        label['instr'] = [str(desc) for desc in sidecar["instruments"]]
+
+    return data, label
+
+
+def load_hdf5_file(fname):
+    """
+        load a .h5 file, see load_output_file. The dataset is chunked so that
+        rows can be appended to it, which prevents memory-mapping it, it is
+        read in memory.
+    """
+    if not h5py_available:
+        raise IOError("h5py is needed to load the HDF5 file %s" % (fname))
+
+    label = {}
+    with h5py.File(fname, 'r') as input_file:
+        if "data" in input_file:
+            data = input_file["data"][...]
+        else:
+            data = np.array([])
+
+        attrs = input_file.attrs
+        if "parameters" in attrs:
+            label['param'] = [str(param) for param in
+                              json.loads(attrs["parameters"])]
+        if "instruments" in attrs:
+            label['instr'] = [str(desc) for desc in
+                              json.loads(attrs["instruments"])]
+
+    return data, label
+
+
+def format_row(data_set):
+    """
+        the text representation of a row (a float array or a list of
+        numbers), values separated by spaces with all their digits
+    """
+    return ' '.join([repr(value) for value in
+                     np.asarray(data_set, dtype=float).tolist()])
+
+
+class OutputWriter(object):
+    """
+        base class of the writers, the subclasses implement _write_rows and
+        _close, and write_header if they are not happy with the default
+    """
+
+    def __init__(self, fname, batch_rows=DEFAULT_BATCH_ROWS):
+        self.name = fname
+        self.batch_rows = batch_rows
+        self.is_new_file = not os.path.exists(fname)
+        self.closed = False
+        self.pending_rows = []
+
+    def write_header(self, header_text, labels, descriptors, params):
+        """
+            store the free text header and the channel labels, instrument
+            descriptors and parameters of a new file
+        """
+        pass
+
+    def write_row(self, row):
+        """
+            queue a row (a float array or a list of numbers), it is written
+            by batches. The row is kept as it is until then.
+        """
+        self.pending_rows.append(row)
+        if len(self.pending_rows) >= self.batch_rows:
+            self.flush()
+
+    def write_rows(self, rows):
+        """write rows (a list of rows) right away"""
+        self.pending_rows.extend(rows)
+        self.flush()
+
+    def flush(self):
+        """write the queued rows to the file"""
+        if self.pending_rows and not self.closed:
+            rows = self.pending_rows
+            self.pending_rows = []
+            self._write_rows(rows)
+
+    def sync(self):
+        """make sure what was written is actually on the disk"""
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self._close()
+            self.closed = True
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class TextOutputWriter(OutputWriter):
+    """the historical text format, one line per row"""
+
+    def __init__(self, fname, batch_rows=DEFAULT_BATCH_ROWS):
+        super(TextOutputWriter, self).__init__(fname, batch_rows)
+        if self.is_new_file:
+            self.output_file = open(fname, 'w')
+        else:
+            # open it in append mode, so it won't erase previous data
+            self.output_file = open(fname, 'a')
+
+    def write_header(self, header_text, labels, descriptors, params):
+        self.output_file.write(str(header_text))
+        self.output_file.write("#C" + str(labels).strip('[]') + '\n')
+        self.output_file.write("#I" + str(descriptors).strip('[]') + '\n')
+        self.output_file.write("#P" + str(params).strip('[]') + '\n')
+
+    def _write_rows(self, rows):
+        self.output_file.write(
+            "".join([format_row(row) + '\n' for row in rows]))
+        self.output_file.flush()
+
+    def sync(self):
+        os.fsync(self.output_file.fileno())
+
+    def _close(self):
+        self.output_file.close()
+
+
+class NpyOutputWriter(OutputWriter):
+    """
+        float64 rows appended to a .npy file, np.load (with mmap_mode) reads
+        it directly. The header is rewritten with the new number of rows
+        after each batch, so the file is valid between the batches.
+    """
+
+    def __init__(self, fname, batch_rows=DEFAULT_BATCH_ROWS):
+        super(NpyOutputWriter, self).__init__(fname, batch_rows)
+
+        if self.is_new_file:
+            self.output_file = open(fname, 'w+b')
+            self.header_size = NPY_HEADER_SIZE
+            self.nrows = 0
+            self.ncols = None
+        else:
+            self.output_file = open(fname, 'r+b')
+            np.lib.format.read_magic(self.output_file)
+            shape, fortran_order, dtype = \
+                np.lib.format.read_array_header_1_0(self.output_file)
+
+            if not (len(shape) == 2 and dtype == np.dtype('<f8') and
+                    not fortran_order):
+                self.output_file.close()
+                raise IOError("The file %s doesn't contain rows of float64 \
+values, no data can be appended to it" % (fname))
+
+            self.header_size = self.output_file.tell()
+            self.nrows, self.ncols = shape
+
+            # forget anything written after the last complete batch
+            self.output_file.seek(self.data_end())
+            self.output_file.truncate()
+
+        self.sidecar_name = sidecar_file_name(fname)
+
+    def data_end(self):
+        """position of the end of the rows in the file"""
+        return self.header_size + self.nrows * (self.ncols or 0) * 8
+
+    def header(self):
+        """the .npy header describing the rows written so far"""
+        if self.ncols is None:
+            shape = "(0, 0)"
+        else:
+            shape = "(%d, %d)" % (self.nrows, self.ncols)
+
+        description = "{'descr': '<f8', 'fortran_order': False, \
+'shape': %s, }" % (shape)
+
+        # the length of the header doesn't include the magic string, the
+        # version and the length itself
+        header_len = self.header_size - 10
+        return (b"\x93NUMPY\x01\x00" + struct.pack('<H', header_len) +
+                (description.ljust(header_len - 1) + "\n").encode('latin1'))
+
+    def write_header(self, header_text, labels, descriptors, params):
+        sidecar = {"data_file": os.path.basename(self.name),
+                   "format": NPY_FORMAT,
+                   "header": str(header_text),
+                   "labels": [str(label) for label in labels],
+                   "instruments": [str(desc) for desc in descriptors],
+                   "parameters": [str(param) for param in params]}
+
+        with open(self.sidecar_name, 'w') as sidecar_file:
+            json.dump(sidecar, sidecar_file, indent=4)
+
+        self._update_header()
+
+    def _update_header(self):
+        self.output_file.seek(0)
+        self.output_file.write(self.header())
+        self.output_file.seek(self.data_end())
+
+    def _write_rows(self, rows):
+        rows = [row for row in rows if len(row) > 0]
+        if not rows:
+            return
+
+        if self.ncols is None:
+            self.ncols = len(rows[0])
+
+        good_rows = [row for row in rows if len(row) == self.ncols]
+
+        if len(good_rows) < len(rows):
+            logging.error("NpyOutputWriter : %i rows didn't have %i columns, \
+they were not saved in %s" % (len(rows) - len(good_rows), self.ncols,
+                              self.name))
+
+        if good_rows:
+            data = np.array(good_rows, dtype='<f8')
+            self.output_file.seek(self.data_end())
+            self.output_file.write(data.tobytes())
+            self.nrows = self.nrows + len(good_rows)
+
+            self._update_header()
+            self.output_file.flush()
+
+    def sync(self):
+        os.fsync(self.output_file.fileno())
+
+    def _close(self):
+        self._update_header()
+        self.output_file.close()
+
+
+class HDF5OutputWriter(OutputWriter):
+    """
+        rows appended to the chunked 'data' dataset of a HDF5 file, the
+        header information goes in the attributes of the file
+    """
+
+    def __init__(self, fname, batch_rows=DEFAULT_BATCH_ROWS):
+        super(HDF5OutputWriter, self).__init__(fname, batch_rows)
+        self.output_file = h5py.File(fname, 'a')
+
+        if "data" in self.output_file:
+            self.dataset = self.output_file["data"]
+        else:
+            # it will be created with the first rows
+            self.dataset = None
+
+    def write_header(self, header_text, labels, descriptors, params):
+        attrs = self.output_file.attrs
+        attrs["header"] = str(header_text)
+        attrs["labels"] = json.dumps([str(label) for label in labels])
+        attrs["instruments"] = json.dumps([str(desc) for desc in descriptors])
+        attrs["parameters"] = json.dumps([str(param) for param in params])
+
+    def _write_rows(self, rows):
+        rows = [row for row in rows if len(row) > 0]
+        if not rows:
+            return
+
+        if self.dataset is None:
+            ncols = len(rows[0])
+            self.dataset = self.output_file.create_dataset(
+                "data", shape=(0, ncols), maxshape=(None, ncols),
+                chunks=(HDF5_CHUNK_ROWS, ncols), dtype='<f8')
+
+        ncols = self.dataset.shape[1]
+        good_rows = [row for row in rows if len(row) == ncols]
+
+        if len(good_rows) < len(rows):
+            logging.error("HDF5OutputWriter : %i rows didn't have %i columns, \
+they were not saved in %s" % (len(rows) - len(good_rows), ncols, self.name))
+
+        if good_rows:
+            nrows = self.dataset.shape[0]
+            self.dataset.resize(nrows + len(good_rows), axis=0)
+            self.dataset[nrows:] = np.array(good_rows, dtype='<f8')
+            self.output_file.flush()
+
+    def sync(self):
+        self.output_file.flush()
+
+    def _close(self):
+        self.output_file.close()
+
+
+class BackgroundOutputWriter(object):
+    """
+        give the rows to another writer from a separate thread.
+
+        write_row only puts the row in a bounded queue, the thread gathers
+        them by batches of batch_rows (or whatever arrived after
+        flush_interval seconds) and writes them. When the queue is full the
+        caller either waits for some room (full_policy BLOCK_WHEN_FULL) or
+        the row is dropped and counted (DROP_WHEN_FULL). With fsync_policy
+        the data can be forced to the disk after each batch (FSYNC_BATCH) or
+        only when the file is closed (FSYNC_CLOSE).
+
+        stats returns counters (queue depth, rows written and dropped, write
+        latency...) which can be displayed by the GUI.
+    """
+
+    def __init__(self, writer, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_rows=None, fsync_policy=FSYNC_NEVER,
+                 full_policy=BLOCK_WHEN_FULL,
+                 flush_interval=FLUSH_INTERVAL / 1000.0):
+
+        if fsync_policy not in FSYNC_POLICIES:
+            logging.warning("BackgroundOutputWriter : unknown fsync policy \
+'%s', it should be one of %s" % (fsync_policy, ", ".join(FSYNC_POLICIES)))
+            fsync_policy = FSYNC_NEVER
+
+        if full_policy not in FULL_POLICIES:
+            logging.warning("BackgroundOutputWriter : unknown policy '%s' \
+for a full queue, it should be one of %s" % (full_policy,
+                                             ", ".join(FULL_POLICIES)))
+            full_policy = BLOCK_WHEN_FULL
+
+        self.writer = writer
+        self.name = writer.name
+        self.is_new_file = writer.is_new_file
+        self.closed = False
+
+        if batch_rows is None:
+            batch_rows = writer.batch_rows
+        self.batch_rows = batch_rows
+        self.fsync_policy = fsync_policy
+        self.full_policy = full_policy
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        # counters, only updated by the writer thread except rows_dropped
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.write_errors = 0
+        self.num_writes = 0
+        self.total_latency = 0
+        self.last_latency = 0
+        self.max_latency = 0
+
+        self.thread = threading.Thread(target=self.run,
+                                       name="OutputWriter " + self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write_header(self, header_text, labels, descriptors, params):
+        self.queue.put(("header", (header_text, labels, descriptors, params)))
+
+    def write_row(self, row):
+        if self.full_policy == DROP_WHEN_FULL:
+            try:
+                self.queue.put_nowait(("row", row))
+            except queue.Full:
+                self.rows_dropped = self.rows_dropped + 1
+        else:
+            self.queue.put(("row", row))
+
+    def write_rows(self, rows):
+        """queue a block of rows (a 2D array or a list of rows) at once"""
+        if self.full_policy == DROP_WHEN_FULL:
+            try:
+                self.queue.put_nowait(("rows", rows))
+            except queue.Full:
+                self.rows_dropped = self.rows_dropped + len(rows)
+        else:
+            self.queue.put(("rows", rows))
+
+    def flush(self):
+        """ask the thread to write the rows it holds without waiting"""
+        try:
+            self.queue.put_nowait(("flush", None))
+        except queue.Full:
+            # the thread has more than enough to write anyway
+            pass
+
+    def close(self):
+        """write everything left and close the file, waits for the thread"""
+        if not self.closed:
+            self.closed = True
+            self.queue.put(("close", None))
+            self.thread.join()
+
+    def stats(self):
+        """a snapshot of the counters of the writer, latencies in seconds"""
+        if self.num_writes > 0:
+            mean_latency = self.total_latency / self.num_writes
+        else:
+            mean_latency = 0
+
+        return {"queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "rows_written": self.rows_written,
+                "rows_dropped": self.rows_dropped,
+                "write_errors": self.write_errors,
+                "last_latency": self.last_latency,
+                "mean_latency": mean_latency,
+                "max_latency": self.max_latency}
+
+    def run(self):
+        """loop of the writer thread"""
+        rows = []
+
+        while True:
+            try:
+                kind, payload = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                kind, payload = "flush", None
+
+            if kind == "row":
+                rows.append(payload)
+                if len(rows) < self.batch_rows:
+                    continue
+            elif kind == "rows":
+                rows.extend(payload)
+                if len(rows) < self.batch_rows:
+                    continue
+
+            # anything but a row makes the rows gathered so far be written
+            if rows:
+                self._write(rows)
+                rows = []
+
+            if kind == "header":
+                try:
+                    self.writer.write_header(*payload)
+                except Exception as e:
+                    self.write_errors = self.write_errors + 1
+                    logging.error("BackgroundOutputWriter : could not write \
+the header of %s : %s" % (self.name, e))
+
+            elif kind == "close":
+                try:
+                    if not self.fsync_policy == FSYNC_NEVER:
+                        self.writer.sync()
+                    self.writer.close()
+                except Exception as e:
+                    self.write_errors = self.write_errors + 1
+                    logging.error("BackgroundOutputWriter : could not close \
+%s : %s" % (self.name, e))
+                break
+
+    def _write(self, rows):
+        start = time.time()
+
+        try:
+            self.writer.write_rows(rows)
+            if self.fsync_policy == FSYNC_BATCH:
+                self.writer.sync()
+        except Exception as e:
+            self.write_errors = self.write_errors + 1
+            logging.error("BackgroundOutputWriter : %i rows could not be \
+written to %s : %s" % (len(rows), self.name, e))
+        else:
+            self.rows_written = self.rows_written + len(rows)
+
+        latency = time.time() - start
+        self.num_writes = self.num_writes + 1
+        self.total_latency = self.total_latency + latency
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
@@ -1 +1 @@
-__all__ = ['IOTool']
+__all__ = ['IOTool', 'OutputFormats']
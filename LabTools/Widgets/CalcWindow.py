@@ -153,6 +153,8 @@ class CalcWindow(QtGui.QWidget):
         le = QtGui.QLineEdit(self)
         le.setObjectName("param_name_le_list " + str(index))
         self.connect(le, SIGNAL("textEdited(QString)"), self.lineEdit_handler)
+        self.connect(le, SIGNAL("editingFinished()"),
+                     self.editing_finished_handler)
         # add the newly created widget to the list and tothe layout
         le_list.append(le)
         self.grid.addWidget(le, index + 1, col, 1, 1)
@@ -175,6 +177,10 @@ class CalcWindow(QtGui.QWidget):
         # here I would delete this line
         # pass
 
+    def editing_finished_handler(self):
+        """the calculations are compiled again once the user is done typing"""
+        self.emit(SIGNAL("calculationsChanged()"))
+
     def color_btn_handler(self):
         btn = self.sender()
         idx = self.color_btn_list.index(btn)
@@ -201,6 +207,9 @@ class CalcWindow(QtGui.QWidget):
         else:
             return [str(le.text()) for le in self.var_name_le_list]
 
+    def get_name_list(self):
+        return [str(le.text()) for le in self.var_name_le_list]
+
     def get_calculation_list(self):
         return [str(le.text()) for le in self.calculation_le_list]
 
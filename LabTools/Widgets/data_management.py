@@ -10,8 +10,47 @@ from PyQt4.QtCore import SIGNAL, QObject, Qt, QMutex, QThread
 
 import py_compile
 
+import numpy as np
+
 from LabTools.IO import IOTool
+from LabTools import DataStructure
 import time
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    # needs python 3.5, SyntaxError is raised when python 2 reads it
+    from LabDrivers import transport
+    transport_available = True
+except (ImportError, SyntaxError):
+    transport_available = False
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # python 2 has no monotonic clock
+    monotonic = time.time
+
+# longest sleep while waiting for the next sample of a PeriodicSchedule, it
+# sets how quickly a stop is taken into account
+SCHEDULE_SLEEP_STEP = 0.1
+
+# how the channels which were not read for a row are filled by a
+# MultiRateSampler
+FILL_LAST = "last"
+FILL_NAN = "nan"
+
+# a channel with a polling interval is read when at least this fraction of
+# its interval passed, so that the jitter of the rows doesn't make it miss
+# its turn
+POLL_TOLERANCE = 0.9
 
 
 class DataTaker(QThread):
@@ -38,6 +77,22 @@ class DataTaker(QThread):
 
         self.script_file_name = ''
         self.t_start = None
+        # queries the instruments of the different buses concurrently
+        if IOTool.get_async_polling_setting():
+            if transport_available:
+                self.bus_poller = transport.AsyncPoller()
+            else:
+                logging.warning("The asyncio transports need python 3.5 or \
+later, the instruments are read by a thread per bus")
+                self.bus_poller = BusPoller()
+        else:
+            self.bus_poller = BusPoller()
+        # the PeriodicSchedule of the script, if it uses one
+        self.schedule = None
+        # reads the slow channels less often than the others
+        self.sampler = MultiRateSampler()
+        # gives the rows filled by read_data
+        self.row_allocator = None
         # initialize the intruments and their parameters
         self.reset_lists()
 
@@ -62,11 +117,15 @@ class DataTaker(QThread):
        # print("\tChange instruments in datataker...")
         self.instruments = self.instr_hub.get_instrument_list()
         self.port_param_pairs = self.instr_hub.get_port_param_pairs()
+        # the buses may have changed with the instruments
+        self.bus_poller.stop()
+        self.sampler.reset()
         #print("\t...instruments updated in datataker")
 
     def run(self):
         print("DTT begin run")
         self.stopped = False
+        self.schedule = None
         # open another file which contains the script to follow for this
         # particular measurement
 #        try:
@@ -88,6 +147,8 @@ class DataTaker(QThread):
 #            print ("+"*10)+"ERROR"+("+"*10)
 #            print
 
+        self.bus_poller.stop()
+
         self.completed = True
         self.emit(SIGNAL("script_finished(bool)"), self.completed)
         self.stopped = True
@@ -120,13 +181,97 @@ class DataTaker(QThread):
         return self.stopped
 
     def check_stopped_or_paused(self):
+        waited = False
         while True:
             if (not self.paused) or self.stopped:
+                if waited and self.schedule is not None:
+                    # the samples missed during the pause are not overruns
+                    self.schedule.resync()
                 return self.stopped
+            waited = True
             time.sleep(0.1)
 
-    def read_spectrum(self, port):
-        spectrum_data = self.instruments[port].aquire_spectrum
+    def start_schedule(self, period, align=False):
+        """
+            make wait_next_sample pace the script at a fixed rate, one sample
+            every period seconds on a monotonic clock (see PeriodicSchedule)
+        """
+        self.schedule = PeriodicSchedule(period, align, self.isStopped)
+        return self.schedule
+
+    def wait_next_sample(self):
+        """
+            wait until the time of the next sample of the schedule started
+            with start_schedule, returns False if the DataTaker was stopped
+            in the meantime
+        """
+        return self.schedule.wait()
+
+    def set_poll_interval(self, index, interval, fill=None):
+        """
+            read the channel number index of the rows (its place in
+            port_param_pairs) only every interval seconds instead of at each
+            read_data, None to read it every time. fill is FILL_LAST or
+            FILL_NAN, see MultiRateSampler.
+        """
+        self.sampler.set_interval(index, interval)
+        if fill is not None:
+            self.sampler.fill = fill
+
+    def read_burst(self, port, channels, num_points, rate):
+        """
+            acquire num_points values of the channels of the instrument on
+            port at rate points per second in its internal buffer and read
+            them back in one transfer (see MeasInstr.start_burst). The block
+            is emitted with the signal data_block as an array of rows with
+            the columns of read_data. Returns False if the DataTaker was
+            stopped during the acquisition.
+        """
+        inst = self.instruments[port]
+        t_start = time.time()
+        end = monotonic() + inst.start_burst(channels, num_points, rate)
+
+        while monotonic() < end:
+            if self.isStopped():
+                return False
+            time.sleep(max(0, min(SCHEDULE_SLEEP_STEP, end - monotonic())))
+
+        times, block = inst.fetch_burst()
+        self.emit(SIGNAL("data_block(PyQt_PyObject)"),
+                  self.burst_rows(port, channels, t_start + times, block))
+        return True
+
+    def burst_rows(self, port, channels, times, block):
+        """
+            rows of a block acquired by read_burst : the TIME columns get the
+            times of the points, the other channels are filled like the ones
+            of a MultiRateSampler, with their last value or NaN
+        """
+        rows = np.empty((len(times), len(self.port_param_pairs)))
+        for index, (pair_port, param) in enumerate(self.port_param_pairs):
+            inst = self.instruments[pair_port]
+            if inst == '' or inst is None:
+                rows[:, index] = np.nan
+            elif pair_port == port and param in channels:
+                rows[:, index] = block[:, list(channels).index(param)]
+            elif inst.ID_name == 'TIME':
+                if param == 'dt':
+                    rows[:, index] = times - inst.t_start
+                else:
+                    rows[:, index] = times
+            elif self.sampler.fill == FILL_NAN:
+                rows[:, index] = np.nan
+            else:
+                rows[:, index] = inst.last_measure.get(param, np.nan)
+        return rows
+
+    def read_spectrum(self, port, channels=('CH1',)):
+        """
+            acquire the spectra of the channels of the instrument on port
+            (see GDS820C.acquire_spectra) and emit their list with the
+            signal spectrum_data
+        """
+        spectrum_data = self.instruments[port].acquire_spectra(channels)
         self.emit(SIGNAL("spectrum_data(PyQt_PyObject)"), spectrum_data)
 
     def read_data(self):
@@ -135,27 +280,337 @@ class DataTaker(QThread):
             It collect the different values of corresponding parameters and
             emit a signal which will be catch by other instance for further
             treatment.
+            The instruments on different buses are measured at the same time
+            (see BusPoller) and the parameters of an instrument are read
+            together with its measure_many method, the values are still in
+            the order of port_param_pairs.
         """
-#        param_set = []
-        data_set = []
+        if self.sampler.intervals:
+            due = self.sampler.due(len(self.port_param_pairs))
+        else:
+            due = None
 
-        for port, param in self.port_param_pairs:
-            inst = self.instruments[port]
+        data_set = self.bus_poller.read(self.instruments,
+                                        self.port_param_pairs, due)
 
-            if inst != '' and inst != None:
-                #            if inst !='TIME' and inst!='' and inst!= None:
-                data_set.append(inst.measure(param))
-#                param_set.append(inst.channels_names[param])
-#            elif inst =='TIME':
-#                data_set.append(round(t_meas,2))
-#                param_set.append('TIME')
+        # the values are written in place in a preallocated float row
+        row = DataStructure.to_float_row(data_set, self.new_row())
+
+        if due is not None:
+            self.sampler.fill_row(row, due)
+            # tells which values of the row were actually measured
+            self.emit(SIGNAL("data_freshness(PyQt_PyObject)"), due)
+
+        if self.schedule is not None and self.schedule.last_sample:
+            self.emit(SIGNAL("sample_timing(PyQt_PyObject)"),
+                      dict(self.schedule.last_sample))
+
+        # send data back to the mother ship as a read-only array of floats,
+        # every consumer shares the same row
+        self.emit(SIGNAL("data(PyQt_PyObject)"), DataStructure.read_only(row))
+
+    def new_row(self):
+        """an unused float row for read_data, from preallocated blocks"""
+        ncols = len(self.port_param_pairs)
+        if self.row_allocator is None or not self.row_allocator.ncols == ncols:
+            self.row_allocator = DataStructure.RowAllocator(ncols)
+        return self.row_allocator.new_row()
+
+
+class PeriodicSchedule(object):
+    """
+        times of the samples of a script taken at a fixed rate : the n-th
+        sample is due at a fixed time after the first one on a monotonic
+        clock, so the period doesn't drift with the time the measures take.
+        With align the samples fall on multiples of the period of the wall
+        clock (every round minute for a period of 60 s for example), so the
+        data of different setups can be compared.
+
+        The timing of each sample is kept in last_sample : timestamp is the
+        wall clock time when the sample was taken, jitter how late it was
+        taken (in s) and missed the number of samples skipped just before it.
+        A sample taken more than a period late is an overrun, the samples
+        whose time passed are skipped and a warning is logged instead of
+        letting the rate slow down.
+    """
+
+    def __init__(self, period, align=False, is_stopped=None):
+        if period <= 0:
+            raise ValueError("The period of a PeriodicSchedule should be \
+positive, not %s" % (period))
+
+        self.period = float(period)
+        self.align = align
+        # function telling when to stop waiting
+        self.is_stopped = is_stopped
+
+        self.samples = 0
+        self.overruns = 0
+        self.missed = 0
+        self.max_jitter = 0
+        self.total_jitter = 0
+        self.last_sample = None
+
+        now = monotonic()
+        if align:
+            wall_time = time.time()
+            wait = -wall_time % self.period
+            self.start = now + wait
+        else:
+            self.start = now
+        self.tick = 0
+
+    def deadline(self, tick=None):
+        """the time on the monotonic clock of the sample number tick"""
+        if tick is None:
+            tick = self.tick
+        return self.start + tick * self.period
+
+    def wait(self):
+        """
+            sleep until the time of the next sample, returns False if
+            is_stopped became true in the meantime, True otherwise
+        """
+        while True:
+            remaining = self.deadline() - monotonic()
+            if remaining <= 0:
+                break
+            if self.is_stopped is not None and self.is_stopped():
+                return False
+            time.sleep(min(remaining, SCHEDULE_SLEEP_STEP))
+
+        now = monotonic()
+        timestamp = time.time()
+
+        missed = int((now - self.deadline()) // self.period)
+        if missed > 0:
+            self.overruns = self.overruns + 1
+            self.missed = self.missed + missed
+            logging.warning("PeriodicSchedule : overrun, the sample is %.3f s \
+late, %i sample(s) skipped to keep the period of %s s" % (
+                now - self.deadline(), missed, self.period))
+            self.tick = self.tick + missed
+
+        jitter = now - self.deadline()
+        self.samples = self.samples + 1
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.total_jitter = self.total_jitter + jitter
+        self.last_sample = {"sample": self.tick, "timestamp": timestamp,
+                            "jitter": jitter, "missed": missed}
+
+        self.tick = self.tick + 1
+        return True
+
+    def resync(self):
+        """skip the samples whose time passed, without counting overruns"""
+        late = monotonic() - self.deadline()
+        if late > 0:
+            self.tick = self.tick + int(late // self.period) + 1
+
+    def stats(self):
+        """summary of the timing of the samples taken so far"""
+        if self.samples > 0:
+            mean_jitter = self.total_jitter / self.samples
+        else:
+            mean_jitter = 0
+        return {"samples": self.samples, "overruns": self.overruns,
+                "missed": self.missed, "max_jitter": self.max_jitter,
+                "mean_jitter": mean_jitter}
+
+
+class MultiRateSampler(object):
+    """
+        lets the channels of the rows be polled at different rates : a
+        channel with an interval is only measured when the interval passed
+        since it was last measured, the rows still come at the rate of
+        read_data and the channel is filled in the rows in between with its
+        last value (fill = FILL_LAST) or with NaN (fill = FILL_NAN).
+        The channels are identified by their index in the rows.
+    """
+
+    def __init__(self, fill=FILL_LAST):
+        self.fill = fill
+        # polling interval of the channels which have one, in s
+        self.intervals = {}
+        self.reset()
+
+    def reset(self):
+        """forget when the channels were measured and their values"""
+        self.last_times = {}
+        self.last_values = {}
+
+    def set_interval(self, index, interval):
+        if interval is None or interval <= 0:
+            self.intervals.pop(index, None)
+        else:
+            self.intervals[index] = float(interval)
+        self.last_times.pop(index, None)
+
+    def due(self, num_channels, now=None):
+        """list telling which of the num_channels channels to measure now"""
+        if now is None:
+            now = monotonic()
+
+        due = []
+        for index in range(num_channels):
+            if index in self.intervals and index in self.last_times:
+                elapsed = now - self.last_times[index]
+                due.append(elapsed >= POLL_TOLERANCE * self.intervals[index])
+            else:
+                due.append(True)
+
+        for index, is_due in enumerate(due):
+            if is_due and index in self.intervals:
+                self.last_times[index] = now
+        return due
+
+    def fill_row(self, row, due):
+        """fill the values of the row which were not measured, in place"""
+        for index, is_due in enumerate(due):
+            if is_due:
+                self.last_values[index] = row[index]
+            elif self.fill == FILL_NAN:
+                row[index] = float('nan')
             else:
-                data_set.append(0)
-#                param_set.append('')
+                row[index] = self.last_values.get(index, float('nan'))
+        return row
 
-        # send data back to the mother ship as an array of floats, but only
-#        self.emit(SIGNAL("data(PyQt_PyObject)"), np.array(data_set))
-        self.emit(SIGNAL("data(PyQt_PyObject)"), data_set)
+
+class BusPoller(object):
+    """
+        measures the instruments of a row, the ones on different buses (see
+        MeasInstr.bus_id) are queried concurrently, each bus by its own
+        worker thread, so a row takes the time of the slowest bus instead of
+        the sum of the time of every instrument. The instruments sharing a
+        bus are still queried one after the other, in the order of the row.
+    """
+
+    def __init__(self):
+        self.workers = {}
+
+    def read(self, instruments, port_param_pairs, due=None):
+        """
+            returns the values of port_param_pairs, 0 where there is no
+            instrument. If due is given only the pairs for which it is True
+            are measured, the others are left to None.
+        """
+        data_set = [0] * len(port_param_pairs)
+
+        # the measures are grouped by bus, the ones without a bus are done
+        # directly
+        buses = OrderedDict()
+        direct = []
+        for i, (port, param) in enumerate(port_param_pairs):
+            if due is not None and not due[i]:
+                data_set[i] = None
+                continue
+
+            inst = instruments[port]
+
+            if inst != '' and inst != None:
+                bus = inst.bus_id()
+                if bus is None:
+                    direct.append((i, inst, param))
+                else:
+                    buses.setdefault(bus, []).append((i, inst, param))
+
+        if len(buses) < 2:
+            # nothing to gain from the threads, measure in the row order
+            measures = sorted(direct + sum(list(buses.values()), []),
+                              key=lambda measure: measure[0])
+            for i, value in measure_by_instrument(measures):
+                data_set[i] = value
+            return data_set
+
+        replies = queue.Queue()
+        for bus, measures in list(buses.items()):
+            self.worker(bus).jobs.put((measures, replies))
+
+        # the instruments without bus (TIME...) are measured while the
+        # others are being queried
+        for i, value in measure_by_instrument(direct):
+            data_set[i] = value
+
+        error = None
+        for bus in buses:
+            values, bus_error = replies.get()
+            for i, value in values:
+                data_set[i] = value
+            if bus_error is not None and error is None:
+                error = bus_error
+
+        if error is not None:
+            raise error
+
+        return data_set
+
+    def worker(self, bus):
+        """the worker thread of bus, it is started if needed"""
+        if bus not in self.workers:
+            worker = BusWorker(bus)
+            worker.start()
+            self.workers[bus] = worker
+        return self.workers[bus]
+
+    def stop(self):
+        """stop the worker threads, they will be started again if needed"""
+        for worker in list(self.workers.values()):
+            worker.jobs.put(None)
+        self.workers = {}
+
+
+class BusWorker(threading.Thread):
+    """
+        thread which measures the instruments of one bus for a BusPoller, a
+        job is a list of (index, instrument, parameter) and the queue in
+        which the list of (index, value) and the error, if any, are put
+    """
+
+    def __init__(self, bus):
+        super(BusWorker, self).__init__(name="BusWorker %s" % (bus))
+        self.daemon = True
+        self.bus = bus
+        self.jobs = queue.Queue()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            measures, replies = job
+            values = []
+            error = None
+            try:
+                measure_by_instrument(measures, values)
+            except Exception as e:
+                logging.error("BusWorker : measure failed on the bus %s\n%s"
+                              % (self.bus, traceback.format_exc()))
+                error = e
+            replies.put((values, error))
+
+
+def measure_by_instrument(measures, values=None):
+    """
+        measures is a list of (index, instrument, parameter), all the
+        parameters of an instrument are given to a single call of its
+        measure_many method so that it can read them in one transaction.
+        The (index, value) pairs are appended to values, which is returned.
+    """
+    if values is None:
+        values = []
+
+    instruments = OrderedDict()
+    for i, inst, param in measures:
+        instruments.setdefault(id(inst), (inst, []))[1].append((i, param))
+
+    for inst, params in list(instruments.values()):
+        # the bus is held for all the parameters of the instrument
+        with inst.transaction():
+            answers = inst.measure_many([param for i, param in params])
+        values.extend(zip([i for i, param in params], answers))
+
+    return values
 
 
 class DataDisplayer(QObject):
@@ -163,6 +618,8 @@ class DataDisplayer(QObject):
     def __init__(self, datataker, debug=False, parent=None):
         super(DataDisplayer, self).__init__(parent)
         self.debug = debug
+        # the last row emitted by the datataker, a read-only float array
+        self.last_row = None
 #        self.lock = lock
         self.connect(datataker, SIGNAL("data(PyQt_PyObject)"),
                      self.displayer, Qt.QueuedConnection)
@@ -172,55 +629,32 @@ class DataDisplayer(QObject):
         # can do different things depending on the window type which is active
 
         if not self.debug:
-
-            stri = str(data).strip('[]\n\r')
-            # numpy arrays include newlines in their strings, get rid of them.
-            stri = stri.replace(', ', ' ')
-            # print exactly the string which is going to be written in the file
-            # print '>>' + stri
+            # the row is shared with the other consumers, it is only kept
+            # and turned into text when somebody asks for it
+            self.last_row = data
 
         else:
             print("displayer triggered")
 
 
 class DataWriter(QObject):
+    """
+        writes the rows emitted by the datataker to output_file (one of the
+        writers of OutputFormats), the rows are queued as they are
+    """
 
-    def __init__(self, datataker, debug=False, parent=None):
+    def __init__(self, datataker, output_file=None, debug=False, parent=None):
         super(DataWriter, self).__init__(parent)
         self.debug = debug
+        self.output_file = output_file
         self.connect(datataker, SIGNAL("data(PyQt_PyObject)"),
                      self.writer, Qt.QueuedConnection)
 
     def writer(self, data):
 
-        #       print self.output_file_name
-        #        self.out_file = open(self.output_file_name, 'a')
-        #        self.log_file = open(self.output_file_name.rstrip('.dat') + ".log", 'a')
-        #         self.log_file.write("%s %s %s\n\n"%(instr_type.center(w), dev.center(w), param.center(w)))
-        #        self.log_file.write('Starting time: ' + str(self.t_start) + ' = ' + time.ctime() +'\n\n')
-        #
-        #        # print list of names to the terminal and to the file as headers
-        #        stri = str(type_list).strip('[]')
-        # print stri
-        #        #print self.out_file.name
-        #        self.out_file.write(stri + '\n')
-        #
-        #
-        #        w = 15
-        #        self.log_file.write("Instrument Configuration:\n\n")
-        #        self.log_file.write("%s %s %s %s\n\n"%("Name".center(w),
-        #                                               "Type".center(w), "Device".center(w), "Param".center(w)))
-
-        #                self.out_file.close()
-        #        self.log_file.close()
-
         if not self.debug:
-
-            stri = str(data).strip('[]\n\r')
-            # numpy arrays include newlines in their strings, get rid of them.
-#            stri = stri.replace(' ', '\t')
-            # print exactly the string which is going to be written in the file
-            print('>>>>' + stri)
+            if self.output_file is not None and not self.output_file.closed:
+                self.output_file.write_row(data)
 
         else:
             print("writer triggered")
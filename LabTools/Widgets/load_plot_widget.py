@@ -57,7 +57,8 @@ class LoadPlotWidget(QWidget):
             "textChanged(const QString &)"), self.text_changed)
 
     def on_loadFileButton_clicked(self):
-        fname = str(QFileDialog.getOpenFileName(self, 'Load data from', './'))
+        fname = str(QFileDialog.getOpenFileName(self, 'Load data from', './',
+            "Data files (*.dat *.adat *.adat2 *.a5dat *.npy *.h5);;All files (*)"))
         self.text_changed()
         if fname:
             self.loadFileLineEdit.setText(fname)
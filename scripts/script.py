@@ -26,12 +26,34 @@ the namespace of DataTakerThread.
 
 print("INIT DONE")
 #print self.instruments
+
+#take a sample every 2 seconds, use align=True to have the samples on even
+#seconds of the clock
+self.start_schedule(2)
+
+#the slow channels can be read less often, for example the third channel of
+#the rows every 60 s, in between the rows repeat its last value
+#self.set_poll_interval(2, 60)
+
+#the instruments with a buffer can take a block of points at a high rate, for
+#example 1024 points of X and Y at 512 Hz from the lock-in on GPIB0::8
+#self.read_burst('GPIB0::8', ['X', 'Y'], 1024, 512)
+
+#the magnet and the temperature controllers ramp by themselves, the rows are
+#still taken while the ramp goes on, for example
+#field_ramp = self.instruments['GPIB0::25'].start_ramp(1.0)
+#while not field_ramp.done() and self.wait_next_sample():
+#    self.read_data()
+
 while self.isStopped() == False:
-    
+
+    #wait for the time of the next sample, the period doesn't depend on the
+    #time taken by the measures
+    if not self.wait_next_sample():
+        break
 
     #This initiates the measure sequence in datatakerthread
     self.read_data()
-    time.sleep(2)
     self.check_stopped_or_paused()
     
     #The following is tha basic alarm sequence, uncomment this block to activate it
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the calculations of the calculation window, run from the top of the
+tree with python -m unittest discover tests
+"""
+
+import unittest
+
+import numpy as np
+
+from LabTools.Calculations import CompiledCalculations
+
+try:
+    from LabTools.DataStructure import DataArrayBuffer
+except SyntaxError:
+    # DataStructure is still python 2 only
+    DataArrayBuffer = None
+
+
+LABELS = ['time', 'T', 'R']
+
+ROWS = np.array([[0., 1.5, 10.],
+                 [1., -2., 20.],
+                 [2., 3., 30.],
+                 [3., -4., 40.]])
+
+
+class TestBlockEvaluation(unittest.TestCase):
+
+    def assert_rows(self, expressions, expected, names=None):
+        """the calculated columns of the block and of each single row"""
+        calculations = CompiledCalculations(expressions, names, LABELS)
+        block = calculations(ROWS)
+        np.testing.assert_allclose(block[:, len(LABELS):], expected)
+        for row, expected_row in zip(ROWS, expected):
+            np.testing.assert_allclose(
+                calculations(row)[len(LABELS):], expected_row)
+
+    def test_columns(self):
+        self.assert_rows(['R / 10', 'data[1] * 2', 'sqrt(abs(T))'],
+                         np.array([ROWS[:, 2] / 10, ROWS[:, 1] * 2,
+                                   np.sqrt(np.abs(ROWS[:, 1]))]).T)
+
+    def test_names_of_calculations(self):
+        self.assert_rows(['R * 2', 'double + 1'],
+                         np.array([ROWS[:, 2] * 2, ROWS[:, 2] * 2 + 1]).T,
+                         names=['double', ''])
+
+    def test_conditions(self):
+        self.assert_rows(['R if T > 0 else -R', 'T > 0 and R < 35'],
+                         np.array([[10., 1.], [-20., 0.], [30., 1.],
+                                   [-40., 0.]]))
+
+    def test_builtins(self):
+        self.assert_rows(['max(T, 0)', 'min(T, 0)', 'round(T)',
+                          'float(R) / 3', 'int(T)'],
+                         np.array([[1.5, 0., 2., 10. / 3, 1.],
+                                   [0., -2., -2., 20. / 3, -2.],
+                                   [3., 0., 3., 10., 3.],
+                                   [0., -4., -4., 40. / 3, -4.]]))
+
+    def test_reductions(self):
+        self.assert_rows(['np.max(data[1:3])', 'np.mean(T)', 'pi'],
+                         np.array([ROWS[:, 2], ROWS[:, 1],
+                                   np.pi * np.ones(len(ROWS))]).T)
+
+    def test_failures(self):
+        calculations = CompiledCalculations(
+            ['unknown + 1', 'R / (time - 1) if T > 0 else data[9]', 'R'],
+            None, LABELS)
+        block = calculations(ROWS)
+        self.assertTrue(np.all(np.isnan(block[:, 3])))
+        np.testing.assert_allclose(block[:, 4],
+                                   [-10., np.nan, 30., np.nan])
+        np.testing.assert_allclose(block[:, 5], ROWS[:, 2])
+
+
+@unittest.skipIf(DataArrayBuffer is None, "LabTools.DataStructure is python 2")
+class TestHistoryRecompute(unittest.TestCase):
+    """the way LabGui computes the rows in memory again"""
+
+    def test_recompute(self):
+        calculations = CompiledCalculations(['R * 2'], None, LABELS)
+        buffer = DataArrayBuffer()
+        for data_set in ROWS:
+            row = buffer.new_row(len(LABELS) + len(calculations))
+            calculations.evaluate(data_set, out=row)
+            buffer.commit_row()
+        np.testing.assert_allclose(buffer.data[:, 3], ROWS[:, 2] * 2)
+
+        calculations = CompiledCalculations(
+            ['R if T > 0 else 0', 'max(T, 0)'], None, LABELS)
+        rows = calculations(buffer.data[:, :len(LABELS)])
+        buffer.clear()
+        buffer.extend(rows)
+
+        np.testing.assert_allclose(buffer.data[:, :len(LABELS)], ROWS)
+        np.testing.assert_allclose(buffer.data[:, 3], [10., 0., 30., 0.])
+        np.testing.assert_allclose(buffer.data[:, 4], [1.5, 0., 3., 0.])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the thermometer calibrations, run from the top of the tree with
+python -m unittest discover tests
+"""
+
+import unittest
+
+import numpy as np
+
+from LabTools.Fitting.Calibration import OUT_OF_RANGE_T, RX_102A, RX_202A
+
+
+class TestRanges(unittest.TestCase):
+
+    def test_boundaries(self):
+        # a range includes its R_min and excludes its R_max, except the last
+        # one, like the old converters
+        for calibration in [RX_102A, RX_202A]:
+            num_ranges = len(calibration.r_max)
+            np.testing.assert_array_equal(
+                calibration.range_index(calibration.r_min),
+                np.arange(num_ranges))
+            np.testing.assert_array_equal(
+                calibration.range_index(calibration.r_max),
+                list(range(1, num_ranges)) + [num_ranges - 1])
+
+    def test_rx_202a(self):
+        # values of the old converter_RX_202A
+        R = [2843.53, 5166.86, 69191.1, 69191.2, 2243.14]
+        T = RX_202A.R_to_T(R, OUT_OF_RANGE_T)
+        self.assertTrue(T[2] > 0.05 and T[2] < 0.0500023)
+        self.assertEqual(list(T[3:]), [OUT_OF_RANGE_T, OUT_OF_RANGE_T])
+        # the upper range is used at the boundary
+        self.assertAlmostEqual(T[0], RX_202A.R_to_T(np.nextafter(2843.53,
+                                                                  np.inf)))
+
+    def test_scalar(self):
+        self.assertTrue(np.isnan(RX_102A.R_to_T(10.)))
+        self.assertTrue(isinstance(RX_102A.R_to_T(2000.), float))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the DataArrayBuffer which holds the rows of a run, run from the top
+of the tree with python -m unittest discover tests
+"""
+
+import unittest
+
+import numpy as np
+
+try:
+    from LabTools.DataStructure import DataArrayBuffer, count_new_rows
+except SyntaxError:
+    # DataStructure is still python 2 only
+    DataArrayBuffer = None
+
+
+def fill(buffer, rows):
+    """write the rows in place, the way LabGui does"""
+    for values in rows:
+        row = buffer.new_row(len(values))
+        row[:] = values
+        buffer.commit_row()
+
+
+@unittest.skipIf(DataArrayBuffer is None, "LabTools.DataStructure is python 2")
+class TestUnbounded(unittest.TestCase):
+
+    def test_grow(self):
+        buffer = DataArrayBuffer(chunk_rows=4)
+        rows = np.arange(30.).reshape(10, 3)
+        fill(buffer, rows)
+        self.assertEqual(len(buffer), 10)
+        np.testing.assert_array_equal(buffer.data, rows)
+        np.testing.assert_array_equal(buffer.last_row, rows[-1])
+        self.assertTrue(buffer.stable_rows)
+        self.assertFalse(buffer.data.flags.writeable)
+
+    def test_views_stay_valid(self):
+        buffer = DataArrayBuffer(chunk_rows=2)
+        fill(buffer, [[1., 2.]])
+        view = buffer.data
+        fill(buffer, [[3., 4.], [5., 6.]])
+        np.testing.assert_array_equal(view, [[1., 2.]])
+        buffer.clear()
+        np.testing.assert_array_equal(view, [[1., 2.]])
+        self.assertEqual(buffer.data.size, 0)
+        self.assertTrue(buffer.last_row is None)
+
+    def test_uncommitted_row(self):
+        buffer = DataArrayBuffer()
+        fill(buffer, [[1., 2.]])
+        buffer.new_row(2)[:] = [3., 4.]
+        np.testing.assert_array_equal(buffer.data, [[1., 2.]])
+        buffer.commit_row()
+        np.testing.assert_array_equal(buffer.data, [[1., 2.], [3., 4.]])
+
+    def test_width_change(self):
+        buffer = DataArrayBuffer()
+        fill(buffer, [[1., 2.], [3., 4.]])
+        fill(buffer, [[1., 2., 3.]])
+        np.testing.assert_array_equal(buffer.data, [[1., 2., 3.]])
+
+
+@unittest.skipIf(DataArrayBuffer is None, "LabTools.DataStructure is python 2")
+class TestRing(unittest.TestCase):
+
+    def test_last_rows(self):
+        buffer = DataArrayBuffer(max_rows=4)
+        rows = np.arange(20.).reshape(10, 2)
+        for i in range(len(rows)):
+            fill(buffer, rows[i:i + 1])
+            np.testing.assert_array_equal(buffer.data,
+                                          rows[max(0, i - 3):i + 1])
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.total_rows, 10)
+        self.assertFalse(buffer.stable_rows)
+
+    def test_extend(self):
+        buffer = DataArrayBuffer(max_rows=4)
+        rows = np.arange(20.).reshape(10, 2)
+        fill(buffer, rows[:3])
+        buffer.extend(rows[3:5])
+        np.testing.assert_array_equal(buffer.data, rows[1:5])
+        buffer.extend(rows[5:])
+        np.testing.assert_array_equal(buffer.data, rows[6:])
+        self.assertEqual(buffer.total_rows, 10)
+
+    def test_count_new_rows(self):
+        buffer = DataArrayBuffer(max_rows=4)
+        rows = np.arange(20.).reshape(10, 2)
+        fill(buffer, rows[:5])
+        previous = np.array(buffer.last_row)
+        fill(buffer, rows[5:8])
+        # 3 rows appended and the 3 oldest ones dropped
+        self.assertEqual(count_new_rows(4, previous, buffer.data), [3, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
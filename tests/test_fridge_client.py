@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the FridgeClient on the FakeFridgeServer, run from the top of the
+tree with python -m unittest discover tests
+"""
+
+import socket
+import unittest
+
+try:
+    from LabDrivers import FridgeClient
+except ImportError:
+    # the drivers need PyQt4
+    FridgeClient = None
+
+
+if FridgeClient is not None:
+
+    class CountingServer(FridgeClient.FakeFridgeServer):
+        """
+            a FakeFridgeServer which counts the connections of the clients
+            and can drop them
+        """
+
+        connections = 0
+        sockets = ()
+
+        def process_request(self, request, client_address):
+            self.connections = self.connections + 1
+            self.sockets = self.sockets + (request,)
+            FridgeClient.FakeFridgeServer.process_request(
+                self, request, client_address)
+
+        def drop_connections(self):
+            for request in self.sockets:
+                try:
+                    request.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+
+@unittest.skipIf(FridgeClient is None, "the drivers need PyQt4")
+class TestFridgeClient(unittest.TestCase):
+
+    def setUp(self):
+        self.port = FridgeClient.FRIDGE_PORT
+        self.server = None
+        self.client = FridgeClient.Instrument('FridgeServer')
+
+    def tearDown(self):
+        self.client.close()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        FridgeClient.FRIDGE_PORT = self.port
+
+    def start_server(self, **kwargs):
+        # any free port, the client is pointed at it
+        self.server = CountingServer(port=0, **kwargs)
+        self.server.start()
+        FridgeClient.FRIDGE_PORT = self.server.server_address[1]
+        return self.server
+
+    def test_pipelined(self):
+        server = self.start_server()
+        self.assertEqual(
+            self.client.get_fridge_data_many(['LS1', 'LS2', 'CMN_T']),
+            [1.0, 2.0, 8.0])
+        self.assertEqual(self.client.get_fridge_data('LS3'), 3.0)
+        # the requests go on a single connection kept between the reads
+        self.assertEqual(server.requests, ['LS1?', 'LS2?', 'CMN_T?', 'LS3?'])
+        self.assertEqual(server.connections, 1)
+
+    def test_measure_many(self):
+        self.start_server()
+        self.assertEqual(self.client.measure_many(['LS2', 'LS7', 'LS1']),
+                         [2.0, None, 1.0])
+        self.assertEqual(self.client.last_measure['LS2'], 2.0)
+        self.assertEqual(self.client.measure('CMN'), 7.0)
+
+    def test_commands(self):
+        server = self.start_server()
+        self.client.change_setpoint(10)
+        self.client.change_damping(0.5)
+        # the answer comes after the commands were handled
+        self.client.get_fridge_data('LS1')
+        self.assertEqual(server.commands, {'SETP': '10', 'DAMP': '0.5'})
+        self.assertEqual(server.connections, 1)
+
+    def test_reconnect(self):
+        server = self.start_server()
+        self.assertEqual(self.client.get_fridge_data('LS1'), 1.0)
+        # the Fridgemonitor closed the connection between two reads
+        server.drop_connections()
+        self.assertEqual(self.client.get_fridge_data_many(['LS1', 'LS2']),
+                         [1.0, 2.0])
+        self.assertEqual(self.client.get_fridge_data('LS3'), 3.0)
+        self.assertEqual(server.connections, 2)
+
+    def test_one_request_per_connection(self):
+        server = self.start_server(one_request_per_connection=True)
+        self.assertEqual(
+            self.client.get_fridge_data_many(['LS1', 'LS2', 'LS3']),
+            [1.0, 2.0, 3.0])
+        # the requests after the first one are sent again one by one
+        self.assertEqual(server.requests, ['LS1?', 'LS2?', 'LS3?'])
+        self.assertEqual(server.connections, 3)
+
+    def test_no_server(self):
+        server = self.start_server()
+        server.shutdown()
+        server.server_close()
+        self.server = None
+        self.assertEqual(self.client.get_fridge_data_many(['LS1', 'LS2']),
+                         [0, 0])
+        self.assertTrue(self.client.socket is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
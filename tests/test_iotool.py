@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the data file loader and its parse cache, run from the top of the
+tree with python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from LabTools.IO import IOTool, OutputFormats
+
+HEADER = "#P'time', 'T', 'R'\n#I'TIME', 'LS340', 'LS340'\n"
+
+
+class TestLoadFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fname = os.path.join(self.directory, "run.dat")
+        self.rows = np.arange(30.).reshape(10, 3)
+        self.write(HEADER + "".join("%g %g %g\n" % tuple(row)
+                                    for row in self.rows))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text, mode='w'):
+        with open(self.fname, mode) as data_file:
+            data_file.write(text)
+
+    def load(self, **kwargs):
+        return IOTool.load_file_fast(self.fname, **kwargs)
+
+    def cache_exists(self):
+        return all(os.path.exists(name) for name in
+                   IOTool.parse_cache_names(self.fname))
+
+    def test_load(self):
+        data, label = self.load()
+        np.testing.assert_array_equal(data, self.rows)
+        self.assertEqual(label['param'], ['time', 'T', 'R'])
+        self.assertTrue(self.cache_exists())
+        data, label = self.load()
+        np.testing.assert_array_equal(data, self.rows)
+
+    def test_edited(self):
+        self.load()
+        # same size, another modification time
+        self.write(HEADER + "".join("%g %g %g\n" % tuple(row)
+                                    for row in self.rows[::-1]))
+        info_name = IOTool.parse_cache_names(self.fname)[1]
+        stat = os.stat(self.fname)
+        os.utime(self.fname, (stat.st_atime, stat.st_mtime + 10))
+        data, label = self.load()
+        np.testing.assert_array_equal(data, self.rows[::-1])
+        self.assertTrue(os.path.exists(info_name))
+
+    def test_cache_names(self):
+        self.load()
+        # the cache must not look like a recorded data file
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["run.dat", "run.dat.parsecache",
+                          "run.dat.parsecache.json"])
+        for name in IOTool.parse_cache_names(self.fname):
+            self.assertFalse(OutputFormats.is_binary_file(name))
+
+    def test_appended(self):
+        self.load()
+        self.write("30 31 32\n33 34", mode='a')
+        data, label = self.load()
+        np.testing.assert_array_equal(data, np.arange(33.).reshape(11, 3))
+
+    def test_usecols(self):
+        # without a cache the columns are parsed directly and no cache is
+        # written
+        data, label = self.load(usecols=[0, 2])
+        np.testing.assert_array_equal(data, self.rows[:, [0, 2]])
+        self.assertEqual(label['param'], ['time', 'R'])
+        self.assertFalse(self.cache_exists())
+
+        # with a cache only the columns are read from it
+        self.load()
+        self.write("30 31 32\n", mode='a')
+        data, label = self.load(usecols=[2])
+        np.testing.assert_array_equal(data,
+                                      np.arange(33.).reshape(11, 3)[:, [2]])
+
+    def test_not_a_number(self):
+        self.write("30 x 32\n33 34 35\n", mode='a')
+        data, label = self.load(use_cache=False)
+        # the line with a value which is not a number is skipped
+        np.testing.assert_array_equal(data[-2:], [[27., 28., 29.],
+                                                  [33., 34., 35.]])
+
+
+if __name__ == "__main__":
+    unittest.main()
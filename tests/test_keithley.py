@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the bursts and sweeps of the Keithley drivers on a fake connection, run from
+the top of the tree with python -m unittest discover tests
+"""
+
+import struct
+import unittest
+
+try:
+    from LabDrivers import KT2400, KT2450
+    from LabDrivers.utils import INTF_VISA
+except ImportError:
+    # the drivers need PyQt4, pyserial and visa
+    KT2400 = None
+
+
+class FakeKeithley(object):
+    """
+        a VISA connection answering like a Keithley, it keeps the settings
+        written to it and answers the queries from them
+    """
+
+    def __init__(self):
+        self.settings = {'FORM:DATA': 'ASC', 'FORM:BORD': 'NORM',
+                         'FORM:ELEM': 'VOLT,CURR,RES,TIME,STAT',
+                         'SENS:FUNC:CONC': '1',
+                         'SENS:FUNC': '"VOLT:DC","CURR:DC"',
+                         'SOUR:FUNC': 'VOLT', 'SOUR:VOLT:MODE': 'FIX',
+                         'STAT:OPER:COND': '0', 'ARM:COUN': '1',
+                         'TRIG:COUN': '1', 'TRIG:DEL': '0'}
+        self.query = None
+        # raised by the next read_raw
+        self.error = None
+
+    def write(self, msg):
+        for command in msg.split(';'):
+            command = command.strip().lstrip(':')
+            if ' ' in command:
+                key, value = command.split(' ', 1)
+            else:
+                key, value = command, ''
+            if key.endswith('?'):
+                self.query = (key[:-1], value)
+            elif value:
+                self.settings[key] = value
+
+    def num_points(self):
+        if 'TRIG:LOAD' in self.settings:
+            return int(self.settings['TRIG:LOAD'].split(',')[1])
+        return int(self.settings.get('TRAC:POIN', 0))
+
+    def ask(self, msg):
+        self.write(msg)
+        key, value = self.query
+        if key in ['READ', 'MEAS:VOLT', 'MEAS:CURR']:
+            if self.settings['FORM:DATA'] != 'ASC':
+                return '#0\x00\x00\xc0?'
+            if key.startswith('MEAS'):
+                return '1.5'
+            return ','.join(['1.5,2e-06,9.91e37,1.0,0'] *
+                            int(self.settings['TRIG:COUN']))
+        if key in ['TRAC:POIN:ACT', 'TRAC:ACT']:
+            return str(self.num_points())
+        return self.settings[key]
+
+    def read_raw(self):
+        if self.error is not None:
+            raise self.error
+        num_points = self.num_points()
+        data = struct.pack('<%if' % (3 * num_points),
+                           *range(3 * num_points))
+        if self.query[0] == 'TRAC:DATA' and self.query[1]:
+            # the 2450 gives the length of the data
+            return b'#' + str(len(str(len(data)))).encode() + \
+                str(len(data)).encode() + data + b'\n'
+        return b'#0' + data + b'\n'
+
+
+def fake_instrument(module):
+    """the instrument of the driver module, connected to a FakeKeithley"""
+    # __init__ would open the connection
+    instrument = module.Instrument.__new__(module.Instrument)
+    instrument.ID_name = module.__name__
+    instrument.DEBUG = False
+    instrument.interface = INTF_VISA
+    instrument.connection = FakeKeithley()
+    instrument.term_chars = ''
+    instrument.channels = list(module.param)
+    instrument.last_measure = dict((channel, 0) for channel in module.param)
+    return instrument
+
+
+@unittest.skipIf(KT2400 is None, "the drivers need PyQt4, pyserial and visa")
+class TestBurst(unittest.TestCase):
+
+    def check_restored(self, instrument):
+        settings = instrument.connection.settings
+        self.assertEqual(settings['FORM:DATA'], 'ASC')
+        self.assertEqual(settings['TRIG:COUN'], '1')
+        self.assertEqual(settings['TRIG:DEL'], '0')
+        self.assertEqual(settings['FORM:ELEM'], 'VOLT,CURR,RES,TIME,STAT')
+        self.assertEqual(settings['SENS:FUNC'], '"VOLT:DC","CURR:DC"')
+        self.assertEqual(instrument.measure('V'), 1.5)
+
+    def test_kt2400(self):
+        instrument = fake_instrument(KT2400)
+        instrument.start_burst(['V', 'I'], 4, 100.)
+        self.assertEqual(instrument.connection.settings['TRIG:COUN'], '4')
+        times, block = instrument.fetch_burst()
+        self.assertEqual(list(times), [0., 3., 6., 9.])
+        self.assertEqual(block.tolist(), [[0., 1.], [3., 4.], [6., 7.],
+                                          [9., 10.]])
+        self.check_restored(instrument)
+
+    def test_kt2400_timeout(self):
+        instrument = fake_instrument(KT2400)
+        instrument.start_burst(['I'], 4, 100.)
+        instrument.connection.error = IOError("timeout")
+        self.assertRaises(IOError, instrument.fetch_burst)
+        self.check_restored(instrument)
+
+    def test_kt2450(self):
+        instrument = fake_instrument(KT2450)
+        instrument.start_burst(['V', 'I'], 4, 100.)
+        self.assertEqual(instrument.connection.settings['SENS:FUNC'],
+                         '"CURR"')
+        times, block = instrument.fetch_burst()
+        self.assertEqual(list(times), [0., 3., 6., 9.])
+        # the voltage is the source value
+        self.assertEqual(block.tolist(), [[1., 0.], [4., 3.], [7., 6.],
+                                          [10., 9.]])
+        self.check_restored(instrument)
+
+
+@unittest.skipIf(KT2400 is None, "the drivers need PyQt4, pyserial and visa")
+class TestSweep(unittest.TestCase):
+
+    def check_restored(self, instrument):
+        settings = instrument.connection.settings
+        self.assertEqual(settings['SOUR:VOLT:MODE'], 'FIX')
+        self.assertEqual(settings['ARM:COUN'], '1')
+        self.assertEqual(settings['TRIG:COUN'], '1')
+        self.assertEqual(settings['TRIG:DEL'], '0')
+        self.assertEqual(instrument.measure('I'), 2e-06)
+
+    def test_done(self):
+        instrument = fake_instrument(KT2400)
+        self.assertTrue(instrument.start_sweep(0., 1., 10.))
+        settings = instrument.connection.settings
+        self.assertEqual(settings['TRIG:COUN'], '1000')
+        self.assertFalse(instrument.sweep_done())
+        settings['STAT:OPER:COND'] = str(KT2400.IDLE_BIT)
+        self.assertTrue(instrument.sweep_done())
+        self.assertEqual(float(settings['SOUR:VOLT']), 1.)
+        self.check_restored(instrument)
+
+    def test_abort(self):
+        instrument = fake_instrument(KT2400)
+        instrument.start_sweep(0., 1., 10.)
+        instrument.abort_sweep()
+        self.check_restored(instrument)
+
+
+if __name__ == "__main__":
+    unittest.main()
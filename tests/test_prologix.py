@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the PrologixController on a fake serial port, run from the top of
+the tree with python -m unittest discover tests
+"""
+
+import threading
+import unittest
+
+try:
+    from LabDrivers import utils
+except ImportError:
+    # utils needs pyserial and visa
+    utils = None
+
+
+class FakePrologix(object):
+    """
+        the serial port of a Prologix controller with instruments at the
+        GPIB addresses of instruments. An instrument answers 'address:query'
+        to a query, when it is made to talk by ++auto 1 or ++read eoi
+    """
+
+    def __init__(self, port, baud_rate=9600, timeout=3):
+        self.timeout = timeout
+        self.instruments = ['7', '12']
+        self.sent = []
+        self.address = None
+        self.auto = False
+        self.pending = None
+        self.output = []
+
+    def write(self, cmd):
+        for line in cmd.splitlines():
+            self.sent.append(line)
+            setting = line.split()
+            if line == '++ver':
+                self.output.append("Prologix GPIB-USB Controller version 6.0\n")
+            elif line == '++read eoi':
+                self.talk()
+            elif setting[0] == '++addr':
+                self.address = setting[1]
+            elif setting[0] == '++auto':
+                self.auto = setting[1] == '1'
+            elif line.endswith('?'):
+                self.pending = "%s:%s\n" % (self.address, line)
+                if self.auto:
+                    self.talk()
+
+    def talk(self):
+        if self.pending is not None and self.address in self.instruments:
+            self.output.append(self.pending)
+        self.pending = None
+
+    def readline(self):
+        # nothing before the timeout if no instrument talked
+        if self.output:
+            return self.output.pop(0)
+        return ""
+
+    def read(self, num_bytes):
+        return self.readline()[:num_bytes]
+
+
+@unittest.skipIf(utils is None, "utils needs pyserial and visa")
+class TestPrologixController(unittest.TestCase):
+
+    def setUp(self):
+        self.serial = utils.serial.Serial
+        utils.serial.Serial = FakePrologix
+        self.controller = utils.PrologixController("COM5")
+        self.connection = self.controller.connection
+        del self.connection.sent[:]
+
+    def tearDown(self):
+        utils.serial.Serial = self.serial
+
+    def test_init(self):
+        controller = utils.PrologixController("COM5")
+        self.assertEqual(controller.connection.sent,
+                         ['++mode 1', '++auto 1', '++ver'])
+        self.assertTrue(controller.auto)
+        self.assertTrue(controller.address is None)
+
+    def test_address_cached(self):
+        self.controller.send(7, "VOLT 1")
+        self.controller.send("GPIB0::7", "VOLT 2")
+        self.controller.send("12", "OUTP ON")
+        # the address written directly by an instrument is remembered too
+        self.controller.write("++addr 7")
+        self.controller.send(7, "VOLT 3")
+        self.assertEqual(self.connection.sent, [
+            '++addr 7', 'VOLT 1', 'VOLT 2', '++addr 12', 'OUTP ON',
+            '++addr 7', 'VOLT 3'])
+
+    def test_query_auto(self):
+        self.assertEqual(self.controller.query(7, "READ?"), "7:READ?\n")
+        self.assertEqual(self.controller.query(12, "READ?"), "12:READ?\n")
+        # the instruments talk by themselves in read-after-write mode
+        self.assertFalse('++read eoi' in self.connection.sent)
+
+    def test_transaction(self):
+        answers = self.controller.transaction([
+            (7, "READ?", True), (12, "OUTP ON", False), (7, "CURR?", True)])
+        self.assertEqual(answers, ["7:READ?", None, "7:CURR?"])
+        self.assertEqual(self.connection.sent, [
+            '++auto 0', '++addr 7', 'READ?', '++read eoi', '++addr 12',
+            'OUTP ON', '++addr 7', 'CURR?', '++read eoi'])
+
+        # ++auto is only sent when the mode changes
+        del self.connection.sent[:]
+        self.assertEqual(self.controller.transaction([(7, "READ?", True)]),
+                         ["7:READ?"])
+        self.assertEqual(self.controller.query(12, "READ?"), "12:READ?\n")
+        self.assertEqual(self.connection.sent, [
+            'READ?', '++read eoi', '++addr 12', 'READ?', '++read eoi'])
+
+    def test_open_gpib_ports(self):
+        self.assertEqual(self.controller.get_open_gpib_ports(15),
+                         ["GPIB0::7", "GPIB0::12"])
+        self.assertEqual(self.connection.timeout, 3)
+        self.assertEqual(len([line for line in self.connection.sent
+                              if line.startswith('++addr')]), 16)
+
+    def test_threads(self):
+        answers = {7: [], 12: []}
+
+        def ask(address):
+            for i in range(200):
+                answers[address].append(
+                    self.controller.query(address, "READ?"))
+
+        threads = [threading.Thread(target=ask, args=(address,))
+                   for address in answers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # the queries of the two threads didn't get mixed
+        for address in answers:
+            self.assertEqual(answers[address],
+                             ["%s:READ?\n" % (address)] * 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the setpoint ramps of the Lakeshores on a fake instrument, run from
+the top of the tree with python -m unittest discover tests
+"""
+
+import threading
+import unittest
+
+from LabDrivers import ramp
+
+
+class FakeLakeshore(object):
+    """
+        the commands of a Lakeshore temperature controller used by
+        lakeshore_ramp, the ramp is over when ramping is set to False
+    """
+
+    DEBUG = False
+    ID_name = 'LS340'
+
+    def __init__(self):
+        self.ramp = {1: '0,+0.00'}
+        self.setpoint = {1: 2.0}
+        self.ramping = True
+        self.commands = []
+        self.lock = threading.RLock()
+
+    def transaction(self):
+        return self.lock
+
+    def ask(self, msg):
+        command, loop = msg.split(' ')
+        if command == 'CSET?':
+            return 'A,1,1,1'
+        if command == 'KRDG?':
+            return '+3.5000'
+        if command == 'RAMP?':
+            return self.ramp[int(loop)]
+        if command == 'RAMPST?':
+            return '%i' % (self.ramping)
+        return '%f' % (self.setpoint[int(loop)])
+
+    def write(self, msg):
+        self.commands.append(msg)
+        command, arguments = msg.split(' ')
+        loop, value = arguments.split(',', 1)
+        if command == 'RAMP':
+            self.ramp[int(loop)] = value
+        elif command == 'SETP':
+            self.setpoint[int(loop)] = float(value)
+
+
+class TestLakeshoreRamp(unittest.TestCase):
+
+    def test_done(self):
+        instrument = FakeLakeshore()
+        task = ramp.lakeshore_ramp(instrument, 1, 4.0, 0.5,
+                                   poll_interval=0.01)
+        self.assertEqual(instrument.ramp[1], '1,0.5')
+        instrument.ramping = False
+        self.assertTrue(task.wait(timeout=5))
+        self.assertEqual(instrument.ramp[1], '0,+0.00')
+        self.assertEqual(instrument.setpoint[1], 4.0)
+
+    def test_abort(self):
+        instrument = FakeLakeshore()
+        instrument.ramp[1] = '1,+2.00'
+        task = ramp.lakeshore_ramp(instrument, 1, 4.0, 0.5,
+                                   poll_interval=0.01)
+        self.assertFalse(task.abort())
+        self.assertEqual(task.state, ramp.RAMP_ABORTED)
+        # the setpoint was set without ramping, then the ramp put back
+        self.assertEqual(instrument.commands[-3:], [
+            'RAMP 1,0,0.5', 'SETP 1,3.5000', 'RAMP 1,1,+2.00'])
+        self.assertEqual(instrument.setpoint[1], 3.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the PeriodicSchedule of the DataTaker on a fake clock, run from the
+top of the tree with python -m unittest discover tests
+"""
+
+import unittest
+
+try:
+    from LabTools.Widgets import data_management
+except (ImportError, SyntaxError):
+    # data_management needs PyQt4
+    data_management = None
+
+
+class FakeClock(object):
+    """
+        replaces the time module and the monotonic clock of data_management,
+        the time only goes on when something sleeps or calls advance
+    """
+
+    def __init__(self, wall_time=1000.0):
+        self.now = 0.0
+        self.offset = wall_time
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now + self.offset
+
+    def sleep(self, seconds):
+        self.now = self.now + seconds
+
+    def advance(self, seconds):
+        """the time taken by the measures of a sample"""
+        self.now = self.now + seconds
+
+
+@unittest.skipIf(data_management is None, "data_management needs PyQt4")
+class TestPeriodicSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.time_module = data_management.time
+        self.monotonic = data_management.monotonic
+        data_management.time = self.clock
+        data_management.monotonic = self.clock.monotonic
+
+    def tearDown(self):
+        data_management.time = self.time_module
+        data_management.monotonic = self.monotonic
+
+    def test_period(self):
+        schedule = data_management.PeriodicSchedule(2.0)
+        for tick in range(4):
+            self.assertTrue(schedule.wait())
+            self.assertAlmostEqual(self.clock.now, 2.0 * tick)
+            self.assertEqual(schedule.last_sample["sample"], tick)
+            # the measures don't shift the next samples
+            self.clock.advance(0.5)
+        self.assertEqual(schedule.stats()["overruns"], 0)
+        self.assertAlmostEqual(schedule.stats()["max_jitter"], 0)
+
+    def test_overrun(self):
+        schedule = data_management.PeriodicSchedule(1.0)
+        schedule.wait()
+        # the measures took 2.5 periods, the sample of t = 1 is skipped
+        self.clock.advance(2.5)
+        schedule.wait()
+        sample = schedule.last_sample
+        self.assertEqual(sample["missed"], 1)
+        self.assertEqual(sample["sample"], 2)
+        self.assertAlmostEqual(sample["jitter"], 0.5)
+        self.assertAlmostEqual(sample["timestamp"], 1002.5)
+
+        # back on time
+        schedule.wait()
+        self.assertAlmostEqual(self.clock.now, 3.0)
+        self.assertEqual(schedule.last_sample["missed"], 0)
+        stats = schedule.stats()
+        self.assertEqual((stats["samples"], stats["overruns"],
+                          stats["missed"]), (3, 1, 1))
+        self.assertAlmostEqual(stats["max_jitter"], 0.5)
+        self.assertAlmostEqual(stats["mean_jitter"], 0.5 / 3)
+
+    def test_resync(self):
+        schedule = data_management.PeriodicSchedule(1.0)
+        schedule.wait()
+        # a pause of the script
+        self.clock.advance(3.5)
+        schedule.resync()
+        schedule.wait()
+        self.assertAlmostEqual(self.clock.now, 4.0)
+        self.assertEqual(schedule.last_sample["sample"], 4)
+        self.assertEqual(schedule.stats()["overruns"], 0)
+        self.assertEqual(schedule.stats()["missed"], 0)
+
+    def test_align(self):
+        self.clock.offset = 1000.25
+        schedule = data_management.PeriodicSchedule(1.0, align=True)
+        schedule.wait()
+        self.assertAlmostEqual(self.clock.time() % 1.0, 0)
+
+    def test_stopped(self):
+        schedule = data_management.PeriodicSchedule(
+            10.0, is_stopped=lambda: True)
+        schedule.wait()
+        self.assertFalse(schedule.wait())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the asyncio transports on a fake serial port, run from the top of
+the tree with python -m unittest discover tests
+"""
+
+import threading
+import time
+import unittest
+
+try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from LabDrivers import transport
+except (ImportError, SyntaxError):
+    # the transports need python 3.5 and pyserial
+    transport = None
+
+
+class FakeSerial(object):
+    """
+        a pyserial connection which answers each write with the next reply
+        of replies, a reply can be cut in two to arrive after a timeout
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.received = bytearray()
+        self.sent = []
+
+    @property
+    def in_waiting(self):
+        return len(self.received)
+
+    def read(self, num_bytes=1):
+        data = bytes(self.received[:num_bytes])
+        del self.received[:num_bytes]
+        return data
+
+    def write(self, data):
+        self.sent.append(data)
+        if self.replies:
+            self.received.extend(self.replies.pop(0))
+
+
+class FakeInstrument(object):
+    """the bus of an instrument, held by the other threads as well"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+    def transaction(self):
+        return self.lock
+
+
+@unittest.skipIf(transport is None, "the transports need python 3.5 and \
+pyserial")
+class TestSerialTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.loop.close()
+
+    def ask(self, port, msg):
+        return self.loop.run_until_complete(port.ask(msg))
+
+    def test_answers(self):
+        connection = FakeSerial([b'1.5\r', b'2.5\r'])
+        port = transport.SerialTransport(connection, terminator=b'\r')
+        self.assertEqual(self.ask(port, 'A?'), '1.5')
+        self.assertEqual(self.ask(port, 'B?'), '2.5')
+        self.assertEqual(connection.sent, [b'A?', b'B?'])
+
+    def test_late_answer(self):
+        connection = FakeSerial([b'1.', b'2.5\r'])
+        port = transport.SerialTransport(connection, terminator=b'\r',
+                                         timeout=0.05)
+        self.assertRaises(asyncio.TimeoutError, self.ask, port, 'A?')
+        # the end of the answer to A? comes after the timeout
+        connection.received.extend(b'5\r')
+        self.assertEqual(self.ask(port, 'B?'), '2.5')
+
+    def test_bus_held(self):
+        instrument = FakeInstrument()
+        connection = FakeSerial([b'1.5\r'])
+        port = transport.SerialTransport(
+            connection, terminator=b'\r', instrument=instrument,
+            executor=self.executor)
+
+        held = threading.Event()
+
+        def other_thread():
+            with instrument.transaction():
+                held.set()
+                time.sleep(0.1)
+                connection.sent.append(b'OTHER')
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        held.wait()
+        self.assertEqual(self.ask(port, 'A?'), '1.5')
+        thread.join()
+        self.assertEqual(connection.sent, [b'OTHER', b'A?'])
+        # the bus was released by the thread which took it
+        self.assertTrue(instrument.lock.acquire(False))
+        instrument.lock.release()
+
+
+if __name__ == "__main__":
+    unittest.main()